@@ -0,0 +1,115 @@
+"""
+Бенчмарк колонок-словарей (core.dict_codes): память и groupby до/после.
+
+Таблица snapshot грузится как её читает reader (VARCHAR) — это "до"; потом
+колонки CODED_COLUMNS переводятся в ENUM так же, как ingest-шаг
+"dict_codes", — "после". На обоих состояниях:
+
+  - память таблицы DuckDB (duckdb_memory);
+  - SELECT * -> pandas: время и memory_usage(deep=True);
+  - GROUP BY в DuckDB по metal / order_type / customer;
+  - groupby layout'ов в pandas на результате (received: metal -> sum(quan),
+    order_type -> nunique(SalesOrder) + sum(quan); casting/shipping: metal
+    -> sum(quan), sum(веса)).
+
+    python -m bench.categories
+    python -m bench.categories --rows 10000000 --repeat 3 --out categories.json
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+from bench.synth_snapshot import OUT_DIR, ensure_snapshot  # noqa: E402
+
+GROUP_COLUMNS = ("metal", "order_type", "customer")
+
+
+def _best(fn, repeat: int) -> tuple[float, object]:
+    best, got = float("inf"), None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        got = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000, got
+
+
+def _pandas_groupbys(df) -> dict:
+    out = {
+        "received_by_metal": lambda: df.groupby("metal", observed=True)["quan"].sum(),
+        "received_by_order_type": lambda: df.groupby("order_type", as_index=False, observed=True).agg(
+            SO_Count=("SalesOrder", "nunique"), Total_Qty=("quan", "sum")
+        ),
+    }
+    weight = next((c for c in ("CastWt", "LastWeight") if c in df.columns), None)
+    if weight:
+        out["casting_by_metal"] = lambda: df.groupby("metal", as_index=False, observed=True).agg(
+            Qty=("quan", "sum"), Weight=(weight, "sum")
+        )
+    return out
+
+
+def measure(con, table: str, repeat: int) -> dict:
+    report = {
+        "duckdb_mb": con.execute("SELECT sum(memory_usage_bytes) FROM duckdb_memory()").fetchone()[0] / 2**20,
+    }
+    ms, df = _best(lambda: con.execute(f"SELECT * FROM {table}").df(), repeat)
+    report["to_pandas_ms"] = ms
+    report["pandas_mb"] = df.memory_usage(deep=True).sum() / 2**20
+    for c in GROUP_COLUMNS:
+        report[f"duckdb_group_by_{c}_ms"], _ = _best(
+            lambda c=c: con.execute(f'SELECT "{c}", sum(quan) FROM {table} GROUP BY 1').fetchall(), repeat
+        )
+    for name, fn in _pandas_groupbys(df).items():
+        report[f"pandas_{name}_ms"], _ = _best(fn, repeat)
+    return report
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Memory and groupby speed: VARCHAR vs dictionary-encoded columns")
+    ap.add_argument("--snapshot", type=Path, default=None, help="snapshot file (default: synthetic --rows)")
+    ap.add_argument("--rows", type=int, default=1_000_000)
+    ap.add_argument("--snapshot-dir", type=Path, default=OUT_DIR)
+    ap.add_argument("--repeat", type=int, default=5, help="runs per measurement, the best one counts")
+    ap.add_argument("--out", type=Path, default=None, help="write report (JSON)")
+    args = ap.parse_args(argv)
+
+    import duckdb
+
+    from core import db_utils, dict_codes, snapshot_store
+
+    snap = args.snapshot or ensure_snapshot(args.rows, "parquet", args.snapshot_dir)
+    table = snapshot_store.TABLE
+    con = duckdb.connect(database=":memory:")
+    con.execute(f"CREATE TABLE {table} AS SELECT * FROM {db_utils._snapshot_reader(snap)}")
+
+    before = measure(con, table, args.repeat)
+    t0 = time.perf_counter()
+    coded = [c for c in dict_codes.CODED_COLUMNS if dict_codes.to_enum(con, c)]
+    encode_ms = (time.perf_counter() - t0) * 1000
+    after = measure(con, table, args.repeat)
+
+    print(f"{snap.name}: {len(coded)} columns -> ENUM in {encode_ms:.0f} ms ({', '.join(coded)})")
+    print(f"{'':36}{'before':>10}{'after':>10}{'x':>7}")
+    for key in before:
+        a, b = before[key], after[key]
+        print(f"{key:36}{a:10.1f}{b:10.1f}{a / b if b else float('nan'):7.1f}")
+
+    if args.out:
+        args.out.write_text(
+            json.dumps({"snapshot": str(snap), "coded": coded, "encode_ms": encode_ms,
+                        "before": before, "after": after}, indent=1),
+            encoding="utf-8",
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""
+Микро-бенчмарк разбора дат: filters.date_filter.parse_date_range на каждом
+запросе usage-лога (logs/ai_usage_log.txt + JSONL-сегменты), по каждой паре
+(запрос, день) — "сегодня" заморожено на день записи, как в bench.replay.
+
+С --against REV та же выборка прогоняется через date_filter.py из git-ревизии
+REV (загружается отдельным модулем, текущий код не трогается): печатается
+ускорение и каждое расхождение (start, end, очищенный текст) — код выхода 1.
+
+    python -m bench.dates
+    python -m bench.dates --against HEAD~1 --repeat 20
+"""
+from __future__ import annotations
+
+import argparse
+import importlib.util
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from types import ModuleType
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+DATE_FILTER = "filters/date_filter.py"
+
+
+def load_revision(rev: str) -> ModuleType:
+    """date_filter.py из git-ревизии rev как отдельный модуль."""
+    src = subprocess.run(
+        ["git", "show", f"{rev}:{DATE_FILTER}"], cwd=BASE_DIR, capture_output=True, check=True
+    ).stdout
+    with tempfile.NamedTemporaryFile("wb", suffix=".py", delete=False) as f:
+        f.write(src)
+    spec = importlib.util.spec_from_file_location(f"date_filter_{rev.replace('~', '_')}", f.name)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def measure(module: ModuleType, cases: list[dict], repeat: int) -> tuple[list[float], list[tuple]]:
+    """(мкс на вызов по каждому case — лучший из repeat, результаты)."""
+    per_case, results = [], []
+    parse = module.parse_date_range
+    for case in cases:
+        module._today = lambda day=case["today"]: day
+        query = case["query"]
+        best = float("inf")
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            got = parse(query)
+            best = min(best, time.perf_counter() - t0)
+        per_case.append(best * 1e6)
+        results.append(got)
+    return per_case, results
+
+
+def summarize(per_case: list[float]) -> dict:
+    xs = sorted(per_case)
+    return {
+        "n": len(xs),
+        "mean_us": statistics.fmean(xs),
+        "p50_us": xs[len(xs) // 2],
+        "p95_us": xs[int(len(xs) * 0.95)],
+        "max_us": xs[-1],
+        "total_ms": sum(xs) / 1000,
+    }
+
+
+def _line(name: str, s: dict) -> str:
+    return (f"{name:12} n={s['n']}  mean {s['mean_us']:7.1f} us  p50 {s['p50_us']:7.1f}  "
+            f"p95 {s['p95_us']:7.1f}  max {s['max_us']:7.1f}  total {s['total_ms']:8.2f} ms")
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Micro-benchmark parse_date_range over every usage-log query")
+    ap.add_argument("--log-dir", type=Path, default=BASE_DIR / "logs")
+    ap.add_argument("--repeat", type=int, default=10, help="calls per query, the best one counts")
+    ap.add_argument("--against", default=None, help="git revision to compare with (e.g. HEAD~1)")
+    ap.add_argument("--out", type=Path, default=None, help="write summary (JSON)")
+    args = ap.parse_args(argv)
+
+    from bench.replay import load_cases
+    from filters import date_filter
+
+    cases = load_cases(args.log_dir, all_days=True)
+    per_case, results = measure(date_filter, cases, args.repeat)
+    report = {"current": summarize(per_case)}
+    print(_line("current", report["current"]))
+
+    failed = False
+    if args.against:
+        old_per_case, old_results = measure(load_revision(args.against), cases, args.repeat)
+        report["against"] = {"rev": args.against, **summarize(old_per_case)}
+        report["speedup"] = report["against"]["total_ms"] / report["current"]["total_ms"]
+        print(_line(args.against, report["against"]))
+        print(f"speedup x{report['speedup']:.1f} (total), "
+              f"x{report['against']['p50_us'] / report['current']['p50_us']:.1f} (p50)")
+        diffs = [(c, a, b) for c, a, b in zip(cases, old_results, results) if a != b]
+        for case, a, b in diffs[:50]:
+            print("DIFF", repr(case["query"]), case["today"], a, "->", b)
+        report["diffs"] = len(diffs)
+        failed = bool(diffs)
+
+    if args.out:
+        args.out.write_text(json.dumps(report, indent=1), encoding="utf-8")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,408 @@
+"""
+Replay-бенчмарк по реальному usage-логу.
+
+Берёт все различные запросы из logs/ai_usage_log.txt (+ JSONL-сегменты),
+прогоняет их через ai_parse_query -> execute_access_query -> layout
+(Streamlit в bare-режиме, без сервера) на локальном snapshot и печатает
+p50/p95/p99 по стадиям и по layout.
+
+"Сегодня" замораживается на дату записи в логе, поэтому сгенерированный SQL
+можно сравнить с SQL из лога (--strict-log). SQL сравнивается в канонической
+форме (canonical_sql: условия AND/OR внутри скобок отсортированы) — порядок
+условий, который зависел от hash seed, расхождением не считается.
+
+С предыдущим прогоном на том же snapshot (--baseline) сравниваются
+результаты: число строк и digest содержимого (result_digest — не зависит от
+порядка строк, колонок и словарного кодирования). Расхождение результатов —
+код выхода 1; изменившийся SQL при тех же результатах только печатается.
+Число строк из лога с локальным не сравнивается: в логе — строки
+production-базы на тот день, локальный snapshot другой.
+
+Общие кэши запросов процесса (memo разбора, результаты по SQL —
+memory.QUERY_CACHE_NAMES) очищаются перед каждым повтором, иначе после
+warmup замерялись бы попадания в кэш. --warm-caches — не очищать (время
+повторного запроса); режим пишется в meta.caches, прогоны с разным режимом
+по времени не сравниваются.
+
+    python -m bench.replay --out run.json
+    python -m bench.replay --baseline run.json --out run2.json
+    python -m bench.replay --snapshot big.parquet --limit 200
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from datetime import date, datetime
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+DEFAULT_SNAPSHOT = BASE_DIR / "offline_data" / "T_Local_Snapshot.csv"
+LEGACY_SQL_LIMIT = 500  # старый лог обрезал sql до 500 символов
+
+STAGES = ("parse", "execute", "render", "total")
+RUN_EVENTS = {"RUN_OK", "NO_ROWS", "RUN_ERROR"}
+
+
+def percentile(values: list[float], p: float) -> float | None:
+    if not values:
+        return None
+    xs = sorted(values)
+    k = (len(xs) - 1) * p / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(xs) - 1)
+    return xs[lo] + (xs[hi] - xs[lo]) * (k - lo)
+
+
+def stats(values: list[float]) -> dict:
+    return {
+        "n": len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values) if values else None,
+    }
+
+
+def _split_top(text: str, sep: str) -> list[str]:
+    """text по sep вне скобок и строковых литералов."""
+    parts, depth, quote, start, i = [], 0, False, 0, 0
+    while i < len(text):
+        ch = text[i]
+        if ch == "'":
+            quote = not quote
+        elif not quote and ch == "(":
+            depth += 1
+        elif not quote and ch == ")":
+            depth -= 1
+        elif not quote and depth == 0 and text.startswith(sep, i):
+            parts.append(text[start:i])
+            start = i = i + len(sep)
+            continue
+        i += 1
+    parts.append(text[start:])
+    return parts
+
+
+def _enclosed(expr: str) -> bool:
+    """expr целиком в одной паре скобок: "(a OR b)", но не "(a) OR (b)"."""
+    if not (expr.startswith("(") and expr.endswith(")")):
+        return False
+    depth, quote = 0, False
+    for i, ch in enumerate(expr):
+        if ch == "'":
+            quote = not quote
+        elif not quote and ch == "(":
+            depth += 1
+        elif not quote and ch == ")":
+            depth -= 1
+            if depth == 0 and i < len(expr) - 1:
+                return False
+    return True
+
+
+def _canonical(expr: str) -> str:
+    expr = expr.strip()
+    for sep in (" OR ", " AND "):
+        parts = _split_top(expr, sep)
+        if len(parts) > 1:
+            return sep.join(sorted(_canonical(p) for p in parts))
+    if _enclosed(expr):
+        return "(" + _canonical(expr[1:-1]) + ")"
+    if expr.startswith("NOT (") and expr.endswith(")"):
+        return "NOT " + _canonical(expr[4:])
+    return expr
+
+
+def canonical_sql(sql: str) -> str:
+    """SQL с отсортированными условиями AND/OR в WHERE (для сравнения, не для выполнения)."""
+    head, sep, where = sql.partition(" WHERE ")
+    return head + sep + _canonical(where) if sep else sql
+
+
+def sql_digest(sql: str) -> str:
+    return hashlib.sha1(canonical_sql(sql).encode("utf-8")).hexdigest()[:16]
+
+
+def result_digest(df) -> str | None:
+    """Содержимое результата без учёта порядка строк/колонок и dtype категорий."""
+    import pandas as pd
+
+    if df is None:
+        return None
+    df = df[sorted(df.columns)]
+    df = df.astype({c: df[c].dtype.categories.dtype for c in df.columns if isinstance(df[c].dtype, pd.CategoricalDtype)})
+    rows = pd.util.hash_pandas_object(df, index=False).sort_values().to_numpy()
+    h = hashlib.sha1(",".join(df.columns).encode("utf-8"))
+    h.update(rows.tobytes())
+    return h.hexdigest()[:16]
+
+
+# ---------- cases from the log ----------
+
+def load_cases(log_dir: Path, all_days: bool = False) -> list[dict]:
+    """
+    Один case на каждый различный запрос (по последнему дню, когда он встречался),
+    либо, с all_days, на каждую пару (запрос, день).
+    """
+    from core.log_ingest import iter_log_records
+
+    cases: dict[tuple, dict] = {}
+    for rec in iter_log_records(log_dir):
+        query = (rec.get("query") or "").strip()
+        if not query:
+            continue
+        day: date = rec["ts"].date()
+        key = (query, day) if all_days else query
+        case = cases.get(key)
+        if case is None or (not all_days and day > case["today"]):
+            case = cases[key] = {"query": query, "today": day, "log_sql": None, "sql_truncated": False}
+
+        sql = rec.get("sql") or ""
+        if sql and rec["event"] in RUN_EVENTS | {"PARSE_OK"}:
+            case["log_sql"] = sql
+            case["sql_truncated"] = rec.get("source", "").endswith(".txt") and len(sql) >= LEGACY_SQL_LIMIT
+
+    return sorted(cases.values(), key=lambda c: (c["today"], c["query"]))
+
+
+# ---------- replay ----------
+
+def _freeze_today(day: date) -> None:
+    from filters import date_filter
+
+    date_filter._today = lambda: day
+
+
+def run_case(case: dict, repeat: int, warmup: int, warm_caches: bool = False) -> dict:
+    from core import memory
+    from core.ai_filter_router import ai_parse_query
+    from core.db_utils import execute_access_query
+    import main_app
+
+    _freeze_today(case["today"])
+    timings = defaultdict(list)
+    out = {"query": case["query"], "today": case["today"].isoformat()}
+
+    for i in range(warmup + repeat):
+        if not warm_caches:
+            memory.clear_caches(memory.QUERY_CACHE_NAMES)
+        t0 = time.perf_counter()
+        try:
+            sql = ai_parse_query(case["query"])
+        except Exception as e:
+            out.update(error=f"PARSE_ERROR: {type(e).__name__}: {e}")
+            return out
+        t1 = time.perf_counter()
+
+        if not sql.startswith("SELECT"):
+            # "Invalid request: ..." — сообщение пользователю, не SQL
+            out.update(sql=sql, sql_digest=sql_digest(sql), rows=None, layout=None, invalid=True)
+            return out
+
+        try:
+            df = execute_access_query(sql)
+        except Exception as e:
+            out.update(sql=sql, sql_digest=sql_digest(sql), error=f"RUN_ERROR: {type(e).__name__}: {e}")
+            return out
+        t2 = time.perf_counter()
+
+        layout = main_app.select_layout(case["query"]) if df is not None and not df.empty else None
+        if layout:
+            main_app.render_layout(layout, df, case["query"])
+        t3 = time.perf_counter()
+
+        if i >= warmup:
+            timings["parse"].append((t1 - t0) * 1000)
+            timings["execute"].append((t2 - t1) * 1000)
+            timings["render"].append((t3 - t2) * 1000)
+            timings["total"].append((t3 - t0) * 1000)
+
+    out.update(
+        sql=sql,
+        sql_digest=sql_digest(sql),
+        rows=0 if df is None else len(df),
+        result_digest=result_digest(df),
+        layout=layout or "no_rows",
+        timings_ms={k: [round(v, 3) for v in vs] for k, vs in timings.items()},
+    )
+
+    log_sql = case.get("log_sql")
+    if log_sql:
+        out["sql_match_log"] = (
+            sql.startswith(log_sql) if case["sql_truncated"] else canonical_sql(sql) == canonical_sql(log_sql)
+        )
+    return out
+
+
+def summarize(results: list[dict]) -> dict:
+    by_stage = defaultdict(list)
+    by_layout = defaultdict(lambda: defaultdict(list))
+    for r in results:
+        for stage, vs in (r.get("timings_ms") or {}).items():
+            by_stage[stage].extend(vs)
+            by_layout[r["layout"]][stage].extend(vs)
+
+    checked_sql = [r for r in results if "sql_match_log" in r]
+    return {
+        "cases": len(results),
+        "errors": sum(1 for r in results if "error" in r),
+        "invalid": sum(1 for r in results if r.get("invalid")),
+        "sql_match_log": f"{sum(r['sql_match_log'] for r in checked_sql)}/{len(checked_sql)}",
+        "stages": {s: stats(by_stage[s]) for s in STAGES},
+        "layouts": {
+            name: {s: stats(stages[s]) for s in STAGES}
+            for name, stages in sorted(by_layout.items())
+        },
+    }
+
+
+def compare(current: dict, baseline: dict) -> tuple[list[str], list[str]]:
+    """
+    (расхождения результатов, изменения SQL при тех же результатах) относительно
+    предыдущего прогона. Прогон без result_digest (старый формат) сравнивается по rows.
+    """
+    base = {(r["query"], r["today"]): r for r in baseline["results"]}
+    diffs, notes = [], []
+    for r in current["results"]:
+        b = base.get((r["query"], r["today"]))
+        if b is None:
+            continue
+        where = f"{r['query']!r} ({r['today']})"
+        if r.get("rows") != b.get("rows"):
+            diffs.append(f"rows changed {b.get('rows')} -> {r.get('rows')}: {where}")
+        elif "result_digest" in b and r.get("result_digest") != b.get("result_digest"):
+            diffs.append(f"result changed ({r.get('rows')} rows): {where}")
+        elif r.get("error") != b.get("error"):
+            diffs.append(f"error changed {b.get('error')!r} -> {r.get('error')!r}: {where}")
+        elif r.get("sql_digest") != b.get("sql_digest"):
+            notes.append(f"SQL changed, same result: {where}")
+    return diffs, notes
+
+
+def _fmt(v) -> str:
+    return "—" if v is None else f"{v:9.2f}"
+
+
+def print_report(summary: dict, baseline: dict | None = None) -> None:
+    print(f"cases={summary['cases']} errors={summary['errors']} invalid={summary['invalid']} "
+          f"sql_match_log={summary['sql_match_log']}")
+    print(f"{'':18}{'stage':>9}{'p50':>10}{'p95':>10}{'p99':>10}   ms")
+    rows = [("ALL", summary["stages"])] + list(summary["layouts"].items())
+    base_rows = {}
+    if baseline:
+        base_rows = dict([("ALL", baseline["summary"]["stages"])] + list(baseline["summary"]["layouts"].items()))
+    for name, stages in rows:
+        for stage in STAGES:
+            s = stages[stage]
+            line = f"{name:18}{stage:>9}{_fmt(s['p50'])} {_fmt(s['p95'])} {_fmt(s['p99'])}"
+            b = (base_rows.get(name) or {}).get(stage)
+            if b and b["p50"] and s["p50"]:
+                line += f"   p50 x{s['p50'] / b['p50']:.2f} vs baseline"
+            print(line)
+
+
+def _git_rev() -> str | None:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return None
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Replay usage-log queries and report latency percentiles")
+    ap.add_argument("--snapshot", type=Path, default=DEFAULT_SNAPSHOT)
+    ap.add_argument("--log-dir", type=Path, default=BASE_DIR / "logs")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--warmup", type=int, default=1)
+    ap.add_argument("--limit", type=int, default=0, help="replay only the first N cases")
+    ap.add_argument("--all-days", action="store_true", help="one case per (query, day) instead of per query")
+    ap.add_argument("--out", type=Path, default=None, help="write machine-readable results (JSON)")
+    ap.add_argument("--baseline", type=Path, default=None, help="previous --out file to compare against")
+    ap.add_argument("--strict-log", action="store_true", help="fail if generated SQL differs from the log")
+    ap.add_argument("--warm-caches", action="store_true",
+                    help="keep the parse/result caches between repeats (time cache hits)")
+    args = ap.parse_args(argv)
+
+    os.environ["SNAPSHOT_PATH"] = str(args.snapshot)
+
+    from core.db_utils import snapshot_info
+    import duckdb
+    import main_app  # noqa: F401  (Streamlit создаёт свои логгеры при импорте)
+
+    # layouts рендерятся в bare-режиме: глушим "missing ScriptRunContext"
+    for name in list(logging.root.manager.loggerDict):
+        if name.startswith("streamlit"):
+            logging.getLogger(name).setLevel(logging.ERROR)
+
+    cases = load_cases(args.log_dir, all_days=args.all_days)
+    if args.limit:
+        cases = cases[: args.limit]
+
+    started = time.perf_counter()
+    results = []
+    for i, case in enumerate(cases, 1):
+        results.append(run_case(case, args.repeat, args.warmup, args.warm_caches))
+        if i % 50 == 0:
+            print(f"  {i}/{len(cases)}", file=sys.stderr)
+
+    report = {
+        "meta": {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "git": _git_rev(),
+            "snapshot": str(args.snapshot),
+            "snapshot_sha": snapshot_info().get("sha"),
+            "python": platform.python_version(),
+            "duckdb": duckdb.__version__,
+            "repeat": args.repeat,
+            "warmup": args.warmup,
+            "caches": "warm" if args.warm_caches else "cold",
+            "wall_sec": round(time.perf_counter() - started, 2),
+        },
+        "summary": summarize(results),
+        "results": results,
+    }
+
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8")) if args.baseline else None
+    timing_baseline = baseline
+    if baseline and baseline["meta"].get("caches", "warm") != report["meta"]["caches"]:
+        # прогоны до meta.caches шли с кэшами между повторами
+        print(f"baseline caches={baseline['meta'].get('caches', 'warm')}, this run caches="
+              f"{report['meta']['caches']}: latency is not compared")
+        timing_baseline = None
+    print_report(report["summary"], timing_baseline)
+
+    if args.out:
+        args.out.write_text(json.dumps(report, ensure_ascii=False, indent=1, default=str), encoding="utf-8")
+        print(f"written {args.out}")
+
+    failed = False
+    if baseline:
+        diffs, notes = compare(report, baseline)
+        for d in notes[:50]:
+            print("NOTE", d)
+        for d in diffs[:50]:
+            print("DIFF", d)
+        failed = bool(diffs)
+    if args.strict_log:
+        mism = [r for r in results if r.get("sql_match_log") is False]
+        for r in mism[:50]:
+            print("LOG SQL MISMATCH", repr(r["query"]), r["today"])
+        failed = failed or bool(mism)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
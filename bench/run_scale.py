@@ -0,0 +1,73 @@
+"""
+Replay-бенчмарк на синтетических snapshot'ах 100k / 1M / 10M строк.
+
+Для каждого размера берёт (или генерирует через bench.synth_snapshot)
+snapshot и запускает bench.replay в отдельном процессе — кэши модулей и
+DuckDB не переносятся между размерами.
+
+    python -m bench.run_scale --limit 200
+    python -m bench.run_scale --rows 100000 1000000 --format csv.gz --out-dir /tmp/scale
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+from bench.synth_snapshot import OUT_DIR, ensure_snapshot  # noqa: E402
+
+DEFAULT_ROWS = [100_000, 1_000_000, 10_000_000]
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Run the replay benchmark against synthetic snapshots")
+    ap.add_argument("--rows", type=int, nargs="+", default=DEFAULT_ROWS)
+    ap.add_argument("--format", choices=["parquet", "csv.gz"], default="parquet")
+    ap.add_argument("--snapshot-dir", type=Path, default=OUT_DIR)
+    ap.add_argument("--out-dir", type=Path, default=BASE_DIR / "bench" / "results")
+    ap.add_argument("--baseline-dir", type=Path, default=None, help="directory with previous replay_<rows>.json")
+    ap.add_argument("--limit", type=int, default=0)
+    ap.add_argument("--repeat", type=int, default=1)
+    ap.add_argument("--warmup", type=int, default=0)
+    args = ap.parse_args(argv)
+
+    args.out_dir.mkdir(parents=True, exist_ok=True)
+    failed = False
+    overview = {}
+    for rows in args.rows:
+        snap = ensure_snapshot(rows, args.format, args.snapshot_dir)
+        out = args.out_dir / f"replay_{rows}.json"
+        cmd = [
+            sys.executable, "-m", "bench.replay",
+            "--snapshot", str(snap),
+            "--repeat", str(args.repeat),
+            "--warmup", str(args.warmup),
+            "--out", str(out),
+        ]
+        if args.limit:
+            cmd += ["--limit", str(args.limit)]
+        if args.baseline_dir and (args.baseline_dir / out.name).exists():
+            cmd += ["--baseline", str(args.baseline_dir / out.name)]
+
+        print(f"=== {rows:,} rows: {snap.name}", flush=True)
+        rc = subprocess.call(cmd, cwd=BASE_DIR)
+        failed = failed or rc != 0
+        if out.exists():
+            stages = json.loads(out.read_text(encoding="utf-8"))["summary"]["stages"]
+            overview[rows] = {s: stages[s]["p50"] for s in ("parse", "execute", "render", "total")}
+
+    print("\nrows        p50 parse  p50 execute  p50 render  p50 total (ms)")
+    for rows, p in overview.items():
+        cells = "".join(f"{'—' if v is None else f'{v:.1f}':>12}" for v in p.values())
+        print(f"{rows:<10,}{cells}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
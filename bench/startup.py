@@ -0,0 +1,116 @@
+"""
+Cold-start бенчмарк: сколько стоит `import main_app` в свежем процессе.
+
+Запускает `python -X importtime -c "import main_app"` несколько раз,
+берёт медиану и печатает самые дорогие модули (cumulative, как в importtime),
+плюс суммарное время по пакетам проекта (core/filters/ui) и сторонним.
+
+    python -m bench.startup
+    python -m bench.startup --runs 10 --out startup.json
+    python -m bench.startup --baseline startup.json
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+# import time:       self [us] |  cumulative | imported package
+_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S.*)$")
+PROJECT_PACKAGES = ("core", "filters", "ui", "main_app")
+
+
+def run_once(module: str) -> tuple[float, dict[str, tuple[int, int, int]]]:
+    """(wall ms, {module: (self_us, cumulative_us, depth)})."""
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="")
+    t0 = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BASE_DIR, env=env, capture_output=True, text=True,
+    )
+    wall = (time.perf_counter() - t0) * 1000
+    if proc.returncode != 0:
+        raise SystemExit(f"import {module} failed:\n{proc.stderr[-2000:]}")
+
+    mods: dict[str, tuple[int, int, int]] = {}
+    for line in proc.stderr.splitlines():
+        m = _LINE.match(line)
+        if m:
+            self_us, cum_us, indent, name = int(m[1]), int(m[2]), len(m[3]), m[4].strip()
+            mods[name] = (self_us, cum_us, indent // 2)
+    return wall, mods
+
+
+def summarize(runs: list[tuple[float, dict]], module: str, top: int) -> dict:
+    walls = [w for w, _ in runs]
+    names = set().union(*(m.keys() for _, m in runs))
+
+    def med(name: str, idx: int) -> float:
+        return statistics.median(m[name][idx] for _, m in runs if name in m) / 1000
+
+    per_module = {n: {"self_ms": med(n, 0), "cumulative_ms": med(n, 1)} for n in names}
+    top_level = [n for n in names if all(m.get(n, (0, 0, 0))[2] == 0 for _, m in runs if n in m)]
+
+    project_self = sum(v["self_ms"] for n, v in per_module.items() if n.split(".")[0] in PROJECT_PACKAGES)
+    return {
+        "module": module,
+        "runs": len(runs),
+        "wall_ms_median": statistics.median(walls),
+        "wall_ms_min": min(walls),
+        "import_ms": per_module.get(module, {}).get("cumulative_ms"),
+        "project_self_ms": project_self,
+        "modules_imported": len(names),
+        "top_level": sorted(
+            ({"module": n, **per_module[n]} for n in top_level),
+            key=lambda r: -r["cumulative_ms"],
+        )[:top],
+        "top_self": sorted(
+            ({"module": n, **per_module[n]} for n in names),
+            key=lambda r: -r["self_ms"],
+        )[:top],
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Measure cold import time of main_app with -X importtime")
+    ap.add_argument("--module", default="main_app")
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--top", type=int, default=15)
+    ap.add_argument("--out", type=Path, default=None)
+    ap.add_argument("--baseline", type=Path, default=None)
+    args = ap.parse_args(argv)
+
+    run_once(args.module)  # прогрев .pyc и файлового кэша ОС
+    runs = [run_once(args.module) for _ in range(args.runs)]
+    s = summarize(runs, args.module, args.top)
+
+    print(f"import {s['module']}: {s['import_ms']:.1f} ms (importtime, median of {s['runs']}), "
+          f"process wall {s['wall_ms_median']:.0f} ms, {s['modules_imported']} modules, "
+          f"project code self {s['project_self_ms']:.1f} ms")
+    print(f"\n{'top-level import':40}{'cumulative ms':>15}")
+    for r in s["top_level"]:
+        print(f"{r['module']:40}{r['cumulative_ms']:15.1f}")
+    print(f"\n{'module (self time)':40}{'self ms':>15}")
+    for r in s["top_self"]:
+        print(f"{r['module']:40}{r['self_ms']:15.1f}")
+
+    if args.baseline:
+        b = json.loads(args.baseline.read_text(encoding="utf-8"))
+        print(f"\nvs baseline: import {b['import_ms']:.1f} -> {s['import_ms']:.1f} ms "
+              f"(x{s['import_ms'] / b['import_ms']:.2f}), wall {b['wall_ms_median']:.0f} -> "
+              f"{s['wall_ms_median']:.0f} ms")
+    if args.out:
+        args.out.write_text(json.dumps(s, indent=1), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,282 @@
+"""
+Генератор синтетических snapshot'ов произвольного размера для нагрузочных тестов.
+
+Модель строится по offline_data/T_Local_Snapshot.csv:
+  - каждая синтетическая строка — это "реплика" k реальной строки, поэтому
+    совместное распределение customer / order_type / order_grp / item_type /
+    metal / pstatus / LastOperation+DepartmentName / Casting / description
+    сохраняется как есть (со всеми корреляциями);
+  - номера SO / PO / Job / Bag / casting_lot / style сохраняют формат
+    (префикс, ширину, суффикс), а числовая часть сдвигается на k * stride —
+    внутри реплики строки одного заказа остаются одним заказом;
+  - все даты строки сдвигаются на одно и то же случайное число дней назад
+    (разрывы pdate -> request_date -> Casting_Date -> ship_date сохраняются),
+    история растёт вместе с размером, но не больше --max-history-days;
+  - веса (CastWt, LastWeight) слегка "шумят".
+
+Пишет CSV-gzip (в формате выгрузки Access), Parquet и manifest.json рядом:
+
+    python -m bench.synth_snapshot --rows 100000 1000000 10000000
+    python -m bench.synth_snapshot --rows 50000 --out-dir /tmp/snap --formats parquet
+"""
+from __future__ import annotations
+
+import argparse
+import gzip
+import hashlib
+import json
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+SOURCE = BASE_DIR / "offline_data" / "T_Local_Snapshot.csv"
+OUT_DIR = BASE_DIR / ".cache_snapshot" / "synthetic"
+
+DATE_COLS = ["pdate", "request_date", "Casting_Date", "ship_date"]
+# колонки-идентификаторы: сдвигаем первую группу из 3+ цифр
+ID_COLS = ["SalesOrder", "CustomerPO", "JobNumber", "BagNumber", "casting_lot"]
+# style меняется реже: одна версия стиля на STYLE_REUSE реплик
+STYLE_REUSE = 4
+WEIGHT_COLS = ["CastWt", "LastWeight"]
+
+CHUNK_ROWS = 500_000
+MAX_HISTORY_DAYS = 3650
+
+_NUM_RE = r"^(?P<pre>.*?)(?P<num>\d{3,})(?P<post>.*)$"
+
+
+def load_source(path: Path = SOURCE) -> pd.DataFrame:
+    import duckdb
+    from core.db_utils import SNAPSHOT_TIMESTAMP_FORMAT
+
+    p = str(path).replace("'", "''")
+    con = duckdb.connect()
+    try:
+        return con.execute(
+            f"SELECT * FROM read_csv_auto('{p}', compression='auto', timestampformat='{SNAPSHOT_TIMESTAMP_FORMAT}')"
+        ).df()
+    finally:
+        con.close()
+
+
+class SnapshotModel:
+    """То, что выучено из исходного snapshot: строки-шаблоны + разбор номеров."""
+
+    def __init__(self, src: pd.DataFrame):
+        self.src = src.reset_index(drop=True)
+        self.n = len(self.src)
+        self.columns = list(self.src.columns)
+
+        self.id_parts: dict[str, dict] = {}
+        for col in ID_COLS + ["style"]:
+            if col in self.src.columns:
+                self.id_parts[col] = self._split_numbers(self.src[col])
+
+        dates = pd.concat([self.src[c] for c in DATE_COLS if c in self.src.columns])
+        self.max_date = dates.max()
+        self.span_days = max(int((dates.max() - dates.min()).days), 1)
+
+    @staticmethod
+    def _split_numbers(s: pd.Series) -> dict:
+        parts = s.astype("string").str.extract(_NUM_RE)
+        num = pd.to_numeric(parts["num"], errors="coerce")
+        width = parts["num"].str.len().fillna(0).astype("int64")
+        # stride считаем отдельно для каждого формата (префикс + ширина номера),
+        # иначе NS-112793 и 7175790 в одной колонке дают огромный шаг
+        fmt = parts["pre"].fillna("") + "|" + width.astype(str)
+        g = num.groupby(fmt)
+        stride = (g.transform("max") - g.transform("min") + 1).fillna(0).astype("int64")
+        return {
+            "pre": parts["pre"].fillna("").to_numpy(dtype=object),
+            "post": parts["post"].fillna("").to_numpy(dtype=object),
+            "num": num.fillna(0).astype("int64").to_numpy(),
+            "width": width.to_numpy(),
+            "has": num.notna().to_numpy(),
+            "stride": stride.to_numpy(),
+        }
+
+    def history_days(self, rows: int, max_history_days: int) -> int:
+        scale = rows / max(self.n, 1)
+        return int(min(max(self.span_days * scale, self.span_days), max_history_days))
+
+    # ---------- генерация ----------
+
+    def _shift_ids(self, col: str, idx: np.ndarray, k: np.ndarray) -> pd.Series:
+        p = self.id_parts[col]
+        out = self.src[col].to_numpy(dtype=object)[idx].copy()
+        has = p["has"][idx]
+        if not has.any():
+            return pd.Series(out, dtype="object")
+
+        rows = np.flatnonzero(has)
+        src_rows = idx[rows]
+        new_num = p["num"][src_rows] + k[rows] * p["stride"][src_rows]
+        widths = p["width"][src_rows]
+        num_str = pd.Series(new_num.astype(str))
+        for w in np.unique(widths):
+            m = widths == w
+            num_str[m] = num_str[m].str.zfill(int(w))
+        out[rows] = p["pre"][src_rows] + num_str.to_numpy(dtype=object) + p["post"][src_rows]
+        return pd.Series(out, dtype="object")
+
+    def generate_chunk(self, start: int, size: int, rng: np.random.Generator, history_days: int) -> pd.DataFrame:
+        i = np.arange(start, start + size, dtype=np.int64)
+        idx = (i % self.n).astype(np.int64)
+        k = i // self.n
+
+        chunk = self.src.iloc[idx].reset_index(drop=True)
+
+        for col in ID_COLS:
+            if col in self.id_parts:
+                chunk[col] = self._shift_ids(col, idx, k)
+        if "style" in self.id_parts:
+            chunk["style"] = self._shift_ids("style", idx, k // STYLE_REUSE)
+
+        # одна и та же сдвижка для всех дат строки; k=0 — исходные даты
+        shift_days = np.where(k == 0, 0, rng.integers(0, max(history_days - self.span_days, 1), size))
+        shift = pd.to_timedelta(shift_days, unit="D")
+        for col in DATE_COLS:
+            if col in chunk.columns:
+                chunk[col] = chunk[col] - shift
+
+        for col in WEIGHT_COLS:
+            if col in chunk.columns:
+                noise = np.where(k == 0, 1.0, rng.normal(1.0, 0.05, size).clip(0.8, 1.2))
+                chunk[col] = (chunk[col] * noise).round(2)
+
+        # перемешиваем, чтобы реплики не шли блоками
+        return chunk.iloc[rng.permutation(size)].reset_index(drop=True)
+
+
+def _access_dates(df: pd.DataFrame) -> pd.DataFrame:
+    """Даты в формате выгрузки Access: 12/9/2025 0:00:00."""
+    out = df.copy()
+    for col in DATE_COLS:
+        if col in out.columns:
+            d = out[col]
+            s = (
+                d.dt.month.astype("Int64").astype("string") + "/"
+                + d.dt.day.astype("Int64").astype("string") + "/"
+                + d.dt.year.astype("Int64").astype("string") + " 0:00:00"
+            )
+            out[col] = s
+    return out
+
+
+def _arrow_schema(src: pd.DataFrame):
+    import pyarrow as pa
+
+    fields = []
+    for col, dtype in src.dtypes.items():
+        if pd.api.types.is_datetime64_any_dtype(dtype):
+            t = pa.timestamp("us")
+        elif pd.api.types.is_integer_dtype(dtype):
+            t = pa.int64()
+        elif pd.api.types.is_float_dtype(dtype):
+            t = pa.float64()
+        else:
+            t = pa.string()
+        fields.append(pa.field(col, t))
+    return pa.schema(fields)
+
+
+def _file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def generate(
+    model: SnapshotModel,
+    rows: int,
+    out_dir: Path = OUT_DIR,
+    formats: tuple[str, ...] = ("csv.gz", "parquet"),
+    seed: int = 42,
+    max_history_days: int = MAX_HISTORY_DAYS,
+) -> dict:
+    """Пишет snapshot_synth_<rows>.{csv.gz,parquet} + .manifest.json, возвращает manifest."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    stem = f"snapshot_synth_{rows}"
+    csv_path = out_dir / f"{stem}.csv.gz"
+    pq_path = out_dir / f"{stem}.parquet"
+
+    rng = np.random.default_rng(seed)
+    history_days = model.history_days(rows, max_history_days)
+    schema = _arrow_schema(model.src)
+
+    csv_fh = gzip.open(csv_path, "wt", encoding="utf-8", newline="", compresslevel=6) if "csv.gz" in formats else None
+    pq_writer = pq.ParquetWriter(pq_path, schema, compression="zstd") if "parquet" in formats else None
+    try:
+        for start in range(0, rows, CHUNK_ROWS):
+            size = min(CHUNK_ROWS, rows - start)
+            chunk = model.generate_chunk(start, size, rng, history_days)
+            if csv_fh is not None:
+                _access_dates(chunk).to_csv(csv_fh, header=(start == 0), index=False)
+            if pq_writer is not None:
+                pq_writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            print(f"  {stem}: {start + size:,}/{rows:,}", file=sys.stderr)
+    finally:
+        if csv_fh is not None:
+            csv_fh.close()
+        if pq_writer is not None:
+            pq_writer.close()
+
+    now = datetime.now()
+    manifest = {
+        "rows": rows,
+        "cols": len(model.columns),
+        "updated_at_local": now.strftime("%Y-%m-%d %H:%M:%S"),
+        "updated_at_utc": datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),
+        "generator": {
+            "source": str(SOURCE.name),
+            "source_rows": model.n,
+            "seed": seed,
+            "history_days": history_days,
+        },
+    }
+    if csv_fh is not None:
+        manifest["snapshot"] = {"file": csv_path.name, "sha256": _file_sha256(csv_path), "bytes": csv_path.stat().st_size}
+    if pq_writer is not None:
+        manifest["parquet"] = {"file": pq_path.name, "sha256": _file_sha256(pq_path), "bytes": pq_path.stat().st_size}
+
+    (out_dir / f"{stem}.manifest.json").write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    return manifest
+
+
+def ensure_snapshot(rows: int, fmt: str = "parquet", out_dir: Path = OUT_DIR, seed: int = 42) -> Path:
+    """Путь к синтетическому snapshot нужного размера; генерирует, если его ещё нет."""
+    path = out_dir / f"snapshot_synth_{rows}.{fmt}"
+    if not path.exists():
+        generate(SnapshotModel(load_source()), rows, out_dir, formats=(fmt,), seed=seed)
+    return path
+
+
+def main(argv: list[str] | None = None) -> None:
+    ap = argparse.ArgumentParser(description="Generate synthetic T_Local_Snapshot files")
+    ap.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000, 10_000_000])
+    ap.add_argument("--out-dir", type=Path, default=OUT_DIR)
+    ap.add_argument("--formats", nargs="+", choices=["csv.gz", "parquet"], default=["csv.gz", "parquet"])
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--max-history-days", type=int, default=MAX_HISTORY_DAYS)
+    args = ap.parse_args(argv)
+
+    model = SnapshotModel(load_source())
+    for rows in args.rows:
+        m = generate(model, rows, args.out_dir, tuple(args.formats), args.seed, args.max_history_days)
+        print(json.dumps({k: m[k] for k in m if k in ("rows", "snapshot", "parquet")}))
+
+
+if __name__ == "__main__":
+    main()
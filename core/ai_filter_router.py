@@ -1,26 +1,8 @@
-import os
-print(">>> AI ROUTER LOADED FROM:", os.path.abspath(__file__))
-
 import re
 
-from filters.date_filter import parse_date_range
-from filters.metal_filter import parse_metal_filter
-from filters.order_type_filter import parse_order_type_filter
-from filters.item_type_filter import parse_item_type_filter
-from filters.customer_filter import parse_customer_filter
-from filters.customer_shortname_filter import parse_customer_shortname_filter
-from filters.salesorder_filter import parse_salesorder_filter
-from filters.jobnumber_filter import parse_jobnumber_filter
-from filters.item_size_filter import parse_item_size_filter  # фильтр по размеру
-from filters.pstatus_filter import parse_pstatus_filter      # фильтр по pstatus (CANCEL/HOLD)
-from filters.department_filter import parse_department_filter      # фильтр по DepartmentName
-from filters.last_operation_filter import parse_last_operation_filter  # фильтр по LastOperation
-from filters.casting_lot_filter import parse_casting_lot_filter  # фильтр по casting_lot
-from filters.order_group_filter import parse_order_group_filter
-from filters.style_filter import parse_style_filter
-from filters.bagnumber_filter import parse_bagnumber_filter
-
-
+from core import memory, snapshot_store
+from core.single_flight import SingleFlight
+from core.filter_registry import registry as flt
 
 
 def _strip_and(part: str) -> str:
@@ -67,8 +49,8 @@ def _build_metal_item_pair_clause(text: str) -> str:
         seg_lower = seg.lower()
 
         # Базовый разбор
-        metal_part = parse_metal_filter(seg)
-        item_part = parse_item_type_filter(seg)
+        metal_part = flt.parse_metal_filter(seg)
+        item_part = flt.parse_item_type_filter(seg)
 
         # Если металл не распознан, но в сегменте есть цвет и тип изделия,
         # пробуем трактовать это как GOLD (например 'earring yellow' -> 'yellow gold')
@@ -76,7 +58,7 @@ def _build_metal_item_pair_clause(text: str) -> str:
             has_color = any(tok in seg_lower.split() for tok in color_tokens)
             if has_color:
                 # добавляем 'gold' в конец сегмента только для metal-фильтра
-                metal_part = parse_metal_filter(seg + " gold")
+                metal_part = flt.parse_metal_filter(seg + " gold")
 
         metal_cond = _strip_and(metal_part)
         item_cond = _strip_and(item_part)
@@ -90,15 +72,42 @@ def _build_metal_item_pair_clause(text: str) -> str:
     return " AND (" + " OR ".join(groups) + ")"
 
 
+# memo разбора: (запрос, "сегодня", sha snapshot) -> SQL. День в ключе — из-за
+# относительных дат (today / this week / last month ...), sha — словари сущностей
+# и исправление опечаток фильтров строятся по загруженному snapshot.
+_parse_memo = memory.register_cache(
+    memory.BoundedCache("parse", max_entries=4096, enabled=memory.QUERY_CACHES), memory.PRIORITY_PARSE
+)
+# одна и та же кнопка в нескольких сессиях одновременно — один разбор
+_parse_inflight = SingleFlight("parse")
+
+
 def ai_parse_query(user_query: str) -> str:
+    from filters import date_filter  # уже в sys.modules после первого запроса
+
+    store = snapshot_store.current_store()
+    key = (user_query, date_filter._today(), store.sha if store is not None else None)
+    sql = _parse_memo.get(key)
+    if sql is None:
+        sql, shared = _parse_inflight.do(key, _parse_query, user_query)
+        if not shared:
+            _parse_memo.put(key, sql)
+    return sql
+
+
+def _parse_query(user_query: str) -> str:
     """Центральный маршрутизатор фильтров."""
 
     q = user_query.strip().lower()
     sql = "SELECT * FROM [T_Local_Snapshot] WHERE 1=1"
 
+    # --- "description contains ..." вырезаем сразу: слова описания ("ring",
+    # "gold", "casting") не должны попадать в остальные фильтры и выбор даты ---
+    description_sql, q = flt.parse_description_filter(q)
+
     # --- Проверка на кривой запрос "shipping last" без периода ---
     if ("ship" in q or "shipping" in q or "shipped" in q) and "last" in q:
-        if not re.search(r"(week|month|months|day|days|year|years|\d+\s+days|\d+\s+months)", q):
+        if not re.search(r"(week|month|months|quarter|day|days|year|years|\d+\s+days|\d+\s+months)", q):
             return (
                 "Invalid request: “shipping last” requires a time period. "
                 "Examples: shipping last week, shipping last 2 months, shipping last 45 days."
@@ -118,7 +127,7 @@ def ai_parse_query(user_query: str) -> str:
 
     # --- Разбор дат ---
     original_q = q  # исходный текст (lowercase)
-    start, end, cleaned_text = parse_date_range(q)
+    start, end, cleaned_text = flt.parse_date_range(q)
 
     # Очищенный текст без дат идёт дальше в фильтры
     q = cleaned_text
@@ -156,10 +165,10 @@ def ai_parse_query(user_query: str) -> str:
             sql += f" AND ({date_field} <= #{end.strftime('%m/%d/%Y')}#)"
 
     # --- Order type filter ---
-    sql += parse_order_type_filter(q)
+    sql += flt.parse_order_type_filter(q)
 
     # --- Metal filter (по ИСХОДНОМУ запросу, чтобы видеть 'not gold' и т.п.) ---
-    metal_part_1 = parse_metal_filter(original_q)
+    metal_part_1 = flt.parse_metal_filter(original_q)
 
     # Fallback: если металл не распознан, но есть только цвет (white/yellow/rose/red),
     # трактуем его как GOLD-цвет (yellow gold, white gold, rose gold).
@@ -169,16 +178,16 @@ def ai_parse_query(user_query: str) -> str:
         has_color = any(re.search(rf"\b{ct}\b", original_q) for ct in color_tokens)
         has_base = any(bt in original_q for bt in base_tokens)
         if has_color and not has_base:
-            metal_part_1 = parse_metal_filter(original_q + " gold")
+            metal_part_1 = flt.parse_metal_filter(original_q + " gold")
 
     if metal_part_1:
         sql += metal_part_1
 
     # --- Item type filter ---
-    sql += parse_item_type_filter(q)
+    sql += flt.parse_item_type_filter(q)
 
     # --- Item size filter ---
-    sql += parse_item_size_filter(q)
+    sql += flt.parse_item_size_filter(q)
 
     # --- Специальная логика пар "metal + item" через AND ---
     pair_clause = _build_metal_item_pair_clause(q)
@@ -186,40 +195,43 @@ def ai_parse_query(user_query: str) -> str:
         sql += pair_clause
 
     # --- SalesOrder / PO ---
-    salesorder_sql = parse_salesorder_filter(original_q)
+    salesorder_sql = flt.parse_salesorder_filter(original_q)
     if salesorder_sql:
         sql += salesorder_sql
 
     # --- JobNumber ---
-    sql += parse_jobnumber_filter(original_q)
+    sql += flt.parse_jobnumber_filter(original_q)
 
 
     # --- BagNumber ---
-    sql += parse_bagnumber_filter(original_q)
+    sql += flt.parse_bagnumber_filter(original_q)
 
     # --- Style ---
-    sql += parse_style_filter(original_q)
+    sql += flt.parse_style_filter(original_q)
 
     # --- Order Group (region/office: USA / Canada / Thailand / UK / Ausrtalia) ---
-    sql += parse_order_group_filter(original_q)
+    sql += flt.parse_order_group_filter(original_q)
 
     # --- Customer ---
-    sql += parse_customer_filter(q)
+    sql += flt.parse_customer_filter(q)
 
     # --- Customer (короткие имена без слова "customer": SUNCOR, D4D, AZURE, ...) ---
-    sql += parse_customer_shortname_filter(q)
+    sql += flt.parse_customer_shortname_filter(q)
 
     # --- Casting lot ---
-    sql += parse_casting_lot_filter(original_q)
+    sql += flt.parse_casting_lot_filter(original_q)
 
     # --- PSTATUS (пока только CANCEL / HOLD и т.п. из pstatus_filter) ---
-    sql += parse_pstatus_filter(original_q)
+    sql += flt.parse_pstatus_filter(original_q)
 
     # --- DepartmentName ---
-    sql += parse_department_filter(original_q)
+    sql += flt.parse_department_filter(original_q)
 
     # --- LastOperation ---
-    sql += parse_last_operation_filter(original_q)
+    sql += flt.parse_last_operation_filter(original_q)
+
+    # --- description (полнотекстовый поиск) ---
+    sql += description_sql
 
     # ===================== CASTING-СТАТУС =====================
 
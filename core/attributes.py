@@ -0,0 +1,122 @@
+"""
+Атрибуты изделия, извлечённые из description и style при загрузке snapshot.
+
+Камни, вес и металл записаны в строках, и каждый фильтр/агрегат разбирал
+бы их заново регулярками на каждом запросе. Ingest-шаг "attributes" один
+раз считает их векторно (DuckDB regex по уникальным значениям колонки,
+на строки — одним UPDATE с join) и кладёт в типизированные колонки самой
+T_Local_Snapshot:
+
+  - stone_count  INTEGER — сумма групп `N=W` в description
+                  (`1=.60RBC LAB 30=.40RBC` -> 31); NULL — групп нет;
+  - carat_weight DOUBLE  — сумма весов тех же групп (-> 1.00); без групп —
+                  вес вида `3.00CT` / `2.05cts`; NULL — веса нет;
+  - lab_grown    BOOLEAN — LAB / LAB GROWN / LG / LGD / CVD / HPHT в description
+                  или .LAB / .LG в style;
+  - style_metal  VARCHAR — металл из style: первый токен (между - . / пробелом)
+                  вида 10WG / 14Y / 18YW / SLV / 925 / PLAT / BRASS, приведённый
+                  к кодам колонки metal (10Y -> 10YG, 925 -> SLV); NULL — нет;
+  - base_style   VARCHAR — style до металла: `BLB-9868.1.00-18YG` -> BLB-9868.1.00,
+                  `T1192-10WG` -> T1192; без металла — весь upper(trim(style)).
+
+Колонки производные (SnapshotStore.add_columns): в SELECT * результатов
+фильтров их нет, layout'ы видят те же колонки, что и раньше. Запросы и
+агрегаты обращаются к ним явно — например, вес камней по клиентам
+(carat_by_customer) — это скан двух колонок без разбора текста.
+"""
+from __future__ import annotations
+
+import pandas as pd
+
+from core import snapshot_store
+
+# токены style разделяются так же, как их пишут в номенклатуре: 3803.10YW.LAB-BL
+_SEP = r"[-. /]"
+_METAL = r"(?:9|10|14|18|22|24)K?(?:YG|WG|RG|PG|YW|WY|WR|RW|YR|RY|Y|W|R)|SLV|925|PLAT|BRASS"
+_STONES = r"(\d+)\s*=\s*(\d*\.?\d+)"
+_CARATS = r"(\d*\.\d+)\s*CTS?\b"
+_LAB_DESCRIPTION = r"\bLAB\b|LAB[- ]?GROWN|\bLGD?\b|\bCVD\b|\bHPHT\b"
+_LAB_STYLE = rf"(?:^|{_SEP})(?:LAB|LG)(?:$|{_SEP})"
+
+
+def _sum_groups(text: str, group: int, cast: str) -> str:
+    return (
+        f"list_sum(list_transform(regexp_extract_all({text}, '{_STONES}', {group}), "
+        f"x -> CAST(x AS {cast})))"
+    )
+
+
+def description_exprs(v: str) -> dict[str, str]:
+    """Атрибуты из значения description v."""
+    descr = f"upper(trim(CAST({v} AS VARCHAR)))"
+    return {
+        "stone_count": _sum_groups(descr, 1, "INTEGER"),
+        "carat_weight": (
+            f"round(coalesce({_sum_groups(descr, 2, 'DOUBLE')}, "
+            f"TRY_CAST(nullif(regexp_extract({descr}, '{_CARATS}', 1), '') AS DOUBLE)), 4)"
+        ),
+        "lab": f"coalesce(regexp_matches({descr}, '{_LAB_DESCRIPTION}'), false)",
+    }
+
+
+def style_exprs(v: str) -> dict[str, str]:
+    """Атрибуты из значения style v."""
+    style = f"upper(trim(CAST({v} AS VARCHAR)))"
+    metal = f"regexp_extract({style}, '{_SEP}({_METAL})(?:$|{_SEP})', 1)"
+    base = f"regexp_extract({style}, '^(.*?)\\s*{_SEP}(?:{_METAL})(?:$|{_SEP})', 1)"
+    return {
+        # 10Y -> 10YG, 10KWG -> 10WG, 925 -> SLV: те же коды, что в колонке metal
+        "style_metal": (
+            f"CASE WHEN {metal} = '' THEN NULL WHEN {metal} = '925' THEN 'SLV' "
+            f"ELSE regexp_replace(regexp_replace({metal}, '^(\\d+)K', '\\1'), '^(\\d+)([YWR])$', '\\1\\2G') END"
+        ),
+        "base_style": f"CASE WHEN {base} = '' THEN nullif({style}, '') ELSE {base} END",
+        "lab": f"coalesce(regexp_matches({style}, '{_LAB_STYLE}'), false)",
+    }
+
+
+COLUMNS = {
+    "stone_count": "INTEGER",
+    "carat_weight": "DOUBLE",
+    "lab_grown": "BOOLEAN",
+    "style_metal": "VARCHAR",
+    "base_style": "VARCHAR",
+}
+
+
+def _distinct(column: str, exprs: dict[str, str]) -> str:
+    cols = ", ".join(f"{e} AS {n}" for n, e in exprs.items())
+    return f'(SELECT v, {cols} FROM (SELECT DISTINCT "{column}" AS v FROM {snapshot_store.TABLE}))'
+
+
+def build(store: snapshot_store.SnapshotStore) -> None:
+    if "description" not in store.columns or "style" not in store.columns:
+        return
+    # регулярки — по уникальным значениям (description: ~2 тыс., style: ~70 тыс.
+    # на 1 млн строк), по строкам — только join: ~1.3 с вместо ~6 с на 1 млн
+    t = snapshot_store.TABLE
+    store.add_columns(
+        COLUMNS,
+        {
+            "stone_count": "d.stone_count",
+            "carat_weight": "d.carat_weight",
+            "lab_grown": "d.lab OR s.lab",
+            "style_metal": "s.style_metal",
+            "base_style": "s.base_style",
+        },
+        f"FROM {_distinct('description', description_exprs('v'))} d, {_distinct('style', style_exprs('v'))} s "
+        f'WHERE {t}."description" IS NOT DISTINCT FROM d.v AND {t}."style" IS NOT DISTINCT FROM s.v',
+    )
+
+
+def carat_by_customer(store: snapshot_store.SnapshotStore) -> pd.DataFrame:
+    """Камни и вес (ct) по клиентам, включая долю lab grown."""
+    return store.query(
+        f"SELECT customer, sum(stone_count) AS stones, round(sum(carat_weight), 2) AS carats, "
+        f"round(sum(carat_weight) FILTER (WHERE lab_grown), 2) AS lab_carats "
+        f"FROM {snapshot_store.TABLE} WHERE carat_weight IS NOT NULL "
+        f"GROUP BY customer ORDER BY carats DESC"
+    )
+
+
+snapshot_store.register_ingest_step("attributes", build)
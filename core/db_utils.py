@@ -4,10 +4,20 @@ import json
 import io
 import gzip
 import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 from pathlib import Path
 
 import pandas as pd
-import requests
+
+# модули ingest-шагов (индексы, словари) snapshot_store импортирует сам при
+# загрузке snapshot; dict_codes / sql_rewrite — при первом запросе
+from core import memory, metrics, snapshot_store
+from core.single_flight import SingleFlight
+from core.usage_log import LOG_DIR
 
 # ===== ONLINE (Google Drive public links for test) =====
 # Для теста файлы в Drive должны быть "Anyone with the link → Viewer".
@@ -33,6 +43,14 @@ ACCESS_DB_PATH = os.getenv("ACCESS_DB_PATH", r"J:\02.Productions\GG\Ai\MainBaseA
 CACHE_DIR = Path(os.getenv("SNAPSHOT_CACHE_DIR", Path(__file__).resolve().parent.parent / ".cache_snapshot"))
 CACHE_DIR.mkdir(parents=True, exist_ok=True)
 
+# В выгрузке из Access даты вида "12/9/2025 0:00:00"; ISO-даты DuckDB распознаёт и так.
+SNAPSHOT_TIMESTAMP_FORMAT = "%m/%d/%Y %H:%M:%S"
+
+
+def _local_snapshot_path() -> str:
+    """Локальный snapshot (offline_data/..., бенчмарки): если задан — Google Drive не трогаем."""
+    return os.getenv("SNAPSHOT_PATH", "").strip()
+
 
 def _sha256_bytes(data: bytes) -> str:
     h = hashlib.sha256()
@@ -42,6 +60,8 @@ def _sha256_bytes(data: bytes) -> str:
 
 def _gdrive_download_public(file_id: str, timeout: int = 120) -> bytes:
     """Скачивание из Google Drive для режима 'Anyone with the link'."""
+    import requests  # нужен только при скачивании snapshot (~80 ms на импорт)
+
     url = "https://drive.google.com/uc?export=download"
     s = requests.Session()
 
@@ -62,6 +82,8 @@ def _gdrive_download_public(file_id: str, timeout: int = 120) -> bytes:
     for chunk in r.iter_content(chunk_size=1024 * 256):
         if chunk:
             data.write(chunk)
+    kind = "manifest" if file_id == GDRIVE_MANIFEST_ID else "snapshot"
+    metrics.DOWNLOAD_BYTES.inc(data.tell(), kind=kind)
     return data.getvalue()
 
 
@@ -70,26 +92,82 @@ def _load_manifest() -> dict:
     return json.loads(raw.decode("utf-8"))
 
 
+# Последний использованный snapshot (для логов/метрик): sha, путь, был ли он в кэше,
+# когда он обновлён (unix time: manifest updated_at_utc или mtime файла).
+_snapshot_info: dict = {"sha": None, "path": None, "cache_hit": None, "updated_at": None}
+
+
+def snapshot_info() -> dict:
+    """Копия сведений о snapshot, на котором выполнялся последний запрос."""
+    return dict(_snapshot_info)
+
+
+def _remember_snapshot(target: Path, sha: str | None, cache_hit: bool, updated_at: float | None = None) -> Path:
+    if updated_at is None:
+        try:
+            updated_at = target.stat().st_mtime
+        except OSError:
+            updated_at = None
+    if sha != _snapshot_info["sha"] or updated_at != _snapshot_info["updated_at"]:
+        metrics.set_snapshot(sha, updated_at)
+    _snapshot_info.update(sha=sha, path=str(target), cache_hit=cache_hit, updated_at=updated_at)
+    metrics.cache_lookup("snapshot", cache_hit)
+    return target
+
+
+def _manifest_updated_at(manifest: dict) -> float | None:
+    raw = manifest.get("updated_at_utc")
+    if not raw:
+        return None
+    try:
+        return datetime.strptime(raw, "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc).timestamp()
+    except ValueError:
+        return None
+
+
+_local_sha_cache: dict = {}
+
+
+def _local_snapshot_file(path_str: str) -> Path:
+    target = Path(path_str)
+    st_ = target.stat()
+    key = (str(target), st_.st_mtime_ns, st_.st_size)
+    sha = _local_sha_cache.get(key)
+    if sha is None:
+        h = hashlib.sha256()
+        with open(target, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(chunk)
+        sha = _local_sha_cache[key] = h.hexdigest()
+    return _remember_snapshot(target, sha, True)
+
+
 def _ensure_snapshot_file() -> Path:
     """
     Скачивает snapshot.csv.gz, если:
       - его нет в кэше
       - или sha256 из manifest изменился
+    (или сразу возвращает локальный файл из SNAPSHOT_PATH)
     """
+    local = _local_snapshot_path()
+    if local:
+        return _local_snapshot_file(local)
+
     manifest = _load_manifest()
     sha = (manifest.get("snapshot") or {}).get("sha256")
+    updated_at = _manifest_updated_at(manifest)
 
     if not sha:
         target = CACHE_DIR / "snapshot.csv.gz"
         if target.exists():
-            return target
+            return _remember_snapshot(target, None, True)
         raw = _gdrive_download_public(GDRIVE_SNAPSHOT_ID)
         target.write_bytes(raw)
-        return target
+        return _remember_snapshot(target, _sha256_bytes(raw), False)
 
     target = CACHE_DIR / f"snapshot_{sha}.csv.gz"
     if target.exists():
-        return target
+        return _remember_snapshot(target, sha, True, updated_at)
 
     raw = _gdrive_download_public(GDRIVE_SNAPSHOT_ID)
     got_sha = _sha256_bytes(raw)
@@ -97,10 +175,13 @@ def _ensure_snapshot_file() -> Path:
         target = CACHE_DIR / f"snapshot_{got_sha}.csv.gz"
 
     target.write_bytes(raw)
-    return target
+    return _remember_snapshot(target, got_sha, False, updated_at)
 
 
 _date_pat = re.compile(r"#(\d{1,2})/(\d{1,2})/(\d{4})#")
+_like_lit_pat = re.compile(r"\bLIKE\s+'((?:[^']|'')*)'", re.IGNORECASE)
+_ACCESS_LIKE_ESC = re.compile(r"\[([%_\[])\]")
+_ident_pat = re.compile(r"'(?:[^']|'')*'|\[([^\]]+)\]")
 
 
 def _access_sql_to_duckdb(sql: str) -> str:
@@ -132,24 +213,188 @@ def _access_sql_to_duckdb(sql: str) -> str:
         return f"DATE '{yy:04d}-{mm:02d}-{dd:02d}'"
     s = _date_pat.sub(repl_date, s)
 
-    s = re.sub(r"\[([^\]]+)\]", r'"\1"', s)
+    # LIKE-литералы с экранированием Access ([%], [_], [[]) -> ESCAPE '\'
+    def repl_like(m):
+        lit = m.group(1)
+        if not _ACCESS_LIKE_ESC.search(lit):
+            return m.group(0)
+        lit = _ACCESS_LIKE_ESC.sub(lambda e: "\\" + e.group(1) if e.group(1) in "%_" else e.group(1),
+                                   lit.replace("\\", "\\\\"))
+        return f"LIKE '{lit}' ESCAPE '\\'"
+    s = _like_lit_pat.sub(repl_like, s)
+
+    # [колонка] -> "колонка"; строковые литералы не трогаем
+    s = _ident_pat.sub(lambda m: f'"{m.group(1)}"' if m.group(1) is not None else m.group(0), s)
 
     return s
 
 
-def _execute_duckdb_on_snapshot(sql: str) -> pd.DataFrame:
-    import duckdb
+def _snapshot_reader(snapshot_path: Path) -> str:
+    """Table function для snapshot: CSV(.gz) из Access или Parquet (синтетические snapshot'ы)."""
+    path_str = str(snapshot_path).replace("'", "''")
+    if str(snapshot_path).lower().endswith(".parquet"):
+        return f"read_parquet('{path_str}')"
+    return f"read_csv_auto('{path_str}', compression='auto', timestampformat='{SNAPSHOT_TIMESTAMP_FORMAT}')"
+
+
+# Кэш результатов: (sha snapshot, DuckDB SQL) -> DataFrame. Отдаём shallow copy —
+# при copy-on-write (pandas 3) изменения в layout'ах не портят кэш.
+RESULT_CACHE_MB = float(_get_secret("RESULT_CACHE_MB", "256"))
+_results = memory.register_cache(
+    memory.BoundedCache("results", max_bytes=int(RESULT_CACHE_MB * 1024 * 1024), max_entries=64,
+                        enabled=memory.QUERY_CACHES),
+    memory.PRIORITY_RESULTS,
+)
+# Одинаковые запросы разных сессий, пришедшие пока первый ещё выполняется
+# (кэш ещё пуст), ждут его результат, а не выполняются заново.
+_inflight = SingleFlight("execute")
+
+
+def load_snapshot() -> snapshot_store.SnapshotStore:
+    """Текущий snapshot, загруженный со всеми ingest-шагами (warm-up)."""
+    snapshot_path = _ensure_snapshot_file()
+    return snapshot_store.get_store(snapshot_path, _snapshot_info.get("sha"), _snapshot_reader(snapshot_path))
+
 
+def _execute_duckdb_on_snapshot(sql: str) -> pd.DataFrame:
     snapshot_path = _ensure_snapshot_file()
+    sha = _snapshot_info.get("sha")
     duck_sql = _access_sql_to_duckdb(sql)
 
-    con = duckdb.connect(database=":memory:")
-    path_str = str(snapshot_path).replace("'", "''")
-    con.execute(f"CREATE OR REPLACE VIEW T_Local_Snapshot AS SELECT * FROM read_csv_auto('{path_str}', compression='gzip');")
+    key = (sha, duck_sql)
+    cached = _results.get(key) if sha else None
+    if cached is not None:
+        return cached.copy(deep=False)
+    if not sha:
+        return _run_on_snapshot(sql, duck_sql, snapshot_path, sha)
+    df, _shared = _inflight.do(key, _run_on_snapshot, sql, duck_sql, snapshot_path, sha)
+    return df.copy(deep=False)
+
+
+def _run_on_snapshot(sql: str, duck_sql: str, snapshot_path: Path, sha: str | None) -> pd.DataFrame:
+    from core import dict_codes, sql_rewrite
+
+    if sha:
+        # лидер single-flight мог стартовать сразу после того, как предыдущий положил результат
+        cached = _results.get((sha, duck_sql))
+        if cached is not None:
+            return cached
+
+    store = snapshot_store.get_store(snapshot_path, sha, _snapshot_reader(snapshot_path))
+    t0 = time.perf_counter()
+    # индекс snapshot может свести запрос к выборке строк по row id; условия
+    # на колонки-словари (metal, pstatus, ...) сворачиваются в один IN по кодам
+    plan = sql_rewrite.plan(duck_sql, store)
+    if plan is None:
+        executed = dict_codes.fold(duck_sql, store)
+        df = store.query(executed)
+    else:
+        executed = dict_codes.fold_where(plan.where, store)
+        df = store.fetch(plan.row_ids, executed)
+    elapsed_ms = (time.perf_counter() - t0) * 1000
+
+    if elapsed_ms >= SLOW_QUERY_MS:
+        _capture_slow_query(sql, duck_sql, executed, plan, snapshot_path, sha, elapsed_ms, len(df))
+    if sha:
+        _results.put((sha, duck_sql), df)
+    return df
+
+
+# ===== SLOW-QUERY LOG =====
+# Запросы дольше SLOW_QUERY_MS один раз перезапускаются в фоне под EXPLAIN ANALYZE
+# тем же путём, которым выполнялись: скан — свёрнутый (dict_codes) SQL, индекс —
+# фильтр по строкам-кандидатам. План пишется в logs/slow_queries.jsonl вместе с
+# выполненным SQL, путём (scan / index) и sha snapshot'а.
+SLOW_QUERY_MS = float(_get_secret("SLOW_QUERY_MS", "1000"))
+SLOW_QUERY_LOG = LOG_DIR / "slow_queries.jsonl"
+_SLOW_MAX_PENDING = 4
+_SLOW_SEEN_MAX = 1024
+
+_slow_pool: ThreadPoolExecutor | None = None
+_slow_lock = threading.Lock()
+_slow_pending = 0
+# LRU уже записанных (SQL, sha): не больше _SLOW_SEEN_MAX ключей
+_slow_seen: OrderedDict = OrderedDict()
+
+
+def _capture_slow_query(access_sql: str, duck_sql: str, executed: str, plan, snapshot_path: Path,
+                        sha: str | None, elapsed_ms: float, rows: int) -> None:
+    global _slow_pool, _slow_pending
+    key = (duck_sql, sha)
+    metrics.SLOW_QUERIES.inc()
+    with _slow_lock:
+        # один план на (SQL, snapshot) и не больше _SLOW_MAX_PENDING в очереди
+        if key in _slow_seen:
+            _slow_seen.move_to_end(key)
+            return
+        if _slow_pending >= _SLOW_MAX_PENDING:
+            return
+        _slow_seen[key] = None
+        if len(_slow_seen) > _SLOW_SEEN_MAX:
+            _slow_seen.popitem(last=False)
+        _slow_pending += 1
+        if _slow_pool is None:
+            _slow_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="slow-query-explain")
+    record = {
+        "ts": datetime.now().isoformat(timespec="milliseconds"),
+        "elapsed_ms": round(elapsed_ms, 3),
+        "rows": rows,
+        "snapshot_sha": sha,
+        "snapshot": str(snapshot_path),
+        "access_sql": access_sql,
+        "duckdb_sql": duck_sql,
+        "path": "scan" if plan is None else "index",
+    }
+    if plan is None:
+        record["executed_sql"] = executed
+        row_ids = None
+    else:
+        record["executed_sql"] = f"SELECT * FROM candidate_rows WHERE {executed}"
+        record["indexes"] = list(plan.indexes)
+        record["candidates"] = len(plan.row_ids)
+        row_ids = plan.row_ids
+    _slow_pool.submit(_explain_and_store, record, executed, row_ids)
+
+
+def _explain_and_store(record: dict, executed: str, row_ids=None) -> None:
+    global _slow_pending
+    try:
+        # план снимаем на том же snapshot и тем же путём, что и запрос
+        store = snapshot_store.current_store()
+        if store is None or store.sha != record["snapshot_sha"]:
+            raise RuntimeError("snapshot reloaded before EXPLAIN")
+        t0 = time.perf_counter()
+        if row_ids is None:
+            record["plan"] = store.explain(executed)
+        else:
+            record["plan"] = store.explain_fetch(row_ids, executed)
+        record["explain_ms"] = round((time.perf_counter() - t0) * 1000, 3)
+    except Exception as e:
+        record["plan"] = None
+        record["error"] = f"{type(e).__name__}: {e}"
     try:
-        return con.execute(duck_sql).df()
+        SLOW_QUERY_LOG.parent.mkdir(parents=True, exist_ok=True)
+        with _slow_lock, open(SLOW_QUERY_LOG, "a", encoding="utf-8") as fh:
+            fh.write(json.dumps(record, ensure_ascii=False) + "\n")
+    except Exception:
+        pass
     finally:
-        con.close()
+        with _slow_lock:
+            _slow_pending -= 1
+
+
+def read_slow_queries(limit: int = 200) -> list[dict]:
+    """Последние записи slow-query log (новые первыми)."""
+    if not SLOW_QUERY_LOG.exists():
+        return []
+    out = []
+    with open(SLOW_QUERY_LOG, encoding="utf-8") as fh:
+        for line in fh:
+            try:
+                out.append(json.loads(line))
+            except ValueError:
+                continue
+    return out[::-1][:limit]
 
 
 def execute_access_query(sql: str) -> pd.DataFrame:
@@ -161,12 +406,15 @@ def execute_access_query(sql: str) -> pd.DataFrame:
     if os.getenv("DATA_SOURCE", "SNAPSHOT").upper() == "ACCESS":
         try:
             import pyodbc
+            from core import dict_codes, ring_sizes
             conn_str = (
                 r"Driver={Microsoft Access Driver (*.mdb, *.accdb)};"
                 rf"DBQ={ACCESS_DB_PATH};"
             )
             with pyodbc.connect(conn_str) as conn:
-                return pd.read_sql(sql, conn)
+                # те же типы, что у результатов snapshot: колонки-словари — Categorical
+                # [size_us] — производная колонка snapshot, в Access её считает выражение
+                return dict_codes.categorize(pd.read_sql(ring_sizes.to_access(sql), conn))
         except Exception:
             pass
 
@@ -0,0 +1,248 @@
+"""
+Словарное кодирование категориальных колонок snapshot и свёртка условий по ним.
+
+У order_type, customer, metal, item_type, pstatus, LastOperation,
+DepartmentName, order_grp — десятки различных значений на миллион строк, а
+VARCHAR-колонка хранит и сравнивает строку в каждой строке; в pandas это
+object-строки в каждом результате и в каждом groupby layout'ов. Поэтому:
+
+  - ingest-шаг "dict_codes" переводит такие колонки таблицы в DuckDB ENUM
+    (значения — в порядке сортировки, NULL остаётся NULL). Сравнения и
+    LIKE с литералами работают как раньше, GROUP BY идёт по кодам, а
+    результат .df() / Arrow приходит в pandas как Categorical — groupby
+    layout'ов тоже по кодам. Результаты из Access приводятся к тем же
+    типам (categorize);
+  - словарь (store.extras["dict_codes"]): Arrow-таблица значение -> code
+    (enum_code; у NULL code NULL). Для metal ещё производные колонки
+    metal_karat / metal_color / metal_group (10YW -> 10, Y, GOLD; 18WPL ->
+    18, W, PALLADIUM; SLV -> NULL, NULL, SILVER);
+  - перед выполнением (fold) все конъюнкты WHERE, которые ссылаются только
+    на одну такую колонку, вычисляются на словаре — тем же SQL, поэтому
+    результат точный, включая NULL, — и заменяются одним
+    `enum_code("metal") IN (...)` (в fetch по Arrow-копии строк — IN по
+    значениям). Так metal_filter на "gold" (12 веток
+    `upper(trim("metal")) LIKE '9W%' OR ...`) не считает upper(trim()) и
+    LIKE на каждой строке. Внутри OR-веток (пары "silver ring and gold
+    pendant") — так же, по каждой ветке.
+
+Результат свёртки по набору конъюнктов кэшируется на snapshot.
+"""
+from __future__ import annotations
+
+import re
+import threading
+from typing import NamedTuple
+
+import pandas as pd
+
+from core import metrics, snapshot_store, sql_rewrite
+
+CODED_COLUMNS = (
+    "order_type",
+    "customer",
+    "metal",
+    "item_type",
+    "pstatus",
+    "LastOperation",
+    "DepartmentName",
+    "order_grp",
+)
+
+_METAL = r"^(9|10|14|18|22|24)K?([WYR])"
+
+METAL_COLUMNS = {
+    "metal_karat": "UTINYINT",
+    "metal_color": "VARCHAR",
+    "metal_group": "VARCHAR",
+}
+
+_FOLD_CACHE_MAX = 4096
+
+
+def _metal_exprs(v: str) -> dict[str, str]:
+    m = f"upper(trim(CAST({v} AS VARCHAR)))"
+    return {
+        "metal_karat": f"TRY_CAST(nullif(regexp_extract({m}, '{_METAL}', 1), '') AS UTINYINT)",
+        "metal_color": f"nullif(regexp_extract({m}, '{_METAL}', 2), '')",
+        "metal_group": (
+            f"CASE WHEN {m} LIKE 'SLV%' OR {m} LIKE '925%' THEN 'SILVER' "
+            f"WHEN {m} LIKE 'PLAT%' THEN 'PLATINUM' WHEN {m} LIKE 'BRASS%' THEN 'BRASS' "
+            f"WHEN regexp_matches({m}, '{_METAL}PL') THEN 'PALLADIUM' "
+            f"WHEN regexp_matches({m}, '{_METAL}') THEN 'GOLD' END"
+        ),
+    }
+
+
+def to_enum(con, column: str) -> bool:
+    """VARCHAR-колонку T_Local_Snapshot (соединение con) -> ENUM её значений; False — не VARCHAR или пустая."""
+    t = snapshot_store.TABLE
+    cur = con.cursor()
+    try:
+        col_type = cur.execute(
+            f"SELECT data_type FROM information_schema.columns WHERE table_name = '{t}' AND column_name = ?",
+            [column],
+        ).fetchone()
+        if col_type is None or col_type[0] != "VARCHAR":
+            return False
+        if cur.execute(f'SELECT count("{column}") FROM {t}').fetchone()[0] == 0:
+            return False
+        # категории в порядке сортировки строк: sort_index / sort_values по
+        # Categorical дают тот же порядок, что и по object-строкам
+        cur.execute(
+            f'CREATE TYPE "{column}_enum" AS ENUM '
+            f'(SELECT DISTINCT "{column}" FROM {t} WHERE "{column}" IS NOT NULL ORDER BY 1)'
+        )
+        cur.execute(f'ALTER TABLE {t} ALTER "{column}" SET DATA TYPE "{column}_enum"')
+    finally:
+        cur.close()
+    return True
+
+
+def build(store: snapshot_store.SnapshotStore) -> None:
+    t = snapshot_store.TABLE
+    found = {}
+    for c in CODED_COLUMNS:
+        if c not in store.columns or not to_enum(store.con, c):
+            continue
+        cur = store.cursor()
+        try:
+            found[c] = cur.execute(
+                f'SELECT "{c}", enum_code("{c}") AS code FROM (SELECT DISTINCT "{c}" FROM {t})'
+            ).to_arrow_table()
+        finally:
+            cur.close()
+
+    if "metal" in found:
+        select = ", ".join(f"{e} AS {n}" for n, e in _metal_exprs("v").items())
+        cur = store.cursor()
+        try:
+            cur.register("dict_values", found["metal"])
+            cur.execute(f'CREATE TABLE dict_metal AS SELECT "metal" AS v, {select} FROM dict_values')
+            cur.unregister("dict_values")
+        finally:
+            cur.close()
+        store.add_columns(
+            METAL_COLUMNS,
+            {n: f"d.{n}" for n in METAL_COLUMNS},
+            f'FROM dict_metal d WHERE {t}."metal" = d.v',
+        )
+        store.con.execute("DROP TABLE dict_metal")
+    store.extras["dict_codes"] = found
+    store.extras["dict_folds"] = {}
+
+
+def categorize(df: pd.DataFrame) -> pd.DataFrame:
+    """Колонки-словари df (результат не из snapshot, например Access) -> Categorical."""
+    cols = [c for c in CODED_COLUMNS if c in df.columns and not isinstance(df[c].dtype, pd.CategoricalDtype)]
+    if not cols:
+        return df
+    return df.astype({c: "category" for c in cols})
+
+
+# ---------- свёртка WHERE ----------
+
+_IDENT_RE = re.compile(r'"([^"]+)"')
+_LIT_RE = re.compile(r"'(?:[^']|'')*'")
+_fold_lock = threading.Lock()
+
+
+def _columns(expr: str) -> set[str]:
+    """Колонки ("col") в expr вне строковых литералов."""
+    return set(_IDENT_RE.findall(_LIT_RE.sub("''", expr)))
+
+
+class _Fold(NamedTuple):
+    """Значения словаря, на которых конъюнкты истинны."""
+
+    codes: list[int]
+    values: list[str]
+    null: bool
+
+
+def _codes(store, column: str, conjuncts: tuple[str, ...]) -> _Fold:
+    folds = store.extras["dict_folds"]
+    key = (column, conjuncts)
+    got = folds.get(key)
+    if got is None:
+        cur = store.cursor()
+        try:
+            rel = cur.from_arrow(store.extras["dict_codes"][column]).filter(
+                " AND ".join(f"({c})" for c in conjuncts)
+            )
+            rows = sorted(rel.project(f'code, "{column}"').fetchall(), key=lambda r: (r[0] is not None, r[0]))
+        finally:
+            cur.close()
+        got = _Fold([c for c, _ in rows if c is not None], [v for c, v in rows if c is not None],
+                    any(c is None for c, _ in rows))
+        with _fold_lock:
+            if len(folds) >= _FOLD_CACHE_MAX:
+                folds.clear()
+            folds[key] = got
+    return got
+
+
+def _fold(expr: str, store, coded: dict, by_code: bool) -> str:
+    parts = sql_rewrite.split_top(sql_rewrite.strip_parens(expr), "AND")
+    if len(parts) == 1:
+        ors = sql_rewrite.split_top(sql_rewrite.strip_parens(expr), "OR")
+        if len(ors) == 1:
+            return expr
+        folded = [_fold(p, store, coded, by_code) for p in ors]
+        return "(" + " OR ".join(folded) + ")" if folded != ors else expr
+
+    by_column: dict[str, list[str]] = {}
+    rest: list[str] = []
+    for p in parts:
+        cols = _columns(p)
+        if len(cols) == 1 and next(iter(cols)) in coded:
+            by_column.setdefault(next(iter(cols)), []).append(p)
+        else:
+            rest.append(_fold(p, store, coded, by_code))
+    if not by_column:
+        return expr if rest == parts else "(" + " AND ".join(rest) + ")"
+
+    out = []
+    for column, conjuncts in by_column.items():
+        got = _codes(store, column, tuple(conjuncts))
+        metrics.PREDICATE_FOLDS.inc(column=column)
+        out.append(_in_list(column, got, by_code))
+    return "(" + " AND ".join(out + rest) + ")"
+
+
+def _in_list(column: str, got: _Fold, by_code: bool) -> str:
+    if not got.codes:
+        pred = None
+    elif by_code:
+        pred = f'enum_code("{column}") IN ({", ".join(map(str, got.codes))})'
+    else:
+        values = ", ".join("'" + v.replace("'", "''") + "'" for v in got.values)
+        pred = f'"{column}" IN ({values})'
+    if got.null:
+        return f'("{column}" IS NULL OR {pred})' if pred else f'"{column}" IS NULL'
+    return pred or "false"
+
+
+def fold_where(where: str, store, by_code: bool = False) -> str:
+    """
+    where, где условия на колонки-словари заменены на `"<колонка>" IN (значения)`;
+    by_code — на `enum_code("<колонка>") IN (коды)`: только для самой таблицы
+    snapshot (в Arrow-копии строк для fetch колонка — словарь, но не ENUM).
+    """
+    coded = store.extras.get("dict_codes")
+    if not coded:
+        return where
+    return _fold(where, store, coded, by_code)
+
+
+def fold(sql: str, store) -> str:
+    """То же для SELECT * FROM T_Local_Snapshot WHERE ...; другие запросы — как есть."""
+    where = sql_rewrite.where_clause(sql)
+    if where is None or not store.extras.get("dict_codes"):
+        return sql
+    folded = fold_where(where, store, by_code=True)
+    if folded == where:
+        return sql
+    return f"SELECT * FROM {snapshot_store.TABLE} WHERE {folded}"
+
+
+snapshot_store.register_ingest_step("dict_codes", build)
@@ -0,0 +1,158 @@
+"""
+Словари сущностей snapshot: customer, LastOperation, DepartmentName,
+item_type, order_grp, pstatus.
+
+Фильтры держали эти значения списками в коде (KNOWN_CUSTOMER_TOKENS,
+RAW_OPERATIONS, ITEM_TYPES, страны order_grp) — списки отставали от данных
+(в snapshot есть WAIN, STONE REJECT, которых в них нет). Теперь:
+
+  - ingest-шаг "entities" один раз на snapshot берёт уникальные
+    upper(trim()) значения этих колонок (store.extras["entities"]);
+  - фильтр собирает из своих seed-значений (списки в коде остаются —
+    синонимы и значения, которых может не быть в текущем snapshot) и
+    значений snapshot одну структуру — EntityDict (отсортированный массив +
+    trie) или свою, через compiled(); она перекомпилируется только при
+    смене sha snapshot, а до загрузки snapshot строится на одних seed;
+  - поиск в тексте запроса — один проход trie вместо regex на каждое
+    значение (`\\bRING\\b`, `not\\s+packing`, ... на каждом вызове).
+"""
+from __future__ import annotations
+
+import bisect
+import threading
+from typing import Callable, Iterable, TypeVar
+
+from core import snapshot_store
+
+ENTITY_COLUMNS = ("customer", "LastOperation", "DepartmentName", "item_type", "order_grp", "pstatus")
+
+T = TypeVar("T")
+
+_END = ""  # ключ trie: здесь заканчивается значение
+
+
+def _is_word(ch: str) -> bool:
+    return ch.isalnum() or ch == "_"
+
+
+class Trie:
+    """Символьный trie по ключам: все вхождения ключей в текст за один проход."""
+
+    def __init__(self, keys: Iterable[str]):
+        self.root: dict = {}
+        for key in keys:
+            if not key:
+                continue
+            node = self.root
+            for ch in key:
+                node = node.setdefault(ch, {})
+            node[_END] = key
+
+    def scan(self, text: str, bounded: bool = True) -> list[tuple[int, int, str]]:
+        """
+        (start, end, key) всех вхождений ключей в text, по start и длине.
+        bounded — как `\\bkey\\b`: у буквенно-цифровых краёв ключа не должно
+        быть буквы/цифры снаружи.
+        """
+        out = []
+        n = len(text)
+        for start in range(n):
+            node = self.root.get(text[start])
+            if node is None:
+                continue
+            if bounded and start and _is_word(text[start]) and _is_word(text[start - 1]):
+                continue
+            i = start + 1
+            while node is not None:
+                key = node.get(_END)
+                if key is not None and not (bounded and i < n and _is_word(text[i]) and _is_word(text[i - 1])):
+                    out.append((start, i, key))
+                if i >= n:
+                    break
+                node = node.get(text[i])
+                i += 1
+        return out
+
+    def occurring(self, text: str) -> set[str]:
+        """Ключи, которые встречаются в text как подстрока (`key in text`)."""
+        return {key for _, _, key in self.scan(text, bounded=False)}
+
+
+class EntityDict:
+    """Значения сущности (upper): отсортированный массив для проверки и trie для поиска в тексте."""
+
+    def __init__(self, values: Iterable[str]):
+        self.values = tuple(sorted({v.strip().upper() for v in values if v and v.strip()}))
+        self.trie = Trie(self.values)
+
+    def __contains__(self, value: str) -> bool:
+        value = value.strip().upper()
+        i = bisect.bisect_left(self.values, value)
+        return i < len(self.values) and self.values[i] == value
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def find(self, text: str) -> list[tuple[int, int, str]]:
+        """Вхождения значений в text целыми словами (text — в upper)."""
+        return self.trie.scan(text)
+
+
+# ---------- ingest ----------
+
+def build(store: snapshot_store.SnapshotStore) -> None:
+    cur = store.cursor()
+    try:
+        found = {}
+        for c in ENTITY_COLUMNS:
+            if c not in store.columns:
+                continue
+            rows = cur.execute(
+                f'SELECT DISTINCT upper(trim(CAST("{c}" AS VARCHAR))) AS v FROM {snapshot_store.TABLE} '
+                f"WHERE v IS NOT NULL AND v <> '' ORDER BY v"
+            ).fetchall()
+            found[c] = tuple(r[0] for r in rows)
+    finally:
+        cur.close()
+    store.extras["entities"] = found
+
+
+def values(column: str, store: snapshot_store.SnapshotStore | None = None) -> tuple[str, ...]:
+    """Уникальные значения колонки в текущем snapshot (пусто, пока snapshot не загружен)."""
+    store = store or snapshot_store.current_store()
+    if store is None:
+        return ()
+    return store.extras.get("entities", {}).get(column, ())
+
+
+# ---------- скомпилированные структуры фильтров ----------
+
+_compiled: dict[str, tuple[str | None, object]] = {}
+# RLock: сборка одной структуры может запросить другую (fuzzy -> словарь фильтра)
+_lock = threading.RLock()
+
+
+def compiled(name: str, build_fn: Callable[[snapshot_store.SnapshotStore | None], T]) -> T:
+    """
+    build_fn(store) один раз на snapshot: результат кэшируется по sha и
+    пересобирается, когда процесс загрузил другой snapshot.
+    """
+    store = snapshot_store.current_store()
+    sha = store.sha if store is not None else None
+    got = _compiled.get(name)
+    if got is not None and got[0] == sha:
+        return got[1]
+    with _lock:
+        got = _compiled.get(name)
+        if got is None or got[0] != sha:
+            got = _compiled[name] = (sha, build_fn(store))
+    return got[1]
+
+
+def entity(column: str, seed: Iterable[str] = ()) -> EntityDict:
+    """EntityDict по значениям column в snapshot плюс seed."""
+    seed = tuple(seed)
+    return compiled(f"entity:{column}:{hash(seed)}", lambda store: EntityDict(seed + values(column, store)))
+
+
+snapshot_store.register_ingest_step("entities", build)
@@ -0,0 +1,69 @@
+"""
+Ленивый реестр фильтров: имя функции -> модуль в filters/.
+
+Модуль импортируется при первом обращении (registry.parse_metal_filter(...)),
+поэтому `import main_app` не тянет все фильтры с их регулярками —
+Streamlit-воркер стартует быстрее, а стоимость переносится на первый запрос
+(или на warm-up). Новый фильтр = одна строка в FILTERS.
+"""
+from __future__ import annotations
+
+import importlib
+from typing import Callable
+
+FILTERS: dict[str, str] = {
+    "parse_date_range": "filters.date_filter",
+    "parse_metal_filter": "filters.metal_filter",
+    "parse_order_type_filter": "filters.order_type_filter",
+    "parse_item_type_filter": "filters.item_type_filter",
+    "parse_customer_filter": "filters.customer_filter",
+    "parse_customer_shortname_filter": "filters.customer_shortname_filter",
+    "parse_salesorder_filter": "filters.salesorder_filter",
+    "parse_jobnumber_filter": "filters.jobnumber_filter",
+    "parse_item_size_filter": "filters.item_size_filter",
+    "parse_pstatus_filter": "filters.pstatus_filter",
+    "parse_department_filter": "filters.department_filter",
+    "parse_last_operation_filter": "filters.last_operation_filter",
+    "parse_casting_lot_filter": "filters.casting_lot_filter",
+    "parse_order_group_filter": "filters.order_group_filter",
+    "parse_style_filter": "filters.style_filter",
+    "parse_bagnumber_filter": "filters.bagnumber_filter",
+    "parse_description_filter": "filters.description_filter",
+}
+
+
+# фильтры, которые регистрируют свои слова в core.fuzzy (fuzzy.register_words)
+VOCABULARY_FILTERS = (
+    "parse_item_type_filter",
+    "parse_last_operation_filter",
+    "parse_order_group_filter",
+    "parse_customer_shortname_filter",
+    "parse_department_filter",
+)
+
+
+class _LazyFilters:
+    def __getattr__(self, name: str) -> Callable:
+        module = FILTERS.get(name)
+        if module is None:
+            raise AttributeError(name)
+        fn = getattr(importlib.import_module(module), name)
+        # следующий доступ — обычный атрибут, без __getattr__
+        setattr(self, name, fn)
+        return fn
+
+    def load_all(self) -> None:
+        """Импортировать все фильтры сразу (warm-up)."""
+        for name in FILTERS:
+            getattr(self, name)
+
+    def load_vocabularies(self) -> None:
+        """Импортировать только фильтры со словарями для fuzzy (VOCABULARY_FILTERS)."""
+        for name in VOCABULARY_FILTERS:
+            getattr(self, name)
+
+    def loaded(self) -> list[str]:
+        return [n for n in FILTERS if n in self.__dict__]
+
+
+registry = _LazyFilters()
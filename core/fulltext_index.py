@@ -0,0 +1,133 @@
+"""
+Инвертированный индекс по description (для filters/description_filter.py).
+
+Документ — уникальное значение upper(trim(description)) (словарь значений
+из id_index), токены — куски между пробелами: `2=1.50RBC LAB GROWN DIAMOND`
+-> 2=1.50RBC, LAB, GROWN, DIAMOND. Для каждого токена — postings: номера
+документов, сжатые как дельты в минимальном беззнаковом типе
+(uint8/uint16/uint32; распаковка — np.cumsum).
+
+description_filter ищет подстроки (`LIKE '%RBC%'`, фраза — `LIKE '%LAB GROWN%'`),
+как и остальные фильтры и Access: RBC должен находить `2=1.50RBC`. Индекс
+отвечает на них точно и без перебора словаря:
+  - слово без пробелов встречается в описании <=> оно внутри какого-то
+    токена <=> оно — начало какого-то суффикса токена. Суффиксы всех
+    токенов лежат отсортированным массивом: токены со словом — один
+    диапазон bisect; слово, равное токену и не входящее в другие, — сразу
+    его postings;
+  - фраза: пересекаем документы её слов, затем проверяем саму фразу на
+    оставшихся значениях.
+Шаблоны с другими подстановками (`%`/`_` внутри) индекс не берёт — их
+отвечает ngram-индекс или LIKE по таблице.
+"""
+from __future__ import annotations
+
+import sys
+from bisect import bisect_left
+
+import numpy as np
+
+from core import snapshot_store, sql_rewrite
+from core.id_index import ColumnIndex, value_index
+
+FULLTEXT_COLUMN = "description"
+
+
+def compress(slots: np.ndarray) -> np.ndarray:
+    """Отсортированные номера документов -> дельты в минимальном типе."""
+    deltas = np.diff(slots, prepend=0)
+    top = int(deltas.max()) if len(deltas) else 0
+    dtype = np.uint8 if top < 1 << 8 else np.uint16 if top < 1 << 16 else np.uint32
+    return deltas.astype(dtype)
+
+
+def decompress(postings: np.ndarray) -> np.ndarray:
+    return np.cumsum(postings, dtype=np.int64)
+
+
+class FullTextIndex:
+    def __init__(self, values: ColumnIndex):
+        self.values = values
+        docs: dict[str, list[int]] = {}
+        for slot, key in enumerate(values.keys):
+            for tok in set(key.split()):
+                docs.setdefault(tok, []).append(slot)
+        self.tokens = sorted(docs)
+        self.postings = [compress(np.asarray(docs[t], dtype=np.int64)) for t in self.tokens]
+        # суффиксы токенов по возрастанию и номер токена каждого суффикса
+        suffixes = sorted((t[i:], n) for n, t in enumerate(self.tokens) for i in range(len(t)))
+        self.suffixes = [s for s, _ in suffixes]
+        self.suffix_tokens = np.asarray([n for _, n in suffixes], dtype=np.int32)
+        self._term_cache: dict[str, np.ndarray] = {}
+        self._nbytes = (
+            sys.getsizeof(self.tokens)
+            + sum(sys.getsizeof(t) + p.nbytes + 100 for t, p in zip(self.tokens, self.postings))
+            + sys.getsizeof(self.suffixes)
+            + sum(sys.getsizeof(s) for s in self.suffixes)
+            + self.suffix_tokens.nbytes
+        )
+
+    def term_tokens(self, term: str) -> np.ndarray:
+        """Номера токенов, содержащих term: суффиксы с началом term — один диапазон."""
+        lo = bisect_left(self.suffixes, term)
+        hi = bisect_left(self.suffixes, term + "\U0010ffff", lo)
+        return np.unique(self.suffix_tokens[lo:hi])
+
+    def term_docs(self, term: str) -> np.ndarray:
+        """Документы, где term (без пробелов) встречается как подстрока."""
+        got = self._term_cache.get(term)
+        if got is None:
+            found = [decompress(self.postings[n]) for n in self.term_tokens(term).tolist()]
+            if len(found) == 1:
+                got = found[0]
+            else:
+                got = np.unique(np.concatenate(found)) if found else np.empty(0, dtype=np.int64)
+            if len(self._term_cache) > 1024:
+                self._term_cache.clear()
+            self._term_cache[term] = got
+        return got
+
+    def docs(self, text: str) -> np.ndarray:
+        """Документы, содержащие text (слово или фразу) как подстроку."""
+        words = text.split(" ")
+        if len(words) == 1:
+            return self.term_docs(text)
+        docs = None
+        for w in sorted((w for w in words if w), key=len, reverse=True):
+            got = self.term_docs(w)
+            docs = got if docs is None else np.intersect1d(docs, got, assume_unique=True)
+            if not len(docs):
+                return docs
+        keys = self.values.keys
+        return np.asarray([d for d in docs.tolist() if text in keys[d]], dtype=np.int64)
+
+    def lookup(self, atom: sql_rewrite.Atom, limit: int = 0) -> np.ndarray | None:
+        """Только `LIKE '%текст%'` без других подстановок; остальное — ngram-индексу."""
+        if atom.op != "LIKE":
+            return None
+        pattern = atom.values[0]
+        inner = pattern[1:-1]
+        if len(pattern) < 3 or pattern[0] != "%" or pattern[-1] != "%" or "%" in inner or "_" in inner:
+            return None
+        if any(ch.isspace() and ch != " " for ch in inner):
+            return None  # токены делятся по любым пробельным символам, фраза — только по " "
+        return self.values.rows_for(self.docs(inner), limit)
+
+    def nbytes(self) -> int:
+        return self._nbytes
+
+
+def build(store: snapshot_store.SnapshotStore) -> None:
+    if FULLTEXT_COLUMN in store.columns:
+        store.extras["fulltext_index"] = FullTextIndex(value_index(store, FULLTEXT_COLUMN))
+
+
+def lookup(atom: sql_rewrite.Atom, store) -> np.ndarray | None:
+    index = store.extras.get("fulltext_index")
+    if index is None or atom.column != FULLTEXT_COLUMN:
+        return None
+    return index.lookup(atom, sql_rewrite.candidate_limit(store))
+
+
+snapshot_store.register_ingest_step("fulltext_index", build)
+sql_rewrite.register_index("fulltext_index", lookup, priority=20)
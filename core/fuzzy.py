@@ -0,0 +1,298 @@
+"""
+Нечёткое сопоставление слов запроса со значениями сущностей snapshot
+(опечатки: "seting in", "laping", "sunkor", "assingment").
+
+Индекс — symmetric delete: для каждого слова словаря заранее считаются все
+варианты с удалением до max_distance символов; у слова запроса — тоже, и
+кандидаты — слова словаря с общим вариантом. Расстояние проверяется точно
+(Damerau–Levenshtein, OSA), поэтому индекс может вернуть только слово на
+нужном расстоянии. Варианты хранятся как отсортированный массив хэшей
+(uint64) + номер слова: поиск — searchsorted, без dict на миллион ключей
+(словарь style на 1 млн строк — десятки тысяч значений).
+
+Исправление консервативное и детерминированное:
+  - только слова от 4 символов (короткие коды почти все в одной правке
+    друг от друга), расстояние 1, от 10 символов — 2;
+  - ближайшее слово должно быть единственным (ничья — не исправляем);
+  - слова, которые знает какой-нибудь фильтр (register_words, QUERY_WORDS,
+    значения сущностей snapshot), не исправляются никогда: "platinum" не
+    превращается в "plating", "sample" — в "samples";
+  - формы с -s/-es не исправляются на форму без них и наоборот.
+
+Фразы (PhraseResolver) исправляются раньше слов: "seting in" — не
+опечатка слова ("seting" есть в словаре: операция "Wax Seting In"), а
+опечатка ключа "setting in". Окно из стольких же слов, сколько в ключе,
+исправляется на ключ, если хотя бы одно слово совпадает точно, отличаются
+только слова от MIN_LEN символов, всего правок не больше 1 (от PHRASE_LONG_LEN
+символов — 2) и ближайший ключ единственный.
+
+Словари и результаты кэшируются на snapshot (entities.compiled): тот же
+запрос на том же snapshot всегда исправляется одинаково.
+"""
+from __future__ import annotations
+
+import re
+import threading
+from typing import Iterable
+
+import numpy as np
+
+from core import entities
+
+MIN_LEN = 4
+LONG_LEN = 10  # от этой длины допускаем 2 правки
+PHRASE_LONG_LEN = 8  # то же для фраз (правки считаются на всю фразу)
+
+# слова языка запросов (не сущности): в словаре фильтров их нет, но это не опечатки
+QUERY_WORDS = frozenset("""
+    and or not no without with except exclude include includes including does
+    order orders job jobs item items number style customer client status
+    received receive ready ship shipped shipping shipment casting cast due date pdate production
+    last next this previous today yesterday tomorrow week weeks month months year years day days
+    january february march april may june july august september october november december
+    open close closed cancel cancelled canceled release released reported report process progress
+    void voided reject rejected finished completed done
+    hold family single regular big small repair mold sample samples accessories
+    gold silver platinum palladium brass white yellow rose red karat karats carat carats
+    ring rings pendant pendants earring earrings necklace necklaces bracelet bracelets
+    bangle bangles chain chains stone stones diamond diamonds size sizes lot lots
+    description contains matches flow working work details certificate
+""".split())
+
+_TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9.&'-]*[a-z0-9]|[a-z0-9]", re.I)
+
+_registered: set[str] = set()
+
+
+def register_words(words: Iterable[str]) -> None:
+    """Слова (и фразы), которые фильтр понимает: их не исправляем."""
+    for w in words:
+        _registered.update(t.lower() for t in _TOKEN_RE.findall(w))
+
+
+def osa_distance(a: str, b: str, limit: int) -> int:
+    """Damerau–Levenshtein (OSA); limit + 1, если расстояние больше limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2: list[int] | None = None
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            v = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if prev2 is not None and i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                v = min(v, prev2[j - 2] + 1)
+            cur[j] = v
+        if min(cur) > limit:
+            return limit + 1
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+def _deletes(word: str, distance: int) -> set[str]:
+    out = {word}
+    edge = {word}
+    for _ in range(distance):
+        edge = {w[:i] + w[i + 1:] for w in edge for i in range(len(w))} - out
+        out |= edge
+    return out
+
+
+def _hash(s: str) -> int:
+    return hash(s) & 0xFFFFFFFFFFFFFFFF
+
+
+class SymSpell:
+    def __init__(self, words: Iterable[str], max_distance: int = 2):
+        self.words = sorted({w for w in words if w})
+        self.max_distance = max_distance
+        hashes: list[int] = []
+        ids: list[int] = []
+        for i, w in enumerate(self.words):
+            for d in _deletes(w, min(max_distance, _allowed(w))):
+                hashes.append(_hash(d))
+                ids.append(i)
+        order = np.argsort(np.asarray(hashes, dtype=np.uint64), kind="stable")
+        self.hashes = np.asarray(hashes, dtype=np.uint64)[order]
+        self.ids = np.asarray(ids, dtype=np.int32)[order]
+        self.known = frozenset(self.words)
+
+    def candidates(self, term: str, distance: int) -> list[tuple[int, str]]:
+        """(расстояние, слово) для слов словаря не дальше distance, по возрастанию."""
+        keys = np.asarray([_hash(d) for d in _deletes(term, distance)], dtype=np.uint64)
+        lo = np.searchsorted(self.hashes, keys, side="left")
+        hi = np.searchsorted(self.hashes, keys, side="right")
+        found = set()
+        for a, b in zip(lo.tolist(), hi.tolist()):
+            found.update(self.ids[a:b].tolist())
+        out = []
+        for i in sorted(found):
+            w = self.words[i]
+            d = osa_distance(term, w, distance)
+            if d <= distance:
+                out.append((d, w))
+        out.sort()
+        return out
+
+    def best(self, term: str) -> str | None:
+        """Единственное ближайшее слово словаря или None (нет / ничья / term уже в словаре)."""
+        if term in self.known or len(term) < MIN_LEN:
+            return None
+        got = self.candidates(term, min(self.max_distance, _allowed(term)))
+        if not got or (len(got) > 1 and got[0][0] == got[1][0]):
+            return None
+        return got[0][1]
+
+    def nbytes(self) -> int:
+        return self.hashes.nbytes + self.ids.nbytes + sum(len(w) + 49 for w in self.words)
+
+
+def _allowed(word: str) -> int:
+    return 2 if len(word) >= LONG_LEN else 1
+
+
+def _plural_pair(a: str, b: str) -> bool:
+    return a in (b + "s", b + "es") or b in (a + "s", a + "es")
+
+
+# ---------- исправление текста запроса ----------
+
+def _protected(store) -> frozenset[str]:
+    # словари фильтров (VOCABULARY_FILTERS) должны быть зарегистрированы до первой
+    # сборки: иначе результат зависел бы от того, какие фильтры уже импортированы
+    from core.filter_registry import registry
+
+    registry.load_vocabularies()
+    words = set(QUERY_WORDS) | _registered
+    for column in entities.ENTITY_COLUMNS:
+        for v in entities.values(column, store):
+            words.update(t.lower() for t in _TOKEN_RE.findall(v))
+    return frozenset(words)
+
+
+class Resolver:
+    """Исправляет слова текста на слова словаря (vocabulary) одной сущности."""
+
+    def __init__(self, vocabulary: Iterable[str], protected: frozenset[str] = frozenset()):
+        words = {t.lower() for v in vocabulary for t in _TOKEN_RE.findall(v)}
+        self.index = SymSpell(words)
+        self.protected = protected | self.index.known
+        self._cache: dict[str, str | None] = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, word: str) -> str | None:
+        """Слово словаря для опечатки word или None."""
+        word = word.lower()
+        if word in self.protected or any(ch.isdigit() for ch in word):
+            return None
+        got = self._cache.get(word, False)
+        if got is False:
+            got = self.index.best(word)
+            if got is not None and _plural_pair(word, got):
+                got = None
+            with self._lock:
+                if len(self._cache) > 4096:
+                    self._cache.clear()
+                self._cache[word] = got
+        return got
+
+    def correct(self, text: str) -> str:
+        """text с исправленными словами (регистр исправленного слова — как в словаре, lower)."""
+        return _TOKEN_RE.sub(lambda m: self.resolve(m.group(0)) or m.group(0), text)
+
+    def nbytes(self) -> int:
+        return self.index.nbytes()
+
+
+class PhraseResolver:
+    """Исправляет окна из нескольких слов текста на многословные ключи (phrases)."""
+
+    def __init__(self, phrases: Iterable[str]):
+        keys = {" ".join(t.lower() for t in _TOKEN_RE.findall(p)) for p in phrases}
+        self.keys = frozenset(k for k in keys if " " in k)
+        self.index = SymSpell(self.keys, max_distance=2)
+        self.sizes = sorted({k.count(" ") + 1 for k in self.keys}, reverse=True)
+        self._cache: dict[str, str | None] = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, phrase: str) -> str | None:
+        """Ключ для опечатки phrase (слова через один пробел) или None."""
+        got = self._cache.get(phrase, False)
+        if got is False:
+            got = self._best(phrase)
+            with self._lock:
+                if len(self._cache) > 4096:
+                    self._cache.clear()
+                self._cache[phrase] = got
+        return got
+
+    def _best(self, phrase: str) -> str | None:
+        if phrase in self.keys:
+            return None
+        words = phrase.split(" ")
+        budget = 2 if len(phrase) >= PHRASE_LONG_LEN else 1
+        found = []
+        for d, key in self.index.candidates(phrase, budget):
+            pairs = list(zip(words, key.split(" ")))
+            if len(pairs) != len(words) or len(key.split(" ")) != len(words):
+                continue
+            diff = [(a, b) for a, b in pairs if a != b]
+            if len(diff) == len(pairs):
+                continue
+            if any(len(a) < MIN_LEN or len(b) < MIN_LEN or _plural_pair(a, b) for a, b in diff):
+                continue
+            found.append((d, key))
+        if not found or (len(found) > 1 and found[0][0] == found[1][0]):
+            return None
+        return found[0][1]
+
+    def correct(self, text: str) -> str:
+        """text с окнами-опечатками, заменёнными на ключи (lower)."""
+        tokens = list(_TOKEN_RE.finditer(text.lower()))
+        out, pos, i = [], 0, 0
+        while i < len(tokens):
+            step = 1
+            for n in self.sizes:
+                window = tokens[i:i + n]
+                if len(window) < n:
+                    continue
+                phrase = " ".join(m.group(0) for m in window)
+                if phrase in self.keys:
+                    step = n
+                    break
+                key = self.resolve(phrase)
+                if key is not None:
+                    out.append(text[pos:window[0].start()] + key)
+                    pos, step = window[-1].end(), n
+                    break
+            i += step
+        out.append(text[pos:])
+        return "".join(out)
+
+    def nbytes(self) -> int:
+        return self.index.nbytes()
+
+
+def resolver(name: str, vocabulary_fn) -> Resolver:
+    """
+    Resolver фильтра name: vocabulary_fn(store) -> слова/фразы его сущности
+    (seed + snapshot). Собирается один раз на snapshot.
+    """
+    return entities.compiled(f"fuzzy:{name}", lambda store: Resolver(vocabulary_fn(store), _protected(store)))
+
+
+def phrase_resolver(name: str, phrases_fn) -> PhraseResolver:
+    """PhraseResolver фильтра name: phrases_fn(store) -> его ключи; один раз на snapshot."""
+    return entities.compiled(f"fuzzy_phrases:{name}", lambda store: PhraseResolver(phrases_fn(store)))
+
+
+def entity_resolver(column: str, seed: Iterable[str] = ()) -> Resolver:
+    """Resolver по значениям колонки column в snapshot плюс seed."""
+    seed = tuple(seed)
+    return resolver(f"{column}:{hash(seed)}", lambda store: seed + entities.values(column, store))
+
+
+def code_resolver(name: str, codes_fn) -> SymSpell:
+    """SymSpell по кодам (значения style и т.п.), без защищённых слов; один раз на snapshot."""
+    return entities.compiled(f"fuzzy_codes:{name}", lambda store: SymSpell(codes_fn(store), max_distance=1))
@@ -0,0 +1,144 @@
+"""
+Индекс идентификаторов (SalesOrder, CustomerPO, JobNumber, BagNumber).
+
+Строится один раз при загрузке snapshot (ingest-шаг "id_index"):
+нормализованный код upper(trim(x)) -> row id, в том же виде, в котором
+его сравнивают фильтры. Для каждой колонки — словарь значений ColumnIndex
+(store.extras["values"], его же используют ngram/fulltext-индексы):
+
+  - keys    — отсортированные уникальные коды;
+  - offsets — CSR: строки кода keys[i] = rowids[offsets[i]:offsets[i + 1]];
+  - slot    — dict код -> i: `= 'X'` и `IN (...)` за O(1);
+  - префиксы — варианты `LIKE 'X\\%'` / `LIKE 'X-%'` (строки заказа/ремонта) и
+    любой `LIKE 'ABC%'`: коды с общим префиксом в keys идут подряд, диапазон
+    находится двумя bisect (O(log n), ~20 сравнений на миллион кодов),
+    строки диапазона — один срез rowids.
+
+Исполнитель (core/sql_rewrite.py) спрашивает индекс про атомы WHERE и
+берёт строки-кандидаты из него; исходное условие остаётся для точной
+проверки.
+"""
+from __future__ import annotations
+
+import bisect
+import sys
+
+import numpy as np
+
+from core import snapshot_store, sql_rewrite
+
+ID_COLUMNS = ("SalesOrder", "CustomerPO", "JobNumber", "BagNumber")
+
+_EMPTY = np.empty(0, dtype=np.int64)
+
+
+class ColumnIndex:
+    def __init__(self, keys: list[str], offsets: np.ndarray, rowids: np.ndarray):
+        self.keys = keys
+        self.offsets = offsets
+        self.rowids = rowids
+        self.slot = {k: i for i, k in enumerate(keys)}
+        self._nbytes = (
+            rowids.nbytes + offsets.nbytes
+            + sys.getsizeof(keys) + sum(sys.getsizeof(k) for k in keys)
+            + sys.getsizeof(self.slot)
+        )
+
+    def rows(self, lo: int, hi: int) -> np.ndarray:
+        """Row id значений keys[lo:hi]."""
+        return self.rowids[self.offsets[lo]:self.offsets[hi]]
+
+    def rows_for(self, slots, limit: int = 0) -> np.ndarray | None:
+        """Row id значений с номерами slots (по возрастанию); None — строк больше limit."""
+        slots = np.asarray(slots, dtype=np.int64)
+        starts = self.offsets[slots]
+        lens = self.offsets[slots + 1] - starts
+        total = int(lens.sum())
+        if limit and total > limit:
+            return None
+        if not total:
+            return _EMPTY
+        # диапазоны rowids подряд: позиция k внутри slot j -> starts[j] + (k - начало j в выходе)
+        shift = np.repeat(starts - (np.cumsum(lens) - lens), lens)
+        return self.rowids[shift + np.arange(total)]
+
+    def slots_exact(self, codes) -> list[int]:
+        return [i for i in (self.slot.get(c) for c in codes) if i is not None]
+
+    def slots_prefix(self, prefix: str) -> range:
+        """Номера значений, начинающихся с prefix (включая сам prefix)."""
+        lo = bisect.bisect_left(self.keys, prefix)
+        hi = bisect.bisect_left(self.keys, prefix + "\U0010ffff", lo)
+        return range(lo, hi)
+
+    def lookup(self, atom: sql_rewrite.Atom, limit: int = 0) -> np.ndarray | None:
+        """
+        Row id строк, где atom истинно (= / IN / LIKE с литеральным префиксом);
+        None — атом не точечный/префиксный или строк больше limit.
+        """
+        if atom.op == "=":
+            slots = self.slots_exact(atom.values)
+        else:
+            pattern = atom.values[0]
+            prefix = sql_rewrite.like_prefix(pattern)
+            if prefix == pattern:
+                slots = self.slots_exact([pattern])
+            elif prefix:
+                r = self.slots_prefix(prefix)
+                if limit and self.offsets[r.stop] - self.offsets[r.start] > limit:
+                    return None
+                return self.rows(r.start, r.stop)
+            else:
+                return None  # LIKE '%x%' — не префикс
+        return self.rows_for(sorted(set(slots)), limit)
+
+    def nbytes(self) -> int:
+        return self._nbytes
+
+
+# ---------- ingest ----------
+
+def build_column(store: snapshot_store.SnapshotStore, column: str) -> ColumnIndex:
+    cur = store.cursor()
+    try:
+        got = cur.execute(
+            f"SELECT k, r FROM (SELECT upper(trim(CAST(\"{column}\" AS VARCHAR))) AS k, rowid AS r "
+            f"FROM {snapshot_store.TABLE}) WHERE k IS NOT NULL ORDER BY k, r"
+        ).fetchnumpy()
+    finally:
+        cur.close()
+    codes = np.asarray(got["k"], dtype=object)
+    rowids = np.asarray(got["r"], dtype=np.int64)
+    if len(codes) == 0:
+        return ColumnIndex([], np.zeros(1, dtype=np.int64), rowids)
+    # codes отсортированы: начало каждого нового кода — граница в CSR
+    starts = np.flatnonzero(np.concatenate([[True], codes[1:] != codes[:-1]]))
+    offsets = np.append(starts, len(codes)).astype(np.int64)
+    return ColumnIndex(codes[starts].tolist(), offsets, rowids)
+
+
+def value_index(store: snapshot_store.SnapshotStore, column: str) -> ColumnIndex:
+    """Словарь значений колонки: строится один раз на snapshot и общий для всех индексов."""
+    values = store.extras.setdefault("values", {})
+    if column not in values:
+        values[column] = build_column(store, column)
+    return values[column]
+
+
+def build(store: snapshot_store.SnapshotStore) -> None:
+    for c in ID_COLUMNS:
+        if c in store.columns:
+            value_index(store, c)
+
+
+# ---------- lookup для sql_rewrite ----------
+
+def lookup(atom: sql_rewrite.Atom, store) -> np.ndarray | None:
+    if atom.column not in ID_COLUMNS:
+        return None
+    col = store.extras.get("values", {}).get(atom.column)
+    return None if col is None else col.lookup(atom, sql_rewrite.candidate_limit(store))
+
+
+snapshot_store.register_ingest_step("id_index", build)
+sql_rewrite.register_index("id_index", lookup, priority=10)
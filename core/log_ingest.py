@@ -0,0 +1,272 @@
+"""
+Инкрементальная загрузка usage-логов в DuckDB (logs/usage.duckdb).
+
+Источники:
+  - logs/ai_usage_log.txt            — старый tab-separated формат (repr-поля)
+  - logs/ai_usage_log.*.jsonl.gz     — ротированные JSONL-сегменты
+  - logs/ai_usage_log.jsonl          — текущий JSONL-сегмент
+
+Для каждого файла запоминаем (по отпечатку первой строки) сколько байт уже
+загружено, поэтому повторный запуск читает только новые строки, а ротация
+текущего файла в .gz не приводит к дублям. Строки идут в таблицу пачками
+через pyarrow — весь лог целиком в память (и в pandas) не загружается.
+
+CLI:
+    python -m core.log_ingest                 # загрузить новые строки
+    python -m core.log_ingest --parquet x.parquet   # + выгрузка в Parquet
+"""
+from __future__ import annotations
+
+import argparse
+import ast
+import gzip
+import hashlib
+import json
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator
+
+from core.usage_log import LOG_DIR, LOG_FILE, LEGACY_LOG_FILE
+
+DB_FILE = LOG_DIR / "usage.duckdb"
+BATCH_ROWS = 50_000
+
+COLUMNS = [
+    ("ts", "TIMESTAMP"),
+    ("event", "VARCHAR"),
+    ("request_id", "VARCHAR"),
+    ("session_id", "VARCHAR"),
+    ("snapshot_sha", "VARCHAR"),
+    ("query", "VARCHAR"),
+    ("sql", "VARCHAR"),
+    ("layout", "VARCHAR"),
+    ("rows", "BIGINT"),
+    ("error", "VARCHAR"),
+    ("error_class", "VARCHAR"),
+    ("parse_ms", "DOUBLE"),
+    ("execute_ms", "DOUBLE"),
+    ("render_ms", "DOUBLE"),
+    ("source", "VARCHAR"),
+    ("result_bytes", "BIGINT"),
+    ("peak_traced_bytes", "BIGINT"),
+]
+_COL_NAMES = [c for c, _ in COLUMNS]
+
+_LEGACY_KEYS = ("query", "rows", "layout", "sql", "error")
+
+_lock = threading.Lock()
+
+
+# ---------- разбор строк ----------
+
+def parse_legacy_line(line: str, source: str) -> dict | None:
+    """2025-12-01 16:03:39<TAB>RUN_OK<TAB>query='...'<TAB>rows=109<TAB>layout=received<TAB>sql='...'<TAB>error=''"""
+    parts = line.rstrip("\r\n").split("\t")
+    if len(parts) < 2:
+        return None
+    try:
+        ts = datetime.strptime(parts[0], "%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        return None
+
+    rec = {"ts": ts, "event": parts[1], "source": source}
+    for part in parts[2:]:
+        key, sep, val = part.partition("=")
+        if not sep or key not in _LEGACY_KEYS:
+            continue
+        if key == "rows":
+            rec["rows"] = int(val) if val.lstrip("-").isdigit() else None
+        elif key == "layout":
+            rec["layout"] = val
+        else:
+            try:
+                rec[key] = ast.literal_eval(val)
+            except (ValueError, SyntaxError):
+                rec[key] = val
+    return rec
+
+
+def parse_json_line(line: str, source: str) -> dict | None:
+    try:
+        obj = json.loads(line)
+    except ValueError:
+        return None
+    if not isinstance(obj, dict):
+        return None
+    try:
+        ts = datetime.fromisoformat(obj.get("ts", ""))
+    except (TypeError, ValueError):
+        return None
+
+    timings = obj.get("timings_ms") or {}
+    mem = obj.get("memory") or {}
+    rec = {k: obj.get(k) for k in _COL_NAMES if k in obj}
+    rec.update(
+        ts=ts,
+        source=source,
+        parse_ms=timings.get("parse"),
+        execute_ms=timings.get("execute"),
+        render_ms=timings.get("render"),
+        result_bytes=mem.get("result_bytes"),
+        peak_traced_bytes=mem.get("peak_traced_bytes"),
+    )
+    return rec
+
+
+# ---------- файлы и смещения ----------
+
+def _open_binary(path: Path):
+    return gzip.open(path, "rb") if path.suffix == ".gz" else open(path, "rb")
+
+
+def _fingerprint(path: Path) -> str | None:
+    with _open_binary(path) as fh:
+        first = fh.readline()
+    if not first.endswith(b"\n"):
+        return None  # первая строка ещё не дописана
+    return hashlib.sha1(first).hexdigest()
+
+
+def _iter_new_lines(path: Path, offset: int) -> Iterator[tuple[int, str]]:
+    """(смещение после строки, строка) начиная с offset; недописанный хвост пропускаем."""
+    with _open_binary(path) as fh:
+        if offset:
+            fh.seek(offset)
+        pos = offset
+        for raw in fh:
+            if not raw.endswith(b"\n"):
+                break
+            pos += len(raw)
+            yield pos, raw.decode("utf-8", errors="replace")
+
+
+def discover_sources(log_dir: Path = LOG_DIR) -> list[Path]:
+    """Старый txt, затем ротированные сегменты по времени, затем текущий файл."""
+    sources: list[Path] = []
+    legacy = log_dir / LEGACY_LOG_FILE.name
+    if legacy.exists():
+        sources.append(legacy)
+    sources.extend(sorted(log_dir.glob(f"{LOG_FILE.stem}.*{LOG_FILE.suffix}.gz")))
+    live = log_dir / LOG_FILE.name
+    if live.exists():
+        sources.append(live)
+    return sources
+
+
+def iter_log_records(log_dir: Path = LOG_DIR) -> Iterator[dict]:
+    """Все записи всех источников по порядку (без DuckDB) — для бенчмарков и скриптов."""
+    for path in discover_sources(log_dir):
+        parse = parse_json_line if ".jsonl" in path.name else parse_legacy_line
+        for _, line in _iter_new_lines(path, 0):
+            rec = parse(line, path.name)
+            if rec is not None:
+                yield rec
+
+
+# ---------- DuckDB ----------
+
+def connect(db_file: Path = DB_FILE):
+    import duckdb
+
+    db_file.parent.mkdir(parents=True, exist_ok=True)
+    con = duckdb.connect(str(db_file))
+    cols = ", ".join(f'"{c}" {t}' for c, t in COLUMNS)
+    con.execute(f"CREATE TABLE IF NOT EXISTS usage_events ({cols})")
+    # колонки, добавленные позже, для уже существующей базы
+    for c, t in COLUMNS:
+        con.execute(f'ALTER TABLE usage_events ADD COLUMN IF NOT EXISTS "{c}" {t}')
+    con.execute(
+        "CREATE TABLE IF NOT EXISTS ingest_offsets ("
+        " fingerprint VARCHAR PRIMARY KEY, source VARCHAR, byte_offset BIGINT, updated_at TIMESTAMP)"
+    )
+    return con
+
+
+def _flush(con, batch: list[dict]) -> None:
+    import pyarrow as pa
+
+    if not batch:
+        return
+    table = pa.table({c: [r.get(c) for r in batch] for c in _COL_NAMES})
+    con.register("_usage_batch", table)
+    try:
+        cols = ", ".join(f'"{c}"' for c in _COL_NAMES)
+        casts = ", ".join(f'CAST("{c}" AS {t})' for c, t in COLUMNS)
+        con.execute(f"INSERT INTO usage_events ({cols}) SELECT {casts} FROM _usage_batch")
+    finally:
+        con.unregister("_usage_batch")
+    batch.clear()
+
+
+def ingest(con=None, log_dir: Path = LOG_DIR) -> int:
+    """Догружает новые строки из всех источников. Возвращает число добавленных записей."""
+    own = con is None
+    if own:
+        con = connect()
+    added = 0
+    try:
+        with _lock:
+            for path in discover_sources(log_dir):
+                fp = _fingerprint(path)
+                if fp is None:
+                    continue
+                row = con.execute(
+                    "SELECT byte_offset FROM ingest_offsets WHERE fingerprint = ?", [fp]
+                ).fetchone()
+                offset = row[0] if row else 0
+                parse = parse_json_line if ".jsonl" in path.name else parse_legacy_line
+
+                batch: list[dict] = []
+                new_offset = offset
+                con.execute("BEGIN TRANSACTION")
+                try:
+                    for new_offset, line in _iter_new_lines(path, offset):
+                        rec = parse(line, path.name)
+                        if rec is not None:
+                            batch.append(rec)
+                            added += 1
+                        if len(batch) >= BATCH_ROWS:
+                            _flush(con, batch)
+                    _flush(con, batch)
+                    if new_offset != offset:
+                        con.execute(
+                            "INSERT OR REPLACE INTO ingest_offsets VALUES (?, ?, ?, now())",
+                            [fp, path.name, new_offset],
+                        )
+                    con.execute("COMMIT")
+                except Exception:
+                    con.execute("ROLLBACK")
+                    raise
+    finally:
+        if own:
+            con.close()
+    return added
+
+
+def export_parquet(con, path: Path) -> None:
+    p = str(path).replace("'", "''")
+    con.execute(f"COPY usage_events TO '{p}' (FORMAT PARQUET, COMPRESSION ZSTD)")
+
+
+def main(argv: list[str] | None = None) -> None:
+    ap = argparse.ArgumentParser(description="Ingest usage logs into DuckDB")
+    ap.add_argument("--db", type=Path, default=DB_FILE)
+    ap.add_argument("--log-dir", type=Path, default=LOG_DIR)
+    ap.add_argument("--parquet", type=Path, default=None, help="also export usage_events to this Parquet file")
+    args = ap.parse_args(argv)
+
+    con = connect(args.db)
+    try:
+        n = ingest(con, args.log_dir)
+        total = con.execute("SELECT count(*) FROM usage_events").fetchone()[0]
+        print(f"ingested {n} new records, {total} total")
+        if args.parquet:
+            export_parquet(con, args.parquet)
+            print(f"exported to {args.parquet}")
+    finally:
+        con.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,390 @@
+"""
+Учёт памяти: по запросам и по кэшам, плюс общий бюджет с вытеснением.
+
+Кэши (snapshot-таблица в DuckDB, результаты запросов, memo разбора запросов)
+регистрируются через register_cache(); каждый умеет сказать свой размер и
+освободить память (shrink). Когда сумма превышает MEMORY_BUDGET_MB
+(secrets/env, 0 = без лимита), enforce_budget() вытесняет сначала результаты
+сессий, потом общие результаты, memo разбора и в последнюю очередь snapshot.
+
+Результаты сессий Streamlit (SessionCaches): у каждой сессии свой небольшой
+BoundedCache в её session_state; здесь они видны как один кэш через слабые
+ссылки — сессия закончилась, Streamlit удалил её session_state, и кэш
+освобождается вместе с ней.
+
+Per-request:
+  - байты результата (pandas/Arrow) — всегда, это дёшево;
+  - пиковая аллокация Python (tracemalloc) — только если включено
+    (MEMORY_TRACE=1 или переключатель админа): tracemalloc заметно
+    замедляет код, поэтому по умолчанию выключен.
+"""
+from __future__ import annotations
+
+import os
+import sys
+import threading
+import tracemalloc
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Hashable, Iterable, Iterator, Protocol
+
+from core import metrics
+
+
+def _get_setting(name: str, default: str) -> str:
+    try:
+        import streamlit as st
+        if name in st.secrets:
+            return str(st.secrets[name]).strip()
+    except Exception:
+        pass
+    return os.getenv(name, default).strip()
+
+
+MEMORY_BUDGET_BYTES = int(float(_get_setting("MEMORY_BUDGET_MB", "0")) * 1024 * 1024)
+
+# кэш результатов одной сессии: последние N запросов и не больше MB
+SESSION_CACHE_ENTRIES = int(_get_setting("SESSION_CACHE_ENTRIES", "8"))
+SESSION_CACHE_BYTES = int(float(_get_setting("SESSION_CACHE_MB", "128")) * 1024 * 1024)
+# повторный Run того же запроса моложе TTL не выполняется заново (rerun без Run — всегда из кэша)
+SESSION_RESULT_TTL_S = float(_get_setting("SESSION_RESULT_TTL_S", "300"))
+
+# общие кэши запросов процесса: результаты (sha, SQL) -> DataFrame (db_utils)
+# и memo разбора (ai_filter_router). QUERY_CACHES=0 — выключить (замеры
+# без попаданий в кэш).
+QUERY_CACHES = _get_setting("QUERY_CACHES", "1").lower() not in ("0", "false", "no")
+QUERY_CACHE_NAMES = ("results", "parse")
+
+# порядок вытеснения: меньше — выгоняем раньше
+PRIORITY_SESSIONS = 5
+PRIORITY_RESULTS = 10
+PRIORITY_PARSE = 20
+PRIORITY_SNAPSHOT = 90
+
+
+# ---------- размеры объектов ----------
+
+def nbytes(obj: Any) -> int:
+    """Оценка памяти объекта: DataFrame (deep), Arrow, строки, прочее — getsizeof."""
+    try:
+        import pandas as pd
+
+        if isinstance(obj, pd.DataFrame):
+            return int(obj.memory_usage(index=True, deep=True).sum())
+        if isinstance(obj, pd.Series):
+            return int(obj.memory_usage(index=True, deep=True))
+    except Exception:
+        pass
+    n = getattr(obj, "nbytes", None)  # pyarrow.Table / numpy / индексы snapshot (метод)
+    if callable(n):
+        n = n()
+    if isinstance(n, int):
+        return n
+    if isinstance(obj, (str, bytes)):
+        return sys.getsizeof(obj)
+    if isinstance(obj, (tuple, list)):
+        return sys.getsizeof(obj) + sum(nbytes(x) for x in obj)
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(nbytes(v) for v in obj.values())
+    return sys.getsizeof(obj)
+
+
+def process_rss_bytes() -> int | None:
+    """Текущий RSS процесса (Linux /proc; на других ОС — пиковый из getrusage)."""
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except Exception:
+        pass
+    try:
+        import resource
+
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss if sys.platform == "darwin" else rss * 1024
+    except Exception:
+        return None
+
+
+# ---------- кэши ----------
+
+class MemoryAccountable(Protocol):
+    name: str
+
+    def nbytes(self) -> int: ...
+
+    def entries(self) -> int: ...
+
+    def shrink(self, target_bytes: int) -> int:
+        """Освободить память, пока размер не станет <= target_bytes; вернуть освобождённое."""
+        ...
+
+
+class BoundedCache:
+    """LRU по байтам и по числу записей; размер записи считается один раз при put()."""
+
+    def __init__(self, name: str, max_bytes: int = 0, max_entries: int = 0,
+                 sizeof: Callable[[Any], int] = nbytes, enabled: bool = True):
+        self.name = name
+        self.enabled = enabled  # False — put() ничего не хранит, get() всегда промах
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._sizeof = sizeof
+        self._data: OrderedDict[Hashable, tuple[Any, int]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+            else:
+                self._data.move_to_end(key)
+                self.hits += 1
+        metrics.cache_lookup(self.name, item is not None)
+        return default if item is None else item[0]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if not self.enabled:
+            return
+        size = self._sizeof(value)
+        if self.max_bytes and size > self.max_bytes:
+            return  # одна запись больше всего кэша — не кэшируем
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._data[key] = (value, size)
+            self._bytes += size
+            self._trim_locked(self.max_bytes, self.max_entries)
+        enforce_budget()
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def _trim_locked(self, max_bytes: int, max_entries: int) -> int:
+        freed = 0
+        while self._data and (
+            (max_bytes and self._bytes > max_bytes) or (max_entries and len(self._data) > max_entries)
+        ):
+            _, (_, size) = self._data.popitem(last=False)
+            self._bytes -= size
+            freed += size
+        return freed
+
+    def nbytes(self) -> int:
+        return self._bytes
+
+    def entries(self) -> int:
+        return len(self._data)
+
+    def shrink(self, target_bytes: int) -> int:
+        with self._lock:
+            if target_bytes <= 0:
+                freed = self._bytes
+                self._data.clear()
+                self._bytes = 0
+                return freed
+            return self._trim_locked(target_bytes, 0)
+
+
+class SessionCaches:
+    """
+    Кэши сессий (по BoundedCache на сессию) как один кэш для учёта памяти.
+
+    Кэш сессии хранит вызывающий (в session_state); здесь — только слабые
+    ссылки, поэтому закончившаяся сессия освобождает свой кэш сама.
+    """
+
+    def __init__(self, name: str, max_bytes: int = 0, max_entries: int = 0):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._sessions: weakref.WeakValueDictionary[str, BoundedCache] = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+
+    def new(self, session_id: str) -> BoundedCache:
+        """Новый кэш сессии session_id (держать его должен вызывающий)."""
+        cache = BoundedCache(self.name, max_bytes=self.max_bytes, max_entries=self.max_entries)
+        with self._lock:
+            self._sessions[session_id] = cache
+        return cache
+
+    def _live(self) -> list[BoundedCache]:
+        with self._lock:
+            return list(self._sessions.values())
+
+    def sessions(self) -> int:
+        return len(self._live())
+
+    def nbytes(self) -> int:
+        return sum(c.nbytes() for c in self._live())
+
+    def entries(self) -> int:
+        return sum(c.entries() for c in self._live())
+
+    def shrink(self, target_bytes: int) -> int:
+        # сначала самые большие кэши сессий: у каждой остаются свежие записи
+        caches = sorted(self._live(), key=lambda c: c.nbytes(), reverse=True)
+        excess = sum(c.nbytes() for c in caches) - max(target_bytes, 0)
+        freed = 0
+        for c in caches:
+            if excess <= 0:
+                break
+            got = c.shrink(max(c.nbytes() - excess, 0) if target_bytes > 0 else 0)
+            excess -= got
+            freed += got
+        return freed
+
+
+_caches: dict[str, tuple[int, MemoryAccountable]] = {}
+_caches_lock = threading.Lock()
+_budget_lock = threading.Lock()
+evictions = 0
+
+
+def register_cache(cache: MemoryAccountable, priority: int) -> MemoryAccountable:
+    with _caches_lock:
+        _caches[cache.name] = (priority, cache)
+    return cache
+
+
+# один на процесс (main_app Streamlit перевыполняет на каждый rerun, поэтому не там)
+session_results = register_cache(
+    SessionCaches("session_results", max_bytes=SESSION_CACHE_BYTES, max_entries=SESSION_CACHE_ENTRIES),
+    PRIORITY_SESSIONS,
+)
+
+
+def cache_stats() -> list[dict]:
+    with _caches_lock:
+        items = sorted(_caches.values(), key=lambda x: x[0])
+    out = []
+    for priority, c in items:
+        row = {"cache": c.name, "entries": c.entries(), "bytes": c.nbytes(), "priority": priority}
+        if hasattr(c, "hits"):
+            row.update(hits=c.hits, misses=c.misses)
+        out.append(row)
+    return out
+
+
+def clear_caches(names: Iterable[str]) -> int:
+    """Полностью очищает указанные кэши; возвращает освобождённые байты."""
+    names = set(names)
+    with _caches_lock:
+        items = [c for _, c in _caches.values() if c.name in names]
+    return sum(c.shrink(0) for c in items)
+
+
+def total_cache_bytes() -> int:
+    return sum(r["bytes"] for r in cache_stats())
+
+
+def enforce_budget(budget: int | None = None) -> int:
+    """Вытесняет кэши по приоритету, пока их сумма не уложится в бюджет. Возвращает освобождённое."""
+    global evictions
+    budget = MEMORY_BUDGET_BYTES if budget is None else budget
+    if budget <= 0:
+        return 0
+    if not _budget_lock.acquire(blocking=False):
+        return 0  # уже вытесняет другой поток
+    try:
+        freed = 0
+        with _caches_lock:
+            items = sorted(_caches.values(), key=lambda x: x[0])
+        total = sum(c.nbytes() for _, c in items)
+        for _, c in items:
+            if total <= budget:
+                break
+            size = c.nbytes()
+            got = c.shrink(max(size - (total - budget), 0))
+            if got:
+                metrics.MEMORY_EVICTIONS.inc(cache=c.name)
+                evictions += 1
+            total -= got
+            freed += got
+        return freed
+    finally:
+        _budget_lock.release()
+
+
+def _cache_gauges(field: str):
+    return lambda: {(r["cache"],): float(r[field]) for r in cache_stats()}
+
+
+metrics.CACHE_BYTES.set_function(_cache_gauges("bytes"))
+metrics.CACHE_ENTRIES.set_function(_cache_gauges("entries"))
+metrics.MEMORY_BUDGET.set_function(lambda: float(MEMORY_BUDGET_BYTES))
+metrics.PROCESS_RSS.set_function(process_rss_bytes)
+
+
+# ---------- per-request ----------
+
+def tracing_env_enabled() -> bool:
+    return os.getenv("MEMORY_TRACE", "").strip().lower() in ("1", "true", "yes", "on")
+
+
+_trace_lock = threading.Lock()
+
+
+class RequestMemory:
+    """Память одного запроса: байты результата и (если трассируется) пик tracemalloc."""
+
+    def __init__(self, tracing: bool):
+        self.tracing = tracing
+        self.result_bytes: int | None = None
+
+    def peak(self) -> int | None:
+        if not self.tracing:
+            return None
+        return tracemalloc.get_traced_memory()[1]
+
+    def add_result(self, obj: Any) -> int:
+        self.result_bytes = nbytes(obj)
+        metrics.RESULT_BYTES.observe(self.result_bytes)
+        return self.result_bytes
+
+    def as_dict(self) -> dict:
+        out = {}
+        if self.result_bytes is not None:
+            out["result_bytes"] = self.result_bytes
+        peak = self.peak()
+        if peak is not None:
+            out["peak_traced_bytes"] = peak
+        return out
+
+
+@contextmanager
+def trace_request(enabled: bool) -> Iterator[RequestMemory]:
+    """
+    Учёт памяти запроса. tracemalloc включается только если enabled и его
+    не занял параллельный запрос (пик общий на процесс).
+    """
+    tracing = enabled and _trace_lock.acquire(blocking=False)
+    mem = RequestMemory(tracing)
+    if not tracing:
+        yield mem
+        return
+    started_here = not tracemalloc.is_tracing()
+    try:
+        if started_here:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        yield mem
+        metrics.REQUEST_PEAK_BYTES.observe(mem.peak())
+    finally:
+        mem.tracing = False
+        if started_here:
+            tracemalloc.stop()
+        _trace_lock.release()
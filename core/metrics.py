@@ -0,0 +1,312 @@
+"""
+In-process метрики (counters / gauges / histograms) в текстовом формате Prometheus.
+
+    from core import metrics
+    metrics.QUERIES.inc(layout="casting")
+    metrics.STAGE_SECONDS.observe(0.21, stage="execute")
+
+HTTP-эндпоинт (/metrics) поднимается в фоновом потоке, если задан METRICS_PORT
+(secrets/env); слушает METRICS_HOST, по умолчанию 127.0.0.1:
+
+    METRICS_PORT=9108 streamlit run main_app.py
+    curl -s localhost:9108/metrics
+
+Без внешних зависимостей: обновление метрики — словарь + lock, это дёшево
+и безопасно из потоков Streamlit.
+"""
+from __future__ import annotations
+
+import math
+import os
+from abc import ABC, abstractmethod
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Iterable
+
+# секунды: от 1 ms до 60 s — покрывает и parse, и тяжёлые execute
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt_value(v: float) -> str:
+    if math.isinf(v):
+        return "+Inf" if v > 0 else "-Inf"
+    return repr(float(v)) if not float(v).is_integer() else str(int(v))
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name}: expected labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labels)
+
+    def _header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    @abstractmethod
+    def render(self) -> list[str]:
+        """Строки text exposition: # HELP, # TYPE и значения."""
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self._header() + [
+            f"{self.name}{_fmt_labels(self.labels, k)} {_fmt_value(v)}" for k, v in items
+        ]
+
+
+class Gauge(_Metric):
+    """Значение задаётся set() или вычисляется при экспорте (set_function)."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: dict[tuple, float] = {}
+        self._fn: Callable[[], dict[tuple, float] | float | None] | None = None
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+    def set_function(self, fn: Callable[[], dict[tuple, float] | float | None]) -> None:
+        self._fn = fn
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = dict(self._values)
+        if self._fn is not None:
+            try:
+                got = self._fn()
+            except Exception:
+                got = None
+            if isinstance(got, dict):
+                items.update(got)
+            elif got is not None:
+                items[()] = float(got)
+        return self._header() + [
+            f"{self.name}{_fmt_labels(self.labels, k)} {_fmt_value(v)}" for k, v in sorted(items.items())
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [counts по бакетам..., +Inf], sum
+        self._counts: dict[tuple, list[int]] = {}
+        self._sums: dict[tuple, float] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts = self._counts.get(key)
+            if counts is None:
+                counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+                self._sums[key] = 0.0
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            self._sums[key] += value
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = sorted((k, list(c), self._sums[k]) for k, c in self._counts.items())
+        lines = self._header()
+        for key, counts, total in items:
+            acc = 0
+            for b, c in zip(self.buckets + (math.inf,), counts):
+                acc += c
+                le = 'le="' + _fmt_value(b) + '"'
+                lines.append(f"{self.name}_bucket{_fmt_labels(self.labels, key, le)} {acc}")
+            lines.append(f"{self.name}_sum{_fmt_labels(self.labels, key)} {_fmt_value(total)}")
+            lines.append(f"{self.name}_count{_fmt_labels(self.labels, key)} {acc}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            # повторный импорт модуля (Streamlit rerun) не должен плодить дубли
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help: str, labels: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: Iterable[str] = ()) -> Gauge:
+        return self.register(Gauge(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Iterable[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: list[str] = []
+        for m in metrics:
+            lines.extend(m.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# ---------- метрики приложения ----------
+
+QUERIES = REGISTRY.counter("app_queries_total", "Executed queries by layout (no_rows for empty results)", ["layout"])
+STAGE_SECONDS = REGISTRY.histogram("app_stage_seconds", "Latency of query pipeline stages", ["stage"])
+ERRORS = REGISTRY.counter("app_errors_total", "Errors by pipeline stage and exception class", ["stage", "error_class"])
+CACHE_REQUESTS = REGISTRY.counter("app_cache_requests_total", "Cache lookups by cache and result (hit/miss)", ["cache", "result"])
+DOWNLOAD_BYTES = REGISTRY.counter("app_download_bytes_total", "Bytes downloaded from Google Drive", ["kind"])
+SLOW_QUERIES = REGISTRY.counter("app_slow_queries_total", "DuckDB queries slower than SLOW_QUERY_MS")
+SNAPSHOT_AGE = REGISTRY.gauge("app_snapshot_age_seconds", "Age of the snapshot used by the last query")
+SNAPSHOT_INFO = REGISTRY.gauge("app_snapshot_info", "Snapshot in use (value is always 1)", ["sha"])
+RESULT_ROWS = REGISTRY.histogram(
+    "app_result_rows", "Rows returned per query", buckets=(0, 1, 10, 100, 1_000, 10_000, 100_000, 1_000_000)
+)
+
+_BYTE_BUCKETS = tuple(float(2 ** k) for k in range(16, 34, 2))  # 64 KiB .. 8 GiB
+RESULT_BYTES = REGISTRY.histogram("app_result_bytes", "pandas/Arrow bytes held by a query result", buckets=_BYTE_BUCKETS)
+REQUEST_PEAK_BYTES = REGISTRY.histogram(
+    "app_request_peak_traced_bytes", "Peak Python allocation per request (tracemalloc, when enabled)", buckets=_BYTE_BUCKETS
+)
+CACHE_BYTES = REGISTRY.gauge("app_cache_bytes", "Current size of each cache", ["cache"])
+CACHE_ENTRIES = REGISTRY.gauge("app_cache_entries", "Current number of entries in each cache", ["cache"])
+MEMORY_EVICTIONS = REGISTRY.counter("app_memory_evictions_total", "Evictions triggered by the memory budget", ["cache"])
+MEMORY_BUDGET = REGISTRY.gauge("app_memory_budget_bytes", "Configured memory budget for caches (0 = unlimited)")
+PROCESS_RSS = REGISTRY.gauge("app_process_resident_bytes", "Resident memory of the process")
+INDEX_REWRITES = REGISTRY.counter(
+    "app_index_rewrites_total", "Queries narrowed to row ids by a snapshot index before execution", ["index"]
+)
+PREDICATE_FOLDS = REGISTRY.counter(
+    "app_predicate_folds_total", "WHERE conditions folded into one dictionary-code IN before execution", ["column"]
+)
+QUERY_JOBS = REGISTRY.counter(
+    "app_query_jobs_total", "Queries run on the worker pool by outcome (ok/error/cancelled/timeout)", ["outcome"]
+)
+QUERY_JOBS_ACTIVE = REGISTRY.gauge("app_query_jobs_active", "Queries queued or running on the worker pool")
+WARMUP_SECONDS = REGISTRY.gauge("app_warmup_seconds", "Duration of the process warm-up (snapshot, filters, preset queries)")
+READY = REGISTRY.gauge("app_ready", "1 once the process warm-up has finished")
+SINGLE_FLIGHT = REGISTRY.counter(
+    "app_single_flight_total",
+    "Calls through a single-flight layer; followers waited for an identical in-flight call instead of running",
+    ["kind", "role"],
+)
+
+
+def cache_lookup(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def set_snapshot(sha: str | None, updated_at: float | None) -> None:
+    """sha и время обновления (unix time) snapshot'а, на котором работает процесс."""
+    SNAPSHOT_INFO.clear()
+    SNAPSHOT_INFO.set(1, sha=sha or "unknown")
+    if updated_at is None:
+        SNAPSHOT_AGE.set_function(None)
+    else:
+        SNAPSHOT_AGE.set_function(lambda: time.time() - updated_at)
+
+
+# ---------- HTTP ----------
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+_server: ThreadingHTTPServer | None = None
+_server_lock = threading.Lock()
+
+
+def _get_setting(name: str, default: str) -> str:
+    try:
+        import streamlit as st
+        if name in st.secrets:
+            return str(st.secrets[name]).strip()
+    except Exception:
+        pass
+    return os.getenv(name, default).strip()
+
+
+def start_http_server(port: int | None = None, host: str | None = None) -> ThreadingHTTPServer | None:
+    """Один сервер на процесс; без METRICS_PORT ничего не делает."""
+    global _server
+    if _server is not None:
+        return _server
+    if port is None:
+        raw = _get_setting("METRICS_PORT", "")
+        if not raw:
+            return None
+        port = int(raw)
+    host = host or _get_setting("METRICS_HOST", "127.0.0.1")
+    with _server_lock:
+        if _server is None:
+            try:
+                server = ThreadingHTTPServer((host, port), _Handler)
+            except OSError:
+                # порт занят (например, второй процесс) — работаем без эндпоинта
+                return None
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+            _server = server
+    return _server
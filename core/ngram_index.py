@@ -0,0 +1,99 @@
+"""
+Триграммный индекс подстрок для style, casting_lot и description.
+
+`LIKE '%4710%'` (style_filter, casting_lot_filter для голых чисел) не может
+использовать обычный индекс и сканирует все строки с upper(trim()) на
+каждой. Здесь индекс строится по словарю значений колонки (value_index из
+id_index: уникальные upper(trim()) -> row id) — различных значений на
+порядки меньше, чем строк (style: ~70 тыс. на 1 млн строк):
+
+  - postings[триграмма] — отсортированные номера значений, где она встречается;
+  - `LIKE '%abc...%'`: пересекаем postings всех триграмм подстроки (от самого
+    короткого списка), кандидатов-значений проверяем точно (тем же LIKE,
+    переведённым в regex), строки берём из CSR словаря.
+
+Шаблоны без литерального куска длиной от 3 символов индекс не берёт.
+"""
+from __future__ import annotations
+
+import re
+import sys
+
+import numpy as np
+
+from core import snapshot_store, sql_rewrite
+from core.id_index import ColumnIndex, value_index
+
+NGRAM_COLUMNS = ("style", "casting_lot", "description")
+N = 3
+
+_EMPTY_SLOTS = np.empty(0, dtype=np.int32)
+
+
+def like_regex(pattern: str) -> re.Pattern:
+    """LIKE-шаблон -> regex для fullmatch (% — любая строка, _ — один символ)."""
+    out = []
+    for ch in pattern:
+        out.append(".*" if ch == "%" else "." if ch == "_" else re.escape(ch))
+    return re.compile("".join(out), re.S)
+
+
+class NgramIndex:
+    def __init__(self, values: ColumnIndex):
+        self.values = values
+        grams: dict[str, list[int]] = {}
+        for slot, key in enumerate(values.keys):
+            for g in {key[i:i + N] for i in range(len(key) - N + 1)}:
+                grams.setdefault(g, []).append(slot)
+        # slot'ы добавлялись по возрастанию — списки уже отсортированы
+        self.postings = {g: np.asarray(s, dtype=np.int32) for g, s in grams.items()}
+        # сам словарь значений учитывается в store.extras["values"]
+        self._nbytes = sys.getsizeof(self.postings) + sum(
+            a.nbytes + 100 for a in self.postings.values()
+        )
+
+    def _slots(self, needle: str) -> np.ndarray:
+        lists = sorted(
+            (self.postings.get(needle[i:i + N], _EMPTY_SLOTS) for i in range(len(needle) - N + 1)),
+            key=len,
+        )
+        slots = lists[0]
+        for other in lists[1:]:
+            if not len(slots):
+                break
+            slots = np.intersect1d(slots, other, assume_unique=True)
+        return slots
+
+    def like(self, pattern: str, limit: int = 0) -> np.ndarray | None:
+        """Row id строк, где значение LIKE pattern; None — нет куска из N символов или строк больше limit."""
+        pieces = [p for p in re.split(r"[%_]", pattern) if len(p) >= N]
+        if not pieces:
+            return None
+        slots = self._slots(max(pieces, key=len))
+        rx = like_regex(pattern)
+        keys = self.values.keys
+        hits = [s for s in slots.tolist() if rx.fullmatch(keys[s])]
+        return self.values.rows_for(hits, limit)
+
+    def lookup(self, atom: sql_rewrite.Atom, limit: int = 0) -> np.ndarray | None:
+        if atom.op == "=":
+            return self.values.lookup(atom, limit)
+        return self.like(atom.values[0], limit)
+
+    def nbytes(self) -> int:
+        return self._nbytes
+
+
+def build(store: snapshot_store.SnapshotStore) -> None:
+    store.extras["ngram_index"] = {
+        c: NgramIndex(value_index(store, c)) for c in NGRAM_COLUMNS if c in store.columns
+    }
+
+
+def lookup(atom: sql_rewrite.Atom, store) -> np.ndarray | None:
+    index = store.extras.get("ngram_index", {}).get(atom.column)
+    return None if index is None else index.lookup(atom, sql_rewrite.candidate_limit(store))
+
+
+snapshot_store.register_ingest_step("ngram_index", build)
+sql_rewrite.register_index("ngram_index", lookup, priority=30)
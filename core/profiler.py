@@ -0,0 +1,132 @@
+"""
+Профилирование отдельного запроса (opt-in).
+
+Включается переменной окружения PROFILE_REQUESTS=1 (все запросы процесса)
+или переключателем в админской панели (только текущая сессия). Когда
+выключено — main_app вообще не заходит в этот модуль, накладных расходов нет.
+
+Профиль (cProfile) пишется в logs/profiles/<request_id>.prof, а в запись
+usage-лога добавляется поле "profile" с именем файла — по request_id их
+легко сопоставить. Файл открывается стандартными инструментами
+(snakeviz, `python -m pstats`) или смотрится прямо в приложении через
+top_functions().
+"""
+from __future__ import annotations
+
+import contextvars
+import cProfile
+import io
+import os
+import pstats
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+from core.usage_log import LOG_DIR
+
+PROFILE_DIR = LOG_DIR / "profiles"
+MAX_PROFILES = int(os.getenv("PROFILE_MAX_FILES", "200"))
+
+# Одновременно может работать только один cProfile на процесс
+# (в 3.12+ это ещё и ошибка), поэтому параллельные запросы просто не профилируются.
+_active_lock = threading.Lock()
+_current: contextvars.ContextVar[str | None] = contextvars.ContextVar("profile_name", default=None)
+
+
+def env_enabled() -> bool:
+    return os.getenv("PROFILE_REQUESTS", "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def profile_name(request_id: str) -> str:
+    return f"{request_id}.prof"
+
+
+def current_profile() -> str | None:
+    """Имя файла профиля для запроса, который профилируется в этом потоке (для usage-лога)."""
+    return _current.get()
+
+
+@contextmanager
+def profile_request(request_id: str) -> Iterator[str | None]:
+    """
+    Профилирует блок целиком (parse -> execute -> render).
+    Отдаёт имя файла профиля или None, если профайлер уже занят другим запросом.
+    """
+    if not _active_lock.acquire(blocking=False):
+        yield None
+        return
+
+    name = profile_name(request_id)
+    token = _current.set(name)
+    prof = cProfile.Profile()
+    try:
+        prof.enable()
+        try:
+            yield name
+        finally:
+            prof.disable()
+    finally:
+        _current.reset(token)
+        _active_lock.release()
+        try:
+            PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+            prof.dump_stats(str(PROFILE_DIR / name))
+            _prune()
+        except Exception:
+            # профиль — диагностика, он не должен ломать запрос
+            pass
+
+
+def _prune() -> None:
+    files = sorted(PROFILE_DIR.glob("*.prof"), key=lambda p: p.stat().st_mtime)
+    for old in files[: max(len(files) - MAX_PROFILES, 0)]:
+        try:
+            old.unlink()
+        except OSError:
+            pass
+
+
+def profile_path(name: str) -> Path | None:
+    # только имена из PROFILE_DIR, без путей
+    path = PROFILE_DIR / Path(name).name
+    return path if path.exists() else None
+
+
+def list_profiles() -> list[Path]:
+    if not PROFILE_DIR.exists():
+        return []
+    return sorted(PROFILE_DIR.glob("*.prof"), key=lambda p: p.stat().st_mtime, reverse=True)
+
+
+def top_functions(path: Path, limit: int = 30, sort: str = "cumulative") -> list[dict]:
+    """Топ функций профиля: calls, tottime, cumtime (ms) и место в коде."""
+    st = pstats.Stats(str(path), stream=io.StringIO())
+    st.sort_stats(sort)
+    rows = []
+    for func in st.fcn_list[:limit]:
+        cc, nc, tt, ct, _ = st.stats[func]
+        filename, line, fname = func
+        rows.append({
+            "function": fname,
+            "location": f"{_short_path(filename)}:{line}",
+            "calls": nc,
+            "primitive_calls": cc,
+            "tottime_ms": round(tt * 1000, 3),
+            "cumtime_ms": round(ct * 1000, 3),
+        })
+    return rows
+
+
+def total_time_ms(path: Path) -> float:
+    return round(pstats.Stats(str(path), stream=io.StringIO()).total_tt * 1000, 3)
+
+
+def _short_path(filename: str) -> str:
+    base = str(Path(__file__).resolve().parent.parent)
+    if filename.startswith(base):
+        return filename[len(base) + 1:]
+    marker = "site-packages" + os.sep
+    if marker in filename:
+        return filename.split(marker, 1)[1]
+    return filename
@@ -0,0 +1,274 @@
+"""
+Запросы в пуле потоков: таймаут, прогресс, отмена.
+
+Streamlit выполняет скрипт сессии в своём потоке; долгий запрос (широкий
+LIKE '%..%' по всей истории) блокировал бы его целиком. Поэтому main_app
+отдаёт execute_access_query в пул (QUERY_WORKERS потоков) и ждёт результат
+короткими интервалами, обновляя прогресс, — скрипт остаётся отзывчивым,
+Streamlit может остановить его на любом обновлении.
+
+Отмена — через interrupt() курсора DuckDB: snapshot_store выполняет запросы
+внутри track(cursor), и курсор привязывается к задаче текущего потока
+(QueryJob). cancel() прерывает все её курсоры; задача из очереди просто не
+запускается. Отменяют задачу:
+
+  - таймер QUERY_TIMEOUT_S (секунды от старта, 0 — без лимита) -> QueryTimeout;
+  - JobSlot сессии: новый запрос сессии, кнопка Cancel и конец сессии
+    (session_state удалён — слот собран GC) -> QueryCancelled.
+
+Прогресс — query_progress() курсора (проценты, DuckDB считает их сам при
+enable_progress_bar). Для Access (pyodbc) прерывания нет: отменённый запрос
+доработает в фоне, а его результат будет выброшен.
+"""
+from __future__ import annotations
+
+import itertools
+import os
+import threading
+import time
+import weakref
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Hashable, Iterator
+
+from core import metrics
+
+
+def _get_setting(name: str, default: str) -> str:
+    try:
+        import streamlit as st
+        if name in st.secrets:
+            return str(st.secrets[name]).strip()
+    except Exception:
+        pass
+    return os.getenv(name, default).strip()
+
+
+QUERY_WORKERS = int(_get_setting("QUERY_WORKERS", "4"))
+QUERY_TIMEOUT_S = float(_get_setting("QUERY_TIMEOUT_S", "120"))
+
+
+class QueryCancelled(Exception):
+    """Запрос отменён (новый запрос сессии, Cancel, сессия закрыта)."""
+
+
+class QueryTimeout(QueryCancelled):
+    """Запрос не уложился в QUERY_TIMEOUT_S."""
+
+
+_pool: ThreadPoolExecutor | None = None
+_pool_lock = threading.Lock()
+_local = threading.local()
+_ids = itertools.count(1)
+_active: set[QueryJob] = set()
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=QUERY_WORKERS, thread_name_prefix="query")
+        return _pool
+
+
+class QueryJob:
+    """Один запрос в пуле: fn(*args) с таймаутом; cancel() прерывает его курсоры DuckDB."""
+
+    def __init__(self, key: Hashable, fn: Callable[..., Any], *args: Any, timeout: float = QUERY_TIMEOUT_S):
+        self.id = next(_ids)
+        self.key = key
+        self.timeout = timeout
+        self.created = time.time()
+        self.started: float | None = None
+        self._fn = fn
+        self._args = args
+        self._cursors: set = set()
+        self._lock = threading.Lock()
+        self._reason: str | None = None  # "cancelled" / "timeout"
+        self.future: Future = Future()
+
+    def __hash__(self) -> int:
+        return self.id
+
+    # ----- выполнение (поток пула) -----
+
+    def _run(self) -> Any:
+        if self._reason:
+            raise self._error()
+        self.started = time.time()
+        timer = None
+        if self.timeout > 0:
+            timer = threading.Timer(self.timeout, self.cancel, args=("timeout",))
+            timer.daemon = True
+            timer.start()
+        _local.job = self
+        try:
+            result = self._fn(*self._args)
+        except Exception as e:
+            if self._reason:
+                raise self._error() from e
+            raise
+        finally:
+            _local.job = None
+            if timer is not None:
+                timer.cancel()
+        if self._reason:
+            raise self._error()  # interrupt опоздал: запрос успел дойти до конца
+        return result
+
+    def _error(self) -> QueryCancelled:
+        if self._reason == "timeout":
+            return QueryTimeout(f"Query timed out after {self.timeout:g} s")
+        return QueryCancelled("Query cancelled")
+
+    def _attach(self, cursor) -> None:
+        with self._lock:
+            if self._reason:
+                raise self._error()
+            self._cursors.add(cursor)
+        try:
+            cursor.execute("SET enable_progress_bar = true")
+            cursor.execute("SET enable_progress_bar_print = false")
+        except Exception:
+            pass
+
+    def _detach(self, cursor) -> None:
+        with self._lock:
+            self._cursors.discard(cursor)
+
+    # ----- управление (любой поток) -----
+
+    def cancel(self, reason: str = "cancelled") -> bool:
+        """Отменить задачу; False — она уже закончилась или уже отменена."""
+        with self._lock:
+            if self._reason or self.future.done():
+                return False
+            self._reason = reason
+            cursors = list(self._cursors)
+        self.future.cancel()  # ещё в очереди — не запустится
+        for cur in cursors:
+            try:
+                cur.interrupt()
+            except Exception:
+                pass
+        return True
+
+    def done(self) -> bool:
+        return self.future.done()
+
+    def result(self, timeout: float | None = None) -> Any:
+        """Результат fn; QueryCancelled / QueryTimeout, если отменена; TimeoutError — ещё работает."""
+        try:
+            return self.future.result(timeout)
+        except CancelledError:
+            raise self._error() from None
+
+    def progress(self) -> float | None:
+        """Проценты выполнения текущего запроса DuckDB; None — неизвестно."""
+        with self._lock:
+            cursors = list(self._cursors)
+        best = None
+        for cur in cursors:
+            try:
+                p = cur.query_progress()
+            except Exception:
+                continue
+            if p is not None and p >= 0:
+                best = p if best is None else max(best, p)
+        return best
+
+    def elapsed(self) -> float:
+        return time.time() - self.created
+
+
+def submit(job: QueryJob) -> QueryJob:
+    """Поставить задачу в пул."""
+    with _pool_lock:
+        _active.add(job)
+
+    def _finish(_f: Future) -> None:
+        with _pool_lock:
+            _active.discard(job)
+        outcome = "ok"
+        if job._reason:
+            outcome = job._reason
+        elif _f.exception() is not None:
+            outcome = "error"
+        metrics.QUERY_JOBS.inc(outcome=outcome)
+
+    job.future = _executor().submit(job._run)
+    job.future.add_done_callback(_finish)
+    return job
+
+
+@contextmanager
+def track(cursor) -> Iterator[Any]:
+    """Выполнение на cursor в потоке задачи: её cancel() прервёт этот курсор."""
+    job: QueryJob | None = getattr(_local, "job", None)
+    if job is None:
+        yield cursor
+        return
+    job._attach(cursor)
+    try:
+        yield cursor
+    finally:
+        job._detach(cursor)
+
+
+def cancelled() -> bool:
+    """Задача текущего потока отменена (вне задачи — False)."""
+    job: QueryJob | None = getattr(_local, "job", None)
+    return job is not None and job._reason is not None
+
+
+def check_cancelled() -> None:
+    """QueryCancelled / QueryTimeout, если задача текущего потока отменена."""
+    job: QueryJob | None = getattr(_local, "job", None)
+    if job is not None and job._reason:
+        raise job._error()
+
+
+def _cancel_boxed(box: list) -> None:
+    job = box[0]
+    if job is not None:
+        job.cancel()
+
+
+class JobSlot:
+    """
+    Запрос сессии в пуле (держать в session_state).
+
+    Новый submit отменяет предыдущий запрос, если тот ещё работает; слот
+    собран GC (сессия закончилась) — тоже.
+    """
+
+    def __init__(self):
+        self._box: list[QueryJob | None] = [None]
+        weakref.finalize(self, _cancel_boxed, self._box)
+
+    @property
+    def job(self) -> QueryJob | None:
+        return self._box[0]
+
+    def pending(self, key: Hashable) -> QueryJob | None:
+        """Запрос с этим ключом, результат которого ещё не забрали (rerun прервал ожидание)."""
+        job = self._box[0]
+        return job if job is not None and job.key == key else None
+
+    def submit(self, key: Hashable, fn: Callable[..., Any], *args: Any, timeout: float = QUERY_TIMEOUT_S) -> QueryJob:
+        self.cancel()
+        job = submit(QueryJob(key, fn, *args, timeout=timeout))
+        self._box[0] = job
+        return job
+
+    def release(self, job: QueryJob) -> None:
+        """Результат забран — слот свободен."""
+        if self._box[0] is job:
+            self._box[0] = None
+
+    def cancel(self) -> bool:
+        job, self._box[0] = self._box[0], None
+        return job.cancel() if job is not None else False
+
+
+metrics.QUERY_JOBS_ACTIVE.set_function(lambda: float(len(_active)))
@@ -0,0 +1,120 @@
+"""
+US-размер кольца из item_size как число.
+
+В item_size размер записан строкой в нескольких видах: US-число ('6.5',
+'7', '11.75'), пара UK-US ('M-6.5', 'Q.5-8.5', 'G.5 - 3.75') и голая
+UK-буква ('M', 'G.5'). Правило одно (parse), оба backend'а считают по нему:
+
+  - есть дефис — Val() части после первого дефиса;
+  - голая UK-буква — по таблице UK_TO_US ('M' -> 6.5, 'G.5' -> 3.75);
+  - иначе — Val() всей строки;
+  - 0 (NULL, '0', мусор) — NULL: размера нет.
+
+Фильтр item_size пишет диапазоны ("size 6 to 8", "size above 10") как
+сравнения колонки [size_us] (SIZE_COLUMN), без привязки к backend'у:
+
+  - snapshot (DuckDB): size_us — производная колонка, ingest-шаг
+    "ring_sizes" раз на snapshot разбирает уникальные значения item_size
+    (их десятки); диапазон — простое сравнение числовой колонки (zone maps);
+  - Access: to_access() подставляет вместо [size_us] выражение
+    US_SIZE_ACCESS — то же правило через IIf/InStr/Mid/Val/Asc.
+"""
+from __future__ import annotations
+
+import re
+import string
+
+from core import snapshot_store
+
+SIZE_COLUMN = "[size_us]"
+COLUMNS = {"size_us": "DOUBLE"}
+
+# Таблица UK -> US (как в парах snapshot: F-3, M-6.5, P-7.75, Q.5-8.5, X-11.75):
+# до O — шаг 0.5 от A = 0.5, с P — шаг 0.5 от 7.75 (между O и P четверть);
+# половинка буквы — +0.25
+UK_TO_US: dict[str, float] = {}
+for _i, _letter in enumerate(string.ascii_uppercase):
+    _us = 0.5 * (_i + 1) if _letter <= "O" else 7.75 + 0.5 * (ord(_letter) - ord("P"))
+    UK_TO_US[_letter] = _us
+    UK_TO_US[_letter + ".5"] = _us + 0.25
+
+_UK_RE = re.compile(r"^[A-Z](?:\.5)?$")
+_US_RE = re.compile(r"^\d+(?:\.\d+)?$")
+_VAL_RE = re.compile(r"\d*(?:\.\d*)?")
+
+# parse() в Access SQL, {f} — поле item_size. {f} & '' — NULL как пустая
+# строка; '0' & ... — Val пустой строки и букв даёт 0, а не ошибку.
+# Номер буквы p = Asc - 64: до O (p <= 15) US = 0.5 * p, с P — 7.75 + 0.5 * (p - 16).
+_TRIM = "Trim({f} & '')"
+_DASH = "InStr({f} & '', '-')"
+_P = f"(Asc(UCase({_TRIM})) - 64)"
+_US_ACCESS = (
+    f"IIf({_DASH} > 0, Val('0' & Mid({{f}}, {_DASH} + 1)), "
+    f"IIf({_TRIM} Like '[A-Z]' Or {_TRIM} Like '[A-Z].5', "
+    f"IIf({_P} <= 15, 0.5 * {_P}, 7.75 + 0.5 * ({_P} - 16)) + IIf({_TRIM} Like '*.5', 0.25, 0), "
+    "Val('0' & {f})))"
+)
+US_SIZE_ACCESS = f"IIf({_US_ACCESS} > 0, {_US_ACCESS}, Null)"
+
+
+def _val(s: str) -> float:
+    """Val() Access: число в начале строки (пробелы пропускаются); нет числа — 0."""
+    digits = _VAL_RE.match(re.sub(r"\s+", "", s)).group(0)
+    return float(digits) if digits.strip(".") else 0.0
+
+
+def parse(value: str | None) -> float | None:
+    """US-размер для значения item_size; None — размера нет."""
+    s = (value or "").strip().upper()
+    if "-" in s:
+        us = _val(s.partition("-")[2])
+    elif _UK_RE.match(s):
+        us = UK_TO_US[s]
+    else:
+        us = _val(s)
+    return us or None
+
+
+def us_size(token: str) -> float | None:
+    """US-размер из токена запроса: '6.5' -> 6.5, 'M' -> 6.5, 'Q.5' -> 8.5."""
+    t = token.strip().upper()
+    if _US_RE.match(t):
+        return float(t)
+    return UK_TO_US.get(t)
+
+
+def to_access(sql: str, field: str = "[item_size]") -> str:
+    """[size_us] -> выражение по field: в Access производной колонки нет."""
+    return sql.replace(SIZE_COLUMN, US_SIZE_ACCESS.format(f=field))
+
+
+def _literal(x: float | None) -> str:
+    return "NULL" if x is None else repr(x)
+
+
+def build(store: snapshot_store.SnapshotStore) -> None:
+    if "item_size" not in store.columns:
+        return
+    t = snapshot_store.TABLE
+    cur = store.cursor()
+    try:
+        values = cur.execute(f'SELECT DISTINCT "item_size" FROM {t} WHERE "item_size" IS NOT NULL').fetchall()
+    finally:
+        cur.close()
+    rows = []
+    for (v,) in values:
+        us = parse(str(v))
+        if us is not None:
+            rows.append(f"('{str(v).replace(chr(39), chr(39) * 2)}', {_literal(us)})")
+    if not rows:
+        store.add_columns(COLUMNS, {"size_us": "NULL"})
+        return
+    # разбор — по уникальным значениям в Python, по строкам — один UPDATE с join
+    store.add_columns(
+        COLUMNS,
+        {"size_us": "d.us"},
+        f"FROM (VALUES {', '.join(rows)}) d(v, us) WHERE CAST({t}.\"item_size\" AS VARCHAR) = d.v",
+    )
+
+
+snapshot_store.register_ingest_step("ring_sizes", build)
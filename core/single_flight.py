@@ -0,0 +1,78 @@
+"""
+Single-flight: одинаковые запросы, которые выполняются одновременно, — одно выполнение.
+
+В начале смены многие нажимают одну и ту же кнопку ("Casting today") в
+пределах секунд; кэши (parse memo, результаты в db_utils) помогают только
+тем, кто пришёл после того, как первый закончил. SingleFlight.do(key, fn)
+держит словарь ключей в работе: первый вызов с ключом (лидер) выполняет
+fn, остальные (followers) ждут его результат и получают тот же объект.
+
+  - ошибка лидера достаётся и followers — кроме отмены: если лидера
+    прервали (его сессия ушла на другой запрос, Cancel, таймаут), follower
+    не отменён и выполняет запрос сам (становится лидером);
+  - follower в задаче query_jobs ждёт короткими интервалами и сам может
+    быть отменён;
+  - метрики: app_single_flight_total{kind, role=leader|follower} —
+    доля follower'ов и есть доля сэкономленных выполнений.
+"""
+from __future__ import annotations
+
+import threading
+from typing import Any, Callable, Hashable
+
+from core import metrics, query_jobs
+
+
+class _Call:
+    __slots__ = ("done", "value", "error", "cancelled")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: BaseException | None = None
+        self.cancelled = False
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def inflight(self) -> int:
+        return len(self._calls)
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args: Any) -> tuple[Any, bool]:
+        """(результат fn(*args), shared): shared — получен от другого (лидера) вызова."""
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = _Call()
+
+            if leader:
+                metrics.SINGLE_FLIGHT.inc(kind=self.name, role="leader")
+                return self._lead(key, call, fn, args), False
+
+            metrics.SINGLE_FLIGHT.inc(kind=self.name, role="follower")
+            while not call.done.wait(0.1):
+                query_jobs.check_cancelled()
+            if call.error is None:
+                return call.value, True
+            if not call.cancelled:
+                raise call.error
+            # лидера отменили, нас — нет: выполняем сами
+
+    def _lead(self, key: Hashable, call: _Call, fn: Callable[..., Any], args: tuple) -> Any:
+        try:
+            call.value = fn(*args)
+            return call.value
+        except BaseException as e:
+            call.error = e
+            call.cancelled = query_jobs.cancelled()
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
@@ -0,0 +1,263 @@
+"""
+Snapshot, загруженный в память процесса (DuckDB in-memory), один на sha.
+
+Раньше каждый запрос открывал новое соединение и заново парсил CSV
+(read_csv_auto) — это и было основное время execute. Теперь snapshot
+читается один раз в таблицу T_Local_Snapshot, а запросы идут через
+cursor() того же соединения (cursor'ы DuckDB можно использовать из разных
+потоков одновременно).
+
+Шаги ingest (индексы, производные колонки, словари) регистрируются через
+register_ingest_step() и выполняются один раз при загрузке snapshot.
+Производные колонки (add_columns) живут в той же таблице, но в SELECT *
+запросов фильтров не попадают: результат — исходные колонки snapshot.
+
+Запросы, которые индекс сводит к набору row id, идут через fetch(): строки
+берутся из Arrow-копии таблицы (take по row id, O(k)), и исходный WHERE
+проверяется только на них. DuckDB так не умеет: даже `rowid IN (...)`
+сканирует все row group'ы, если id разбросаны по таблице. Arrow-копия
+строится при первом таком запросе и учитывается в памяти snapshot.
+"""
+from __future__ import annotations
+
+import importlib
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Callable
+
+import pandas as pd
+
+from core import memory, metrics, query_jobs
+
+TABLE = "T_Local_Snapshot"
+MIN_RESIDENT_SEC = 60
+
+_STAR_RE = re.compile(rf"^(\s*SELECT\s+)\*(\s+FROM\s+{TABLE}\b)", re.I)
+
+
+class SnapshotStore:
+    def __init__(self, path: Path, sha: str | None, reader_sql: str):
+        import duckdb
+
+        self.path = Path(path)
+        self.sha = sha
+        self.key = (str(path), sha)
+        self.con = duckdb.connect(database=":memory:")
+        self.timings_ms: dict[str, float] = {}
+        # всё, что ingest-шаги хотят сохранить рядом со snapshot (индексы и т.п.)
+        self.extras: dict[str, object] = {}
+        self._rows_lock = threading.Lock()
+
+        t0 = time.perf_counter()
+        self.con.execute(f"CREATE TABLE {TABLE} AS SELECT * FROM {reader_sql}")
+        self.timings_ms["load"] = (time.perf_counter() - t0) * 1000
+        self.rows = self.con.execute(f"SELECT count(*) FROM {TABLE}").fetchone()[0]
+        self.columns = [r[0] for r in self.con.execute(f"DESCRIBE {TABLE}").fetchall()]
+        # колонки, добавленные ingest-шагами (в self.columns их нет)
+        self.derived: list[str] = []
+
+        for name, step in _ingest_plan():
+            t0 = time.perf_counter()
+            step(self)
+            self.timings_ms[name] = (time.perf_counter() - t0) * 1000
+        self.loaded_at = time.time()
+
+    def add_columns(self, columns: dict[str, str], values: dict[str, str], source: str = "") -> None:
+        """
+        Производные колонки: columns — {имя: тип}, values — {имя: выражение};
+        source — "FROM ... WHERE ..." для UPDATE, если выражения берут значения
+        из других таблиц/подзапросов. Считаются одним UPDATE по всей таблице
+        (row id не меняются — индексы ingest остаются верны).
+        """
+        cur = self.con.cursor()
+        try:
+            for name, col_type in columns.items():
+                cur.execute(f'ALTER TABLE {TABLE} ADD COLUMN "{name}" {col_type}')
+            sets = ", ".join(f'"{name}" = {values[name]}' for name in columns)
+            cur.execute(f"UPDATE {TABLE} SET {sets} {source}")
+        finally:
+            cur.close()
+        self.derived += [c for c in columns if c not in self.derived]
+
+    def visible_sql(self, sql: str) -> str:
+        """SELECT * FROM T_Local_Snapshot ... без производных колонок."""
+        if not self.derived:
+            return sql
+        cols = ", ".join(f'"{c}"' for c in self.derived)
+        return _STAR_RE.sub(lambda m: f"{m[1]}* EXCLUDE ({cols}){m[2]}", sql, count=1)
+
+    def query(self, sql: str) -> pd.DataFrame:
+        cur = self.con.cursor()
+        try:
+            # в потоке query_jobs курсор можно прервать (отмена, таймаут)
+            with query_jobs.track(cur):
+                return cur.execute(self.visible_sql(sql)).df()
+        finally:
+            cur.close()
+
+    def _row_table(self):
+        rows = self.extras.get("rows")
+        if rows is None:
+            with self._rows_lock:
+                rows = self.extras.get("rows")
+                if rows is None:
+                    cur = self.con.cursor()
+                    try:
+                        # порядок строк таблицы = row id (preserve_insertion_order)
+                        rows = self.extras["rows"] = cur.execute(f"SELECT * FROM {TABLE}").to_arrow_table()
+                    finally:
+                        cur.close()
+        return rows
+
+    def fetch(self, row_ids, where: str) -> pd.DataFrame:
+        """SELECT * ... WHERE where, но только среди строк row_ids (отсортированы по возрастанию)."""
+        import pyarrow as pa
+
+        rows = self._row_table()
+        subset = rows.take(pa.array(row_ids, type=pa.int64()))
+        cur = self.con.cursor()
+        try:
+            rel = cur.from_arrow(subset).filter(where)
+            if self.derived:
+                rel = rel.project(", ".join(f'"{c}"' for c in self.columns))
+            with query_jobs.track(cur):
+                df = rel.df()
+        finally:
+            cur.close()
+        # ENUM-колонки в Arrow-копии — словари, из DuckDB они приходят строками:
+        # возвращаем Categorical с категориями ENUM, как у query()
+        for field in rows.schema:
+            if pa.types.is_dictionary(field.type) and field.name in df.columns and rows.num_rows:
+                categories = rows.column(field.name).chunk(0).dictionary.to_pylist()
+                df[field.name] = pd.Categorical(df[field.name], categories=categories)
+        return df
+
+    def explain(self, sql: str) -> str:
+        """EXPLAIN ANALYZE того, что выполняет query(sql)."""
+        cur = self.con.cursor()
+        try:
+            rows = cur.execute("EXPLAIN ANALYZE " + self.visible_sql(sql)).fetchall()
+        finally:
+            cur.close()
+        return "\n".join(str(r[-1]) for r in rows)
+
+    def explain_fetch(self, row_ids, where: str) -> str:
+        """EXPLAIN ANALYZE того, что выполняет fetch(row_ids, where): фильтр по строкам-кандидатам."""
+        import pyarrow as pa
+
+        subset = self._row_table().take(pa.array(row_ids, type=pa.int64()))
+        cols = ", ".join(f'"{c}"' for c in self.columns) if self.derived else "*"
+        cur = self.con.cursor()
+        try:
+            cur.register("candidate_rows", subset)
+            rows = cur.execute(f"EXPLAIN ANALYZE SELECT {cols} FROM candidate_rows WHERE {where}").fetchall()
+        finally:
+            cur.close()
+        return "\n".join(str(r[-1]) for r in rows)
+
+    def cursor(self):
+        return self.con.cursor()
+
+    def nbytes(self) -> int:
+        """Память DuckDB (таблица + индексы) и объектов из extras."""
+        try:
+            got = self.con.execute("SELECT sum(memory_usage_bytes) FROM duckdb_memory()").fetchone()[0]
+        except Exception:
+            got = None
+        extra = sum(memory.nbytes(v) for v in self.extras.values())
+        return int(got or 0) + extra
+
+    def close(self) -> None:
+        try:
+            self.con.close()
+        except Exception:
+            pass
+
+
+# ---------- ingest-шаги ----------
+
+# Модули ingest-шагов (шаг модуля core.X называется "X"): импортируются при
+# загрузке первого snapshot, а не при `import main_app`. Шаги выполняются в
+# этом порядке, независимо от того, кто какой модуль импортировал раньше;
+# шаги, зарегистрированные из других модулей, — после них.
+INGEST_MODULES = (
+    "core.attributes",
+    "core.dict_codes",
+    "core.entities",
+    "core.id_index",
+    "core.fulltext_index",
+    "core.ngram_index",
+    "core.ring_sizes",
+)
+
+_ingest_steps: dict[str, Callable[[SnapshotStore], None]] = {}
+
+
+def register_ingest_step(name: str, step: Callable[[SnapshotStore], None]) -> None:
+    """Шаг выполняется для каждого нового snapshot (после загрузки таблицы)."""
+    _ingest_steps[name] = step
+
+
+def _ingest_plan() -> list[tuple[str, Callable[[SnapshotStore], None]]]:
+    for module in INGEST_MODULES:
+        importlib.import_module(module)
+    order = {m.rsplit(".", 1)[1]: i for i, m in enumerate(INGEST_MODULES)}
+    return sorted(_ingest_steps.items(), key=lambda item: order.get(item[0], len(order)))
+
+
+# ---------- текущий snapshot процесса ----------
+
+class _Holder:
+    """Держит текущий SnapshotStore; для учёта памяти это кэш "snapshot"."""
+
+    name = "snapshot"
+
+    def __init__(self):
+        self.store: SnapshotStore | None = None
+        self.lock = threading.Lock()
+
+    def get(self, path: Path, sha: str | None, reader_sql: str) -> SnapshotStore:
+        key = (str(path), sha)
+        store = self.store
+        if store is not None and store.key == key:
+            metrics.cache_lookup("snapshot_table", True)
+            return store
+        with self.lock:
+            store = self.store
+            if store is None or store.key != key:
+                metrics.cache_lookup("snapshot_table", False)
+                # старый store не закрываем явно: запросы, которые ещё держат
+                # его cursor, доработают, соединение закроется вместе с объектом
+                store = self.store = SnapshotStore(path, sha, reader_sql)
+        return store
+
+    def nbytes(self) -> int:
+        store = self.store
+        return store.nbytes() if store is not None else 0
+
+    def entries(self) -> int:
+        return 0 if self.store is None else 1
+
+    def shrink(self, target_bytes: int) -> int:
+        store = self.store
+        # snapshot — рабочий набор: выгружаем только целиком и не сразу после загрузки,
+        # иначе при маленьком бюджете он перезагружался бы на каждом запросе
+        if target_bytes > 0 or store is None or time.time() - store.loaded_at < MIN_RESIDENT_SEC:
+            return 0
+        freed = self.nbytes()
+        # следующий запрос загрузит snapshot заново
+        self.store = None
+        return freed
+
+
+_holder = memory.register_cache(_Holder(), memory.PRIORITY_SNAPSHOT)
+
+
+def get_store(path: Path, sha: str | None, reader_sql: str) -> SnapshotStore:
+    return _holder.get(path, sha, reader_sql)
+
+
+def current_store() -> SnapshotStore | None:
+    return _holder.store
@@ -0,0 +1,242 @@
+"""
+Переписывание DuckDB SQL перед выполнением на загруженном snapshot.
+
+Фильтры по-прежнему генерируют переносимый Access SQL (его же можно
+выполнить в самом Access), а индексы, построенные при ingest
+(store.extras), использует только DuckDB-исполнитель: индексы из
+register_index() отвечают на атомы WHERE (`upper(trim("col")) = / LIKE /
+IN ...`) и дают row id строк-кандидатов; по AND/OR-структуре WHERE
+кандидаты пересекаются/объединяются (OR — только если покрыты все ветви,
+под NOT индекс не используется). Тогда запрос не сканирует таблицу:
+SnapshotStore.fetch() берёт эти строки напрямую и проверяет на них
+исходный WHERE целиком.
+
+Индекс только сужает набор (кандидаты — надмножество ответа), точную
+проверку, включая NULL и NOT/OR-логику, делает сам DuckDB. Поэтому индекс
+может ошибиться лишь в сторону лишних кандидатов — это медленнее, но
+результат тот же.
+"""
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from typing import Callable
+
+import numpy as np
+
+from core import metrics
+
+TABLE = "T_Local_Snapshot"
+
+_SELECT_RE = re.compile(rf"^\s*SELECT \* FROM {TABLE} WHERE (.+?)\s*;?\s*$", re.S | re.I)
+
+# кандидатов больше — индекс не помогает: выборка строк дороже скана
+MAX_CANDIDATES = 50_000
+
+
+# ---------- разбор WHERE ----------
+
+def _scan(expr: str):
+    """(позиция, символ, глубина скобок) для символов вне строковых литералов."""
+    depth = 0
+    i, n = 0, len(expr)
+    while i < n:
+        ch = expr[i]
+        if ch == "'":
+            i += 1
+            while i < n:
+                if expr[i] == "'":
+                    if i + 1 < n and expr[i + 1] == "'":
+                        i += 2
+                        continue
+                    break
+                i += 1
+            i += 1
+            continue
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        yield i, ch, depth
+        i += 1
+
+
+def split_top(expr: str, keyword: str) -> list[str]:
+    """Делит expr по AND/OR верхнего уровня (вне скобок и литералов)."""
+    kw = f" {keyword.upper()} "
+    parts, start = [], 0
+    upper = expr.upper()
+    for i, ch, depth in _scan(expr):
+        if depth == 0 and ch == " " and upper.startswith(kw, i):
+            parts.append(expr[start:i].strip())
+            start = i + len(kw)
+    parts.append(expr[start:].strip())
+    return [p for p in parts if p]
+
+
+def strip_parens(expr: str) -> str:
+    """Снимает внешние скобки, если они охватывают всё выражение."""
+    expr = expr.strip()
+    while expr.startswith("(") and expr.endswith(")"):
+        closes_early = any(depth == 0 and i < len(expr) - 1 for i, ch, depth in _scan(expr) if ch == ")")
+        if closes_early:
+            break
+        expr = expr[1:-1].strip()
+    return expr
+
+
+_LIT = r"'((?:[^']|'')*)'"
+_NORM_COL = r'upper\(trim\("([^"]+)"\)\)'
+_ATOM_EQ = re.compile(rf"^{_NORM_COL}\s*=\s*{_LIT}$", re.I)
+_ATOM_LIKE = re.compile(rf"^{_NORM_COL}\s+LIKE\s+{_LIT}(\s+ESCAPE\s+'\\')?$", re.I)
+_ATOM_IN = re.compile(rf"^{_NORM_COL}\s+IN\s*\((.*)\)$", re.I | re.S)
+_LIT_RE = re.compile(_LIT)
+
+
+def _unquote(s: str) -> str:
+    return s.replace("''", "'")
+
+
+def _unescape_like(pattern: str) -> str:
+    """
+    Шаблон LIKE ... ESCAPE '\\' -> шаблон без ESCAPE для индексов: экранированные
+    % и _ становятся _ (любой символ) — надмножество, точно проверяет DuckDB.
+    """
+    return re.sub(r"\\(.)", lambda m: "_" if m[1] in "%_" else m[1], pattern)
+
+
+@dataclass(frozen=True)
+class Atom:
+    """Положительное условие над upper(trim(col)): '=' (values) или LIKE (pattern)."""
+    column: str
+    op: str
+    values: tuple[str, ...]
+
+
+def parse_atom(expr: str) -> Atom | None:
+    expr = strip_parens(expr)
+    m = _ATOM_EQ.match(expr)
+    if m:
+        return Atom(m[1], "=", (_unquote(m[2]),))
+    m = _ATOM_LIKE.match(expr)
+    if m:
+        pattern = _unquote(m[2])
+        return Atom(m[1], "LIKE", (_unescape_like(pattern) if m[3] else pattern,))
+    m = _ATOM_IN.match(expr)
+    if m:
+        lits = _LIT_RE.findall(m[2])
+        # только список литералов: '...', '...'
+        if lits and _LIT_RE.sub("", m[2]).replace(",", "").strip() == "":
+            return Atom(m[1], "=", tuple(_unquote(x) for x in lits))
+    return None
+
+
+def like_prefix(pattern: str) -> str:
+    """Литеральный префикс LIKE-шаблона (до первого % или _)."""
+    cut = len(pattern)
+    for wc in ("%", "_"):
+        pos = pattern.find(wc)
+        if pos != -1:
+            cut = min(cut, pos)
+    return pattern[:cut]
+
+
+# ---------- индексы ----------
+
+@dataclass
+class Plan:
+    """Выполнить where только на строках row_ids (в порядке row id) вместо скана таблицы."""
+    row_ids: np.ndarray
+    where: str
+    indexes: tuple[str, ...]
+
+
+# lookup(atom, store) -> row id, где atom может быть истинным (надмножество), или None;
+# None допустим всегда (в т.ч. когда кандидатов больше candidate_limit): под AND
+# такое условие просто не сужает выборку
+AtomLookup = Callable[[Atom, object], "np.ndarray | None"]
+_indexes: list[tuple[int, str, AtomLookup]] = []
+
+
+def register_index(name: str, lookup: AtomLookup, priority: int = 50) -> None:
+    """Индекс отвечает на атомы, которые умеет; атом спрашивается сначала у меньшего priority."""
+    _indexes[:] = sorted([x for x in _indexes if x[1] != name] + [(priority, name, lookup)], key=lambda x: x[0])
+
+
+def candidate_limit(store) -> int:
+    """Больше кандидатов выборка строк уже не дешевле скана — индексу лучше вернуть None."""
+    return min(MAX_CANDIDATES, max(store.rows // 4, 1_000))
+
+
+def where_clause(sql: str) -> str | None:
+    """WHERE запроса или None, если запрос не SELECT * FROM T_Local_Snapshot WHERE ..."""
+    m = _SELECT_RE.match(sql)
+    return m[1] if m else None
+
+
+def _atom_rows(expr: str, store, used: set[str]) -> np.ndarray | None:
+    atom = parse_atom(expr)
+    if atom is None:
+        return None
+    for _, name, lookup in _indexes:
+        try:
+            got = lookup(atom, store)
+        except Exception as e:
+            # индекс только ускоряет запрос: при ошибке выполняем без него
+            metrics.ERRORS.inc(stage=f"index_{name}", error_class=type(e).__name__)
+            continue
+        if got is not None:
+            used.add(name)
+            return got
+    return None
+
+
+def _rows(expr: str, store, used: set[str]) -> np.ndarray | None:
+    """
+    Надмножество строк, где expr может быть истинным, или None (= любые строки):
+      - A AND B: пересечение тех частей, что покрыты индексами;
+      - A OR B: объединение, только если покрыты все части;
+      - NOT ...: None — дополнение надмножества уже не надмножество.
+    """
+    expr = strip_parens(expr)
+    parts = split_top(expr, "AND")
+    if len(parts) > 1:
+        ids = None
+        for p in parts:
+            got = _rows(p, store, used)
+            if got is not None:
+                ids = got if ids is None else np.intersect1d(ids, got, assume_unique=True)
+        return ids
+    parts = split_top(expr, "OR")
+    if len(parts) > 1:
+        found, names = [], set()
+        for p in parts:
+            got = _rows(p, store, names)
+            if got is None:
+                return None
+            found.append(got)
+        used |= names
+        return np.unique(np.concatenate(found))
+    if expr.upper().startswith("NOT ") or expr.upper().startswith("NOT("):
+        return None
+    got = _atom_rows(expr, store, used)
+    return None if got is None else np.unique(got)
+
+
+def plan(sql: str, store) -> Plan | None:
+    """План по индексам snapshot или None — выполнять sql как есть."""
+    if not _indexes:
+        return None
+    where = where_clause(sql)
+    if where is None:
+        return None
+    used: set[str] = set()
+    ids = _rows(where, store, used)
+    if ids is None:
+        return None
+    # OR может собрать больше кандидатов, чем допустимо для одного индекса
+    if len(ids) > candidate_limit(store):
+        return None
+    for name in used:
+        metrics.INDEX_REWRITES.inc(index=name)
+    return Plan(ids, where, tuple(sorted(used)))
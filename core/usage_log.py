@@ -0,0 +1,218 @@
+"""
+Структурированный usage-лог (JSONL) с фоновой записью.
+
+Каждое событие — одна JSON-строка в logs/ai_usage_log.jsonl:
+  ts, event, request_id, session_id, snapshot_sha, query, sql, layout,
+  rows, error, error_class, timings_ms {...}, cache {...}
+
+Поток Streamlit только кладёт dict в очередь (put_nowait) и никогда не ждёт
+диска: сериализация, запись, ротация и gzip делаются в фоновом потоке.
+Ротация — по размеру (USAGE_LOG_MAX_BYTES) и по смене дня; старые сегменты
+сжимаются в ai_usage_log.<YYYYmmdd-HHMMSS>.jsonl.gz рядом с текущим файлом.
+"""
+from __future__ import annotations
+
+import atexit
+import gzip
+import json
+import os
+import queue
+import shutil
+import threading
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+LOG_DIR = Path(os.getenv("USAGE_LOG_DIR", Path(__file__).resolve().parent.parent / "logs"))
+LOG_FILE = LOG_DIR / "ai_usage_log.jsonl"
+
+# Старый текстовый лог (tab-separated) — больше не пишется, остаётся как архив.
+LEGACY_LOG_FILE = LOG_DIR / "ai_usage_log.txt"
+
+MAX_BYTES = int(os.getenv("USAGE_LOG_MAX_BYTES", str(5 * 1024 * 1024)))
+FLUSH_INTERVAL_SEC = float(os.getenv("USAGE_LOG_FLUSH_SEC", "1.0"))
+QUEUE_MAXSIZE = 10_000
+
+SQL_MAX_CHARS = 4000
+ERROR_MAX_CHARS = 1000
+
+_STOP = object()
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+class UsageLogWriter:
+    """Очередь + один фоновый поток, который пишет JSONL и ротирует сегменты."""
+
+    def __init__(
+        self,
+        path: Path = LOG_FILE,
+        max_bytes: int = MAX_BYTES,
+        flush_interval: float = FLUSH_INTERVAL_SEC,
+        maxsize: int = QUEUE_MAXSIZE,
+    ):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=maxsize)
+        self._fh = None
+        self._segment_day = None
+        self._thread = threading.Thread(target=self._run, name="usage-log-writer", daemon=True)
+        self._thread.start()
+
+    # --- вызывается из потока запроса ---
+
+    def submit(self, record: dict[str, Any]) -> bool:
+        try:
+            self._queue.put_nowait(record)
+            return True
+        except queue.Full:
+            # лог не должен тормозить запрос — просто считаем потери
+            self.dropped += 1
+            return False
+
+    def close(self, timeout: float = 5.0) -> None:
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+    # --- фоновый поток ---
+
+    def _run(self) -> None:
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                self._flush()
+                continue
+
+            batch = [item]
+            # забираем всё, что накопилось, одной пачкой
+            while len(batch) < 1000:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = False
+            for rec in batch:
+                if rec is _STOP:
+                    stop = True
+                    continue
+                self._write(rec)
+            self._flush()
+            if stop:
+                self._close_file()
+                return
+
+    def _open(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if self.path.exists() and self.path.stat().st_size > 0:
+            self._segment_day = datetime.fromtimestamp(self.path.stat().st_mtime).date()
+        else:
+            self._segment_day = datetime.now().date()
+        self._fh = open(self.path, "a", encoding="utf-8")
+
+    def _write(self, rec: dict[str, Any]) -> None:
+        try:
+            if self._fh is None:
+                self._open()
+            if self._needs_rotation():
+                self._rotate()
+            self._fh.write(json.dumps(rec, ensure_ascii=False, default=str) + "\n")
+        except Exception:
+            # как и раньше: ошибки логирования никогда не ломают приложение
+            pass
+
+    def _flush(self) -> None:
+        if self._fh is not None:
+            try:
+                self._fh.flush()
+            except Exception:
+                pass
+
+    def _close_file(self) -> None:
+        if self._fh is not None:
+            try:
+                self._fh.close()
+            except Exception:
+                pass
+            self._fh = None
+
+    def _needs_rotation(self) -> bool:
+        if self._fh.tell() >= self.max_bytes:
+            return True
+        return self._segment_day != datetime.now().date()
+
+    def _rotate(self) -> None:
+        self._close_file()
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        rotated = self.path.with_name(f"{self.path.stem}.{stamp}{self.path.suffix}")
+        n = 1
+        while rotated.exists() or rotated.with_name(rotated.name + ".gz").exists():
+            rotated = self.path.with_name(f"{self.path.stem}.{stamp}-{n}{self.path.suffix}")
+            n += 1
+        os.replace(self.path, rotated)
+        with open(rotated, "rb") as src, gzip.open(str(rotated) + ".gz", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        rotated.unlink()
+        self._open()
+
+
+_writer: UsageLogWriter | None = None
+_writer_lock = threading.Lock()
+
+
+def get_writer() -> UsageLogWriter:
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = UsageLogWriter()
+                atexit.register(_writer.close)
+    return _writer
+
+
+def log_event(
+    event_type: str,
+    query: str = "",
+    sql: str = "",
+    layout: str = "",
+    rows: int | None = None,
+    error: str = "",
+    *,
+    request_id: str = "",
+    session_id: str = "",
+    snapshot_sha: str | None = None,
+    error_class: str = "",
+    timings_ms: dict[str, float] | None = None,
+    cache: dict[str, Any] | None = None,
+    **extra: Any,
+) -> None:
+    """Формирует запись и отдаёт её фоновому писателю (не блокирует)."""
+    try:
+        rec: dict[str, Any] = {
+            "ts": datetime.now().isoformat(timespec="milliseconds"),
+            "event": event_type,
+            "request_id": request_id,
+            "session_id": session_id,
+            "snapshot_sha": snapshot_sha,
+            "query": query,
+            "sql": (sql or "")[:SQL_MAX_CHARS],
+            "layout": layout,
+            "rows": rows,
+            "error": (error or "")[:ERROR_MAX_CHARS],
+            "error_class": error_class,
+            "timings_ms": {k: round(v, 3) for k, v in (timings_ms or {}).items()},
+            "cache": dict(cache or {}),
+        }
+        rec.update(extra)
+        get_writer().submit(rec)
+    except Exception:
+        pass
@@ -0,0 +1,132 @@
+"""
+Warm-up процесса: один раз после старта Streamlit-воркера (деплой, рестарт).
+
+Без него всё это оплачивает клик первого пользователя: импорт фильтров,
+загрузка manifest и snapshot, ingest (индексы, словари сущностей),
+компиляция matcher'ов фильтров и первые запросы DuckDB. start() запускает
+в фоновом потоке по шагам:
+
+  - snapshot — скачать (если нужно) и загрузить со всеми ingest-шагами;
+  - filters — импортировать все фильтры (регулярки модулей);
+  - presets — каждую кнопку быстрых запросов через весь конвейер: разбор
+    (заодно компилирует matcher'ы фильтров по словарям snapshot),
+    выполнение и prepare layout'а.
+
+ready() — флаг готовности для UI ("warming up"); клик во время warm-up не
+ждёт его целиком: тот же запрос склеивается с запросом warm-up через
+single-flight (core/single_flight.py). Ошибка шага не останавливает
+остальные — она в status() и в usage-логе (WARMUP_OK / WARMUP_ERROR).
+WARMUP=0 (secrets/env) — выключить.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from typing import Any, Callable, Iterable
+
+from core import metrics, usage_log
+
+
+def _get_setting(name: str, default: str) -> str:
+    try:
+        import streamlit as st
+        if name in st.secrets:
+            return str(st.secrets[name]).strip()
+    except Exception:
+        pass
+    return os.getenv(name, default).strip()
+
+
+WARMUP_ENABLED = _get_setting("WARMUP", "1") not in ("0", "false", "no")
+
+_lock = threading.Lock()
+_done = threading.Event()
+_state: dict[str, Any] = {
+    "status": "idle",  # idle / running / ready
+    "step": None,
+    "started": None,
+    "seconds": None,
+    "steps_ms": {},
+    "errors": {},
+}
+
+
+def start(queries: Iterable[str], prepare: Callable[[str, Any], Any] | None = None) -> None:
+    """Запустить warm-up, если в этом процессе он ещё не запускался."""
+    with _lock:
+        if _state["status"] != "idle":
+            return
+        if not WARMUP_ENABLED:
+            _state["status"] = "ready"
+            _done.set()
+            return
+        _state["status"] = "running"
+        _state["started"] = time.time()
+    threading.Thread(target=_run, args=(list(queries), prepare), name="warmup", daemon=True).start()
+
+
+def ready() -> bool:
+    return _done.is_set()
+
+
+def wait(timeout: float | None = None) -> bool:
+    return _done.wait(timeout)
+
+
+def status() -> dict[str, Any]:
+    with _lock:
+        return {**_state, "steps_ms": dict(_state["steps_ms"]), "errors": dict(_state["errors"])}
+
+
+def _step(name: str, fn: Callable[..., Any], *args: Any) -> Any:
+    with _lock:
+        _state["step"] = name
+    t0 = time.perf_counter()
+    try:
+        return fn(*args)
+    except Exception as e:
+        with _lock:
+            _state["errors"][name] = f"{type(e).__name__}: {e}"
+        return None
+    finally:
+        with _lock:
+            _state["steps_ms"][name] = round((time.perf_counter() - t0) * 1000, 3)
+
+
+def _preset(query: str, prepare: Callable[[str, Any], Any] | None) -> None:
+    from core.ai_filter_router import ai_parse_query
+    from core.db_utils import execute_access_query
+
+    df = execute_access_query(ai_parse_query(query))
+    if prepare is not None and df is not None and not df.empty:
+        prepare(query, df)
+
+
+def _run(queries: list[str], prepare: Callable[[str, Any], Any] | None) -> None:
+    from core import db_utils
+    from core.filter_registry import registry as flt
+
+    t0 = time.perf_counter()
+    try:
+        if os.getenv("DATA_SOURCE", "SNAPSHOT").upper() != "ACCESS":
+            _step("snapshot", db_utils.load_snapshot)
+        _step("filters", flt.load_all)
+        for query in queries:
+            _step(f"preset: {query}", _preset, query, prepare)
+    finally:
+        seconds = time.perf_counter() - t0
+        with _lock:
+            _state.update(status="ready", step=None, seconds=round(seconds, 3))
+            state = {**_state}
+        _done.set()
+        metrics.WARMUP_SECONDS.set(seconds)
+        usage_log.log_event(
+            "WARMUP_ERROR" if state["errors"] else "WARMUP_OK",
+            error="; ".join(f"{k}: {v}" for k, v in state["errors"].items()),
+            snapshot_sha=db_utils.snapshot_info()["sha"],
+            timings_ms=state["steps_ms"],
+        )
+
+
+metrics.READY.set_function(lambda: float(_done.is_set()))
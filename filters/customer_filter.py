@@ -1,5 +1,18 @@
 import re
 
+from core import entities, fuzzy
+
+
+def _resolve(token: str) -> str:
+    """
+    Опечатка в имени клиента ("sunkor") -> имя из snapshot. Токен, который
+    входит в какое-то имя (LIKE его найдёт), не трогаем.
+    """
+    upper = token.upper()
+    if any(upper in name for name in entities.values("customer")):
+        return token
+    return fuzzy.entity_resolver("customer").resolve(token) or token
+
 
 def parse_customer_filter(text: str) -> str:
     """
@@ -113,6 +126,7 @@ def parse_customer_filter(text: str) -> str:
         neg_tokens.add(wl)
 #======
 
+    neg_tokens = {_resolve(tok) for tok in neg_tokens}
     neg_conditions = []
     for tok in sorted(neg_tokens):
         neg_conditions.append(
@@ -136,13 +150,13 @@ def parse_customer_filter(text: str) -> str:
             continue
         if wl in customer_keys:
             continue
-        if wl in neg_tokens:
+        if wl in neg_tokens or _resolve(wl) in neg_tokens:
             # уже используется в NOT customer, не добавляем как положительный
             continue
         pos_tokens.append(wl)
 
     pos_conditions = []
-    for tok in sorted(set(pos_tokens)):
+    for tok in sorted({_resolve(tok) for tok in pos_tokens}):
         pos_conditions.append(
             f"(UCase(LTrim(RTrim([customer]))) LIKE '%{tok.upper()}%')"
         )
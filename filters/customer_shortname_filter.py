@@ -1,6 +1,9 @@
 import re
 
-# Короткие имена / коды, которые считаем именно customer (а не style и т.п.)
+from core import entities, fuzzy
+
+# Короткие имена / коды, которые считаем именно customer (а не style и т.п.).
+# Это seed: к нему добавляются все customer текущего snapshot (core/entities.py)
 KNOWN_CUSTOMER_TOKENS = {
     "AUSRTALIA",  # так, как в базе
     "AZURE",
@@ -19,6 +22,23 @@ KNOWN_CUSTOMER_TOKENS = {
 
 # Шаблон для отрицаний: not / no / without / does not include / not include
 NEG_PREFIX = r"(?:NOT|NO|WITHOUT|WITH\s*OUT|DOES\s+NOT\s+INCLUDE|NOT\s+INCLUDE)"
+_NEG_BEFORE_RE = re.compile(rf"\b{NEG_PREFIX}\s+$")
+
+fuzzy.register_words(KNOWN_CUSTOMER_TOKENS)
+
+
+def customer_names() -> entities.EntityDict:
+    """Имена customer: seed + snapshot (однобуквенные значения snapshot не берём — это слова запроса)."""
+    return entities.compiled(
+        "customer_shortname",
+        lambda store: entities.EntityDict(
+            KNOWN_CUSTOMER_TOKENS | {v for v in entities.values("customer", store) if len(v) >= 2}
+        ),
+    )
+
+
+def _sql(name: str) -> str:
+    return name.replace("'", "''")
 
 
 def parse_customer_shortname_filter(text: str) -> str:
@@ -45,28 +65,19 @@ def parse_customer_shortname_filter(text: str) -> str:
     if "CUSTOMER" in t:
         return ""
 
-    clean = t
-
-    # --- 1. Отрицательные конструкции: not SUNCOR / without D4D / does not include AZURE ---
+    # опечатки в именах: "sunkor" -> SUNCOR
+    t = fuzzy.entity_resolver("customer", KNOWN_CUSTOMER_TOKENS).correct(t).upper()
 
-    # Собираем группу имён через | для регекса
-    names_group = "|".join(sorted(KNOWN_CUSTOMER_TOKENS, key=len, reverse=True))
-    neg_pattern = re.compile(rf"\b{NEG_PREFIX}\s+({names_group})\b")
-
-    exclude: set[str] = set()
-
-    for m in neg_pattern.finditer(t):
-        name = m.group(1).upper()
-        exclude.add(name)
-        # вырезаем эту часть из clean, чтобы потом не считать её позитивом
-        clean = clean.replace(m.group(0), " ")
-
-    # --- 2. Позитивные упоминания имён (без not/without/does not include) ---
+    # --- Упоминания имён целыми словами (один проход trie) ---
+    #   not SUNCOR / without D4D / does not include AZURE -> exclude, остальные -> include
 
     include: set[str] = set()
+    exclude: set[str] = set()
 
-    for name in KNOWN_CUSTOMER_TOKENS:
-        if re.search(rf"\b{name}\b", clean):
+    for start, _, name in customer_names().find(t):
+        if _NEG_BEFORE_RE.search(t, 0, start):
+            exclude.add(name)
+        else:
             include.add(name)
 
     # если имя и в include, и в exclude -> отрицание важнее
@@ -82,7 +93,7 @@ def parse_customer_shortname_filter(text: str) -> str:
     # Позитивные customer:
     #   (customer LIKE '%SUNCOR%' OR customer LIKE '%AZURE%')
     if include:
-        parts = [f"{field} LIKE '%{name}%'" for name in sorted(include)]
+        parts = [f"{field} LIKE '%{_sql(name)}%'" for name in sorted(include)]
         if len(parts) == 1:
             clauses.append(parts[0])
         else:
@@ -91,7 +102,7 @@ def parse_customer_shortname_filter(text: str) -> str:
     # Отрицательные customer:
     #   NOT (customer LIKE '%SUNCOR%')
     for name in sorted(exclude):
-        clauses.append(f"NOT ({field} LIKE '%{name}%')")
+        clauses.append(f"NOT ({field} LIKE '%{_sql(name)}%')")
 
     if not clauses:
         return ""
@@ -1,7 +1,8 @@
 from __future__ import annotations
+import operator
 import re
 from datetime import datetime, timedelta, date
-from typing import Tuple, Optional
+from typing import Callable, NamedTuple, Tuple, Optional
 
 MONTHS = {
     "JAN": 1, "JANUARY": 1,
@@ -18,6 +19,8 @@ MONTHS = {
     "DEC": 12, "DECEMBER": 12,
 }
 
+QUARTER_ORDINALS = {"first": 1, "1st": 1, "second": 2, "2nd": 2, "third": 3, "3rd": 3, "fourth": 4, "4th": 4}
+
 
 def _today() -> date:
     return datetime.now().date()
@@ -39,8 +42,17 @@ def _last_week_bounds(today: date) -> Tuple[date, date]:
     return last_monday, last_sunday
 
 
+def _quarter_bounds(year: int, quarter: int) -> Tuple[date, date]:
+    start, _ = _month_bounds(year, 3 * quarter - 2)
+    _, end = _month_bounds(year, 3 * quarter)
+    return start, end
+
+
+_NUM_TOKEN_RE = re.compile(r"(\d{1,2})[\/\-\.](\d{1,2})[\/\-\.](\d{2,4})")
+
+
 def _parse_numeric_date_token(tok: str) -> Optional[date]:
-    m = re.fullmatch(r"(\d{1,2})[\/\-\.](\d{1,2})[\/\-\.](\d{2,4})", tok.strip())
+    m = _NUM_TOKEN_RE.fullmatch(tok.strip())
     if not m:
         return None
     mm, dd, yy = int(m.group(1)), int(m.group(2)), int(m.group(3))
@@ -52,169 +64,244 @@ def _parse_numeric_date_token(tok: str) -> Optional[date]:
         return None
 
 
+def _token_date(tok: str, today: date, end: bool) -> Optional[date]:
+    # месяц (граница месяца текущего года) или числовая дата
+    mm = MONTHS.get(tok.upper())
+    if mm is None:
+        return _parse_numeric_date_token(tok)
+    return _month_bounds(today.year, mm)[1 if end else 0]
+
+
+# ===== ГРАММАТИКА ДАТ =====
+# Все формы дат — альтернативы одного скомпилированного сканера. Один проход
+# по запросу даёт типизированные span'ы (kind = имя группы альтернативы),
+# дальше правила ниже выбирают диапазон и вырезают свои span'ы из текста. Порядок правил — прежний порядок проверок parse_date_range
+# (last N days -> ... -> year), порядок альтернатив в сканере — тот же: при
+# общем начале выигрывает более длинная/ранняя форма ("from october up to
+# date" — не месяц, "sep and oct" — не sep).
+_NUM = r"\d{1,2}[\/\.\-]\d{1,2}[\/\.\-]\d{2,4}"
+_TO = r"(?:up\s+to|to|until)"
+_MONTH = "|".join(sorted((m.lower() for m in MONTHS), key=len, reverse=True))
+_YEAR = r"(?:\s+(?:of\s+)?(?P<{}>20\d{{2}}))?"
+
+# позиции, с которых может начаться форма: её первое слово или цифры перед "/".
+# Полную грамматику (_FORMS) пробуем только с них — в разы дешевле, чем
+# finditer всей грамматики по каждой позиции запроса.
+_ANCHOR = re.compile(
+    r"\b(?:last|past|from|up|until|till|q[1-4]|quarter|first|second|third|fourth|1st|2nd|3rd|4th|week|wk"
+    r"|jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec|20\d\d)|\d{1,2}/"
+)
+
+_FORMS = re.compile(
+    rf"""
+      (?P<last_days>\b(?:last|past)\s+(?P<days>\d+)\s+days\b)
+    | (?P<last_months>\b(?:last|past)\s+(?P<months>\d+)\s+months?\b)
+    | (?P<from_num_to_date>\bfrom\s+(?P<fnd>{_NUM})\s+{_TO}\s+(?:date|today)\b)
+    | (?P<from_month_to_date>\bfrom\s+(?P<fmd>{_MONTH})\s+{_TO}\s+date\b)
+    | (?P<from_to>\bfrom\s+(?P<ft1>[a-z0-9\/\.\-]+)\s+{_TO}\s+(?P<ft2>[a-z0-9\/\.\-]+))
+    | (?P<month_pair>\b(?P<m1>{_MONTH})\s+and\s+(?P<m2>{_MONTH})\b)
+    | (?P<up_to_num>\b(?:up\s+to|until|till)\s+(?P<upto>{_NUM})\b)
+    | (?P<quarter>\b(?:q(?P<q>[1-4])|quarter\s+(?P<qn>[1-4])|(?P<qo>{"|".join(QUARTER_ORDINALS)})\s+quarter)
+        {_YEAR.format("qy")}\b)
+    | (?P<week_no>(?<!last\s)(?<!this\s)\b(?:week|wk)\s*(?:no\.?\s*|\#\s*)?(?P<wk>\d{{1,2}}){_YEAR.format("wy")}\b
+        (?![\/\.\-]\d|\s*(?:k|kt|karats?|carats?|ct|[ywrp]g?)\b))
+    | (?P<month>\b(?P<mon>{_MONTH}){_YEAR.format("my")}\b)
+    | (?P<num_date>\d{{1,2}}/\d{{1,2}}/\d{{2,4}})
+    | (?P<year>\b(?P<yy>20\d{{2}})\b)
+    """,
+    re.X,
+)
+
+_NUM_DATE_RE = re.compile(r"(?P<num_date>\d{1,2}/\d{1,2}/\d{2,4})")
+
+Range = Tuple[Optional[date], Optional[date]]
+
+
+def _last_days(m: re.Match, today: date) -> Optional[Range]:
+    n = int(m["days"])
+    return (today - timedelta(days=n - 1), today) if n > 0 else None
+
+
+def _last_months(m: re.Match, today: date) -> Optional[Range]:
+    # N полных календарных месяцев до текущего
+    n = int(m["months"])
+    if n <= 0:
+        return None
+    end_year, end_month = (today.year, today.month - 1) if today.month > 1 else (today.year - 1, 12)
+    start_year, start_month = divmod(end_year * 12 + end_month - 1 - (n - 1), 12)
+    return _month_bounds(start_year, start_month + 1)[0], _month_bounds(end_year, end_month)[1]
+
+
+def _from_num_to_date(m: re.Match, today: date) -> Range:
+    return _parse_numeric_date_token(m["fnd"]), today
+
+
+def _from_month_to_date(m: re.Match, today: date) -> Range:
+    return date(today.year, MONTHS[m["fmd"].upper()], 1), today
+
+
+def _from_to(m: re.Match, today: date) -> Range:
+    return _token_date(m["ft1"], today, end=False), _token_date(m["ft2"], today, end=True)
+
+
+def _month_pair(m: re.Match, today: date) -> Range:
+    return _month_bounds(today.year, MONTHS[m["m1"].upper()])[0], _month_bounds(today.year, MONTHS[m["m2"].upper()])[1]
+
+
+def _up_to_num(m: re.Match, today: date) -> Optional[Range]:
+    d = _parse_numeric_date_token(m["upto"])
+    return (None, d) if d else None
+
+
+def _quarter(m: re.Match, today: date) -> Range:
+    quarter = int(m["q"] or m["qn"] or QUARTER_ORDINALS[m["qo"]])
+    return _quarter_bounds(int(m["qy"] or today.year), quarter)
+
+
+def _week_no(m: re.Match, today: date) -> Optional[Range]:
+    # ISO-неделя: week 1 — неделя с первым четвергом года, понедельник..воскресенье
+    try:
+        start = date.fromisocalendar(int(m["wy"] or today.year), int(m["wk"]), 1)
+    except ValueError:
+        return None
+    return start, start + timedelta(days=6)
+
+
+# несколько месяцев в запросе: берётся первый по календарю (как раньше — по порядку MONTHS)
+_MONTH_ORDER = {name.lower(): i for i, name in enumerate(MONTHS)}
+
+
+def _first_month(found: list[re.Match]) -> re.Match:
+    return min(found, key=lambda m: _MONTH_ORDER[m["mon"]])
+
+
+def _month(m: re.Match, today: date) -> Range:
+    # "may 2024" / "may of 2024" — месяц этого года, без года — текущего
+    return _month_bounds(int(m["my"] or today.year), MONTHS[m["mon"].upper()])
+
+
+def _num_date(m: re.Match, today: date) -> Range:
+    d = _parse_numeric_date_token(m["num_date"])
+    return d, d
+
+
+def _year(m: re.Match, today: date) -> Range:
+    yy = int(m["yy"])
+    return date(yy, 1, 1), date(yy, 12, 31)
+
+
+class _Rule(NamedTuple):
+    """
+    Правило срабатывает, пока не найден start (needs_no_end — пока нет ни
+    start, ни end). resolve -> None: форма не подошла, текст не трогаем; иначе
+    span'ы правила вырезаются, даже если дата не разобралась (как раньше re.sub).
+    """
+    kind: str
+    needs_no_end: bool
+    resolve: Callable[[re.Match, date], Optional[Range]]
+    same_text: bool = False  # вырезать только span'ы с тем же текстом, что у выбранного
+    pick: Callable[[list], re.Match] = operator.itemgetter(0)
+
+
+_RULES: Tuple[_Rule, ...] = (
+    _Rule("last_days", False, _last_days, same_text=True),
+    _Rule("last_months", False, _last_months, same_text=True),
+    _Rule("from_num_to_date", False, _from_num_to_date),
+    _Rule("month_pair", False, _month_pair),
+    _Rule("from_month_to_date", False, _from_month_to_date),
+    _Rule("from_to", False, _from_to),
+    _Rule("up_to_num", True, _up_to_num),
+    _Rule("quarter", True, _quarter),
+    _Rule("week_no", True, _week_no),
+    _Rule("month", True, _month, same_text=True, pick=_first_month),
+    _Rule("num_date", True, _num_date),
+    _Rule("year", True, _year),
+)
+
+
+def _this_week(today: date) -> Range:
+    start = today - timedelta(days=today.weekday())
+    return start, start + timedelta(days=6)
+
+
+def _last_month(today: date) -> Range:
+    m = today.month - 1 or 12
+    y = today.year - (1 if today.month == 1 else 0)
+    return _month_bounds(y, m)
+
+
+def _last_quarter(today: date) -> Range:
+    q = (today.month - 1) // 3
+    return _quarter_bounds(today.year, q) if q else _quarter_bounds(today.year - 1, 4)
+
+
+# Ключевые слова ищутся подстрокой в тексте без дат ("orderslast week" тоже) и
+# перекрывают найденный выше диапазон; срабатывает первое по порядку.
+_KEYWORDS: Tuple[Tuple[str, Callable[[date], Range]], ...] = (
+    ("last week", _last_week_bounds),
+    ("this week", _this_week),
+    ("yesterday", lambda today: (today - timedelta(days=1), today - timedelta(days=1))),
+    ("today", lambda today: (today, today)),
+    ("this month", lambda today: _month_bounds(today.year, today.month)),
+    ("last month", _last_month),
+    ("this quarter", lambda today: _quarter_bounds(today.year, (today.month - 1) // 3 + 1)),
+    ("last quarter", _last_quarter),
+)
+
+
+def _scan(q: str) -> dict[str, list[re.Match]]:
+    """kind -> span'ы форм этого вида по порядку; span'ы не пересекаются (как finditer)."""
+    spans: dict[str, list[re.Match]] = {}
+    pos = 0
+    for a in _ANCHOR.finditer(q):
+        if a.start() < pos:
+            continue
+        m = _FORMS.match(q, a.start())
+        if m is None:
+            continue
+        pos = m.end()
+        spans.setdefault(m.lastgroup, []).append(m)
+        if m.lastgroup == "up_to_num":
+            # неразобранная дата после until/till остаётся правилу num_date
+            inner = _NUM_DATE_RE.fullmatch(q, *m.span("upto"))
+            if inner:
+                spans.setdefault("num_date", []).append(inner)
+    return spans
+
+
 def parse_date_range(user_query: str) -> Tuple[Optional[date], Optional[date], str]:
     q = user_query.strip().lower()
     today = _today()
     start_date = None
     end_date = None
 
-    # --- NEW: last N days / past N days ---
-    match_last_days = re.search(r"\b(last|past)\s+(\d+)\s+days\b", q)
-    if match_last_days:
-        n = int(match_last_days.group(2))
-        if n > 0:
-            start_date = today - timedelta(days=n - 1)
-            end_date = today
-            q = q.replace(match_last_days.group(0), "")
-
-    # --- NEW: last N months (calendar months) ---
-    match_last_months = re.search(r"\b(last|past)\s+(\d+)\s+months?\b", q)
-    if match_last_months and not start_date:
-        n = int(match_last_months.group(2))
-        if n > 0:
-            year = today.year
-            month = today.month
-
-            # determine end month (previous full month)
-            end_year = year
-            end_month = month - 1
-            if end_month == 0:
-                end_month = 12
-                end_year -= 1
-            _, end_date = _month_bounds(end_year, end_month)
-
-            # start month
-            start_month = end_month - (n - 1)
-            start_year = end_year
-            while start_month <= 0:
-                start_month += 12
-                start_year -= 1
-
-            start_date, _ = _month_bounds(start_year, start_month)
-
-            q = q.replace(match_last_months.group(0), "")
-
-    # --- NEW: from <numeric date> up to date/today ---
-    match_num_to_date = re.search(
-        r"\bfrom\s+(\d{1,2}[\/\.\-]\d{1,2}[\/\.\-]\d{2,4})\s+(?:up\s+to|to|until)\s+(?:date|today)\b",
-        q
-    )
-    if match_num_to_date and not start_date:
-        start_token = match_num_to_date.group(1)
-        start_date = _parse_numeric_date_token(start_token)
-        end_date = today
-        q = re.sub(
-            r"\bfrom\s+\d{1,2}[\/\.\-]\d{1,2}[\/\.\-]\d{2,4}\s+(?:up\s+to|to|until)\s+(?:date|today)\b",
-            "",
-            q
-        )
-
-    # --- NEW: month and month (e.g., "september and october") ---
-    match_two_months = re.search(
-        r"\b([a-z]+)\s+and\s+([a-z]+)\b", q
-    )
-    if match_two_months and not start_date:
-        m1, m2 = match_two_months.group(1).upper(), match_two_months.group(2).upper()
-        if m1 in MONTHS and m2 in MONTHS:
-            y = today.year
-            start_date, _ = _month_bounds(y, MONTHS[m1])
-            _, end_date = _month_bounds(y, MONTHS[m2])
-            q = re.sub(r"\b[a-z]+\s+and\s+[a-z]+\b", "", q)
-
-    # --- from <month> up to date ---
-    match_to_date = re.search(r"\bfrom\s+([a-z]+)\s+(?:up\s+to|to|until)\s+date\b", q)
-    if match_to_date and not start_date:
-        month_word = match_to_date.group(1).upper()
-        if month_word in MONTHS:
-            y = today.year
-            m = MONTHS[month_word]
-            start_date = date(y, m, 1)
-            end_date = today
-            q = re.sub(r"\bfrom\s+[a-z]+\s+(?:up\s+to|to|until)\s+date\b", "", q)
-
-    # --- from <month/numeric> to <month/numeric> ---
-    if not start_date:
-        match = re.search(r"\bfrom\s+([a-z0-9\/\.\-]+)\s+(?:up\s+to|to|until)\s+([a-z0-9\/\.\-]+)", q)
-        if match:
-            start_token, end_token = match.group(1), match.group(2)
-            if start_token.upper() in MONTHS:
-                sm = MONTHS[start_token.upper()]
-                start_date, _ = _month_bounds(today.year, sm)
-            else:
-                start_date = _parse_numeric_date_token(start_token)
-
-            if end_token.upper() in MONTHS:
-                em = MONTHS[end_token.upper()]
-                _, end_date = _month_bounds(today.year, em)
-            else:
-                end_date = _parse_numeric_date_token(end_token)
-
-            q = re.sub(r"\bfrom\s+[a-z0-9\/\.\-]+\s+(?:up\s+to|to|until)\s+[a-z0-9\/\.\-]+", "", q)
-
-    # --- NEW: "up to / until / till <numeric date>" (без "from") ---
-    if not start_date and not end_date:
-        m = re.search(
-            r"\b(?:up\s+to|until|till)\s+(\d{1,2}[\/\.\-]\d{1,2}[\/\.\-]\d{2,4})\b",
-            q
-        )
-        if m:
-            d = _parse_numeric_date_token(m.group(1))
-            if d:
-                end_date = d
-                q = re.sub(
-                    r"\b(?:up\s+to|until|till)\s+\d{1,2}[\/\.\-]\d{1,2}[\/\.\-]\d{2,4}\b",
-                    "",
-                    q
-                )
-
-    # --- single month ---
-    if not start_date and not end_date:
-        for name, mm in MONTHS.items():
-            if re.search(rf"\b{name.lower()}\b", q):
-                start_date, end_date = _month_bounds(today.year, mm)
-                q = re.sub(rf"\b{name.lower()}\b", "", q)
-                break
-
-    # --- explicit numeric date ---
-    if not start_date and not end_date:
-        m = re.search(r"(\d{1,2}/\d{1,2}/\d{2,4})", q)
-        if m:
-            d = _parse_numeric_date_token(m.group(1))
-            start_date = d
-            end_date = d
-            q = re.sub(r"\d{1,2}/\d{1,2}/\d{2,4}", "", q)
-
-    # --- year only ---
-    if not start_date and not end_date:
-        m = re.search(r"\b(20\d{2})\b", q)
-        if m:
-            yy = int(m.group(1))
-            start_date = date(yy, 1, 1)
-            end_date = date(yy, 12, 31)
-            q = re.sub(r"\b20\d{2}\b", "", q)
-
-    # --- keywords ---
-    if "last week" in q:
-        start_date, end_date = _last_week_bounds(today)
-        q = q.replace("last week", "")
-    elif "this week" in q:
-        start_date = today - timedelta(days=today.weekday())
-        end_date = start_date + timedelta(days=6)
-        q = q.replace("this week", "")
-    elif "yesterday" in q:
-        start_date = today - timedelta(days=1)
-        end_date = start_date
-        q = q.replace("yesterday", "")
-    elif "today" in q:
-        start_date = end_date = today
-        q = q.replace("today", "")
-    elif "this month" in q:
-        start_date, end_date = _month_bounds(today.year, today.month)
-        q = q.replace("this month", "")
-    elif "last month" in q:
-        m = today.month - 1 or 12
-        y = today.year - (1 if today.month == 1 else 0)
-        start_date, end_date = _month_bounds(y, m)
-        q = q.replace("last month", "")
+    spans = _scan(q)
+
+    cut = []
+    for rule in _RULES:
+        found = spans.get(rule.kind)
+        if not found or start_date or (rule.needs_no_end and end_date):
+            continue
+        chosen = rule.pick(found)
+        got = rule.resolve(chosen, today)
+        if got is None:
+            continue
+        start_date, end_date = got
+        text = chosen.group(0)
+        cut.extend(m.span() for m in found if not rule.same_text or m.group(0) == text)
+
+    if cut:
+        pieces, pos = [], 0
+        for a, b in sorted(cut):
+            pieces.append(q[pos:a])
+            pos = b
+        pieces.append(q[pos:])
+        q = "".join(pieces)
+
+    for keyword, bounds in _KEYWORDS:
+        if keyword in q:
+            start_date, end_date = bounds(today)
+            q = q.replace(keyword, "")
+            break
 
     return start_date, end_date, q.strip()
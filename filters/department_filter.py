@@ -2,7 +2,10 @@
 import re
 from typing import Tuple, Set
 
+from core import entities, fuzzy
+
 # Маппинг "ключевые слова в запросе" → реальное DepartmentName
+# (seed: DepartmentName текущего snapshot добавляются в _keywords())
 DEPARTMENT_KEYWORDS = {
     "gold control": "Gold Control",
     "jeweller": "Jewellers",
@@ -37,14 +40,31 @@ DEPARTMENT_KEYWORDS = {
 
 NEGATION_WORDS = ("not", "no", "without", "except")
 
+fuzzy.register_words(DEPARTMENT_KEYWORDS)
+
+
+def _keywords():
+    """DEPARTMENT_KEYWORDS + DepartmentName snapshot (в upper) и trie по ключам; один раз на snapshot."""
+    def build(store):
+        keywords = {kw: dept.upper() for kw, dept in DEPARTMENT_KEYWORDS.items()}
+        for dept in entities.values("DepartmentName", store):
+            keywords.setdefault(dept.lower(), dept)
+        return keywords, entities.Trie(keywords)
+
+    return entities.compiled("department", build)
+
 
 def _extract_dept_sets(query: str) -> Tuple[Set[str], Set[str]]:
     """
     Возвращает два множества:
     include_depts, exclude_depts (реальные имена DepartmentName).
     """
-    q = query.lower()
+    keywords, trie = _keywords()
+    # опечатки в словах департаментов: "polishig" -> "polishing"
+    q = fuzzy.resolver("department", lambda store: _keywords()[0]).correct(query.lower())
     include, exclude = set(), set()
+    # ключи, которых нет в тексте, не могут дать ни include, ни exclude
+    found = trie.occurring(q)
 
     # для этих ключей "not X out/in..." считаем, что X относится к операции, а не к департаменту
     special_for_ops = {
@@ -55,7 +75,9 @@ def _extract_dept_sets(query: str) -> Tuple[Set[str], Set[str]]:
     # слова, которые идут после ключа, если это именно операция, а не департамент
     op_suffix_pattern = r"(?:out\b|in\b|on hold\b|center\b|centre\b|out sub\b)"
 
-    for kw, dept in DEPARTMENT_KEYWORDS.items():
+    for kw, dept in keywords.items():
+        if kw not in found:
+            continue
         kw_lower = kw.lower()
 
         if kw_lower in special_for_ops:
@@ -115,13 +137,13 @@ def parse_department_filter(query: str) -> str:
     clauses = []
 
     if include_depts:
-        in_list = ", ".join(f"'{d.upper()}'" for d in sorted(include_depts))
+        in_list = ", ".join("'" + d.upper().replace("'", "''") + "'" for d in sorted(include_depts))
         clauses.append(
             f"UCase(LTrim(RTrim([DepartmentName]))) IN ({in_list})"
         )
 
     if exclude_depts:
-        not_in_list = ", ".join(f"'{d.upper()}'" for d in sorted(exclude_depts))
+        not_in_list = ", ".join("'" + d.upper().replace("'", "''") + "'" for d in sorted(exclude_depts))
         clauses.append(
             f"UCase(LTrim(RTrim([DepartmentName]))) NOT IN ({not_in_list})"
         )
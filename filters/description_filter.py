@@ -0,0 +1,195 @@
+from __future__ import annotations
+import re
+
+
+FIELD = "UCase(LTrim(RTrim([description])))"
+
+# "description contains ...", "desc has ...", "description includes ..."
+KEYWORD_RE = re.compile(
+    r"\b(?:description|descr|desc)\s+(?:contains?|has|includes?|matches|like)\s+",
+    re.IGNORECASE,
+)
+
+# Конец выражения: запятая/точка с запятой или начало другого условия
+# запроса — дата ("today", "last week", "from ... to"), поле даты/операция
+# ("casting", "shipped", "due"), статус, поля других фильтров ("customer",
+# "size", "style", ...). Такие слова в описании пишутся в кавычках:
+#   description contains "casting grain"
+STOP_RE = re.compile(
+    r"[,;]|\b(?:"
+    r"today|yesterday|tomorrow|this\s+(?:week|month|quarter|year)"
+    r"|(?:last|past|next)\s+(?:week|month|quarter|year|\d+\s+(?:days?|weeks?|months?))"
+    r"|from\s+\S+\s+(?:to|until)|until|till|up\s+to|since"
+    r"|cast(?:ing)?|ship(?:ped|ping)?|due|request(?:ed)?|ready\s+(?:items?\s+)?(?:to|for)"
+    r"|open|closed?|cancel(?:l?ed)?|released?|on\s+hold"
+    r"|customer|size|style|job|bag|sales\s*order|so|po|department|dept|lot|order\s+type"
+    r")\b",
+    re.IGNORECASE,
+)
+_QUOTED_RE = re.compile(r"\"[^\"]*\"?|(?<!\S)'[^']*'(?!\S)")
+
+# фраза в кавычках | скобка | слово
+_TOKEN_RE = re.compile(r"\"([^\"]*)\"?|(?<!\S)'([^']*)'(?!\S)|([()])|([^\s()\"]+)")
+
+OPERATORS = {"AND", "OR", "NOT"}
+
+
+def _tokenize(expr: str) -> list[tuple[str, str]]:
+    """[(kind, value)]: kind = 'phrase' | 'paren' | 'op' | 'word'."""
+    out: list[tuple[str, str]] = []
+    for m in _TOKEN_RE.finditer(expr):
+        phrase = m.group(1) if m.group(1) is not None else m.group(2)
+        if phrase is not None:
+            words = phrase.split()
+            if words:
+                out.append(("phrase", " ".join(words).upper()))
+        elif m.group(3):
+            out.append(("paren", m.group(3)))
+        else:
+            word = m.group(4).upper()
+            out.append(("op" if word in OPERATORS else "word", word))
+    return out
+
+
+class _Parser:
+    """
+    Рекурсивный спуск:
+        or   := and ('OR' and)*
+        and  := unary (['AND'] unary)*      -- соседние термы = AND
+        unary:= 'NOT' unary | '(' or ')' | слово | "фраза"
+    Узлы: ('term', text) | ('not', node) | ('and', [..]) | ('or', [..]).
+    Висячие операторы и лишние скобки пропускаются.
+    """
+
+    def __init__(self, tokens: list[tuple[str, str]]):
+        self.tokens = tokens
+        self.pos = 0
+
+    def _peek(self) -> tuple[str, str] | None:
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def parse(self):
+        node = self._or()
+        while self._peek() is not None:  # лишняя ")" и т.п.
+            self.pos += 1
+            more = self._or()
+            if more is not None:
+                node = more if node is None else ("and", [node, more])
+        return node
+
+    def _or(self):
+        parts = []
+        node = self._and()
+        if node is not None:
+            parts.append(node)
+        while self._peek() == ("op", "OR"):
+            self.pos += 1
+            node = self._and()
+            if node is not None:
+                parts.append(node)
+        if not parts:
+            return None
+        return parts[0] if len(parts) == 1 else ("or", parts)
+
+    def _and(self):
+        parts = []
+        while True:
+            tok = self._peek()
+            if tok is None or tok == ("op", "OR") or tok == ("paren", ")"):
+                break
+            if tok == ("op", "AND"):
+                self.pos += 1
+                continue
+            node = self._unary()
+            if node is not None:
+                parts.append(node)
+        if not parts:
+            return None
+        return parts[0] if len(parts) == 1 else ("and", parts)
+
+    def _unary(self):
+        kind, value = self.tokens[self.pos]
+        self.pos += 1
+        if (kind, value) == ("op", "NOT"):
+            if self._peek() is None or self._peek() in (("op", "OR"), ("paren", ")")):
+                return None
+            node = self._unary()
+            return None if node is None else ("not", node)
+        if (kind, value) == ("paren", "("):
+            node = self._or()
+            if self._peek() == ("paren", ")"):
+                self.pos += 1
+            return node
+        if kind in ("word", "phrase"):
+            return ("term", value)
+        return None
+
+
+def _stop(tail: str) -> re.Match | None:
+    """Первое совпадение STOP_RE вне кавычек."""
+    quoted = [m.span() for m in _QUOTED_RE.finditer(tail)]
+    for m in STOP_RE.finditer(tail):
+        if not any(a <= m.start() < b for a, b in quoted):
+            return m
+    return None
+
+
+def _like_literal(text: str) -> str:
+    """Терм как литерал LIKE: % и _ в тексте — символы, а не подстановки (Access: [%], [_], [[])."""
+    text = text.replace("[", "[[]").replace("%", "[%]").replace("_", "[_]")
+    return text.replace("'", "''")
+
+
+def _render(node) -> str:
+    kind = node[0]
+    if kind == "term":
+        return f"({FIELD} LIKE '%{_like_literal(node[1])}%')"
+    if kind == "not":
+        return f"NOT {_render(node[1])}"
+    joiner = " AND " if kind == "and" else " OR "
+    return "(" + joiner.join(_render(n) for n in node[1]) + ")"
+
+
+def parse_description_filter(text: str) -> tuple[str, str]:
+    """
+    Поиск по тексту [description]: "description contains <выражение>".
+
+    Выражение:
+      - слова: "description contains rbc ring"      -> RBC AND RING
+      - фразы в кавычках: description contains "lab grown"
+      - AND / OR / NOT и скобки:
+          "description contains (stud or hoop) and not lab"
+    Каждый терм — подстрока description без учёта регистра, как и в других
+    фильтрах:  UCase(LTrim(RTrim([description]))) LIKE '%LAB GROWN%'.
+    % и _ в терме ищутся как символы: "description contains 10%" -> LIKE '%10[%]%'.
+    На snapshot такие условия отвечает инвертированный индекс
+    (core/fulltext_index.py), без скана таблицы.
+
+    Выражение идёт до конца запроса, запятой/точки с запятой или первого
+    слова другого условия (STOP_RE, вне кавычек) — оно остаётся в запросе:
+        "closed this month description contains stud earrings"
+        "description contains heart, shipped last week"
+        "description contains rbc casting today"  -> RBC; "casting today"
+
+    Возвращает (sql, text без описания) — остаток идёт в остальные фильтры,
+    чтобы слова из описания ("ring", "gold") не превращались в их условия.
+    """
+    m = KEYWORD_RE.search(text or "")
+    if not m:
+        return "", text
+
+    tail = text[m.end():]
+    stop = _stop(tail)
+    expr = tail[: stop.start()] if stop else tail
+    after = ""
+    if stop:
+        after = tail[stop.end():] if stop.group(0) in ",;" else tail[stop.start():]
+    rest = (text[: m.start()] + " " + after).strip()
+
+    node = _Parser(_tokenize(expr)).parse()
+    if node is None:
+        return "", rest
+
+    if node[0] == "and":
+        return "".join(f" AND {_render(n)}" for n in node[1]), rest
+    return f" AND {_render(node)}", rest
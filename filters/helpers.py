@@ -1,5 +1,4 @@
 import re
-import pyodbc
 import pandas as pd
 
 # --- Общие шаблоны и утилиты ---
@@ -20,6 +19,9 @@ def execute_access_query(sql: str) -> pd.DataFrame:
     Требуется установленный ODBC-драйвер для Access.
     """
     try:
+        # pyodbc есть только на машине с Access: импортируем здесь, а не при загрузке модуля
+        import pyodbc
+
         conn_str = (
             r"Driver={Microsoft Access Driver (*.mdb, *.accdb)};"
             r"DBQ=J:\02.Productions\GG\Ai\MainBaseAi.accdb;"
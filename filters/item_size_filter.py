@@ -1,6 +1,8 @@
 from __future__ import annotations
 import re
 
+from core.ring_sizes import SIZE_COLUMN, us_size
+
 
 def _uc(s: str) -> str:
     return s.strip().upper()
@@ -10,6 +12,81 @@ def _field_norm(field: str) -> str:
     return "UCase(LTrim(RTrim(" + field + ")))"
 
 
+# граница диапазона: US-число или UK-буква (M, Q.5)
+_B = r"(\d+(?:\.\d+)?|\b[A-Z](?:\.5)?)\b"
+_ABOVE = r"ABOVE|OVER|GREATER THAN|BIGGER THAN|LARGER THAN|MORE THAN|>"
+_BELOW = r"BELOW|UNDER|LESS THAN|SMALLER THAN|<"
+_AT_LEAST = r"AT LEAST|MIN(?:IMUM)?|>="
+_AT_MOST = r"AT MOST|UP TO|MAX(?:IMUM)?|<="
+_COMPARATOR = rf"{_AT_LEAST}|{_AT_MOST}|{_ABOVE}|{_BELOW}"
+
+# (регулярка, какие границы задаёт): lo/hi — включительно, gt/lt — строго
+_RANGES = (
+    (re.compile(rf"\bBETWEEN\s+{_B}\s+AND\s+{_B}"), "lo hi"),
+    (re.compile(rf"{_B}\s*(TO|THROUGH|THRU|-)\s*{_B}"), "lo hi"),
+    (re.compile(rf"(?<![A-Z])(?:{_AT_LEAST})\s*{_B}"), "lo"),
+    (re.compile(rf"(?<![A-Z])(?:{_AT_MOST})\s*{_B}"), "hi"),
+    (re.compile(rf"(?<![A-Z])(?:{_ABOVE})\s*{_B}"), "gt"),
+    (re.compile(rf"(?<![A-Z])(?:{_BELOW})\s*{_B}"), "lt"),
+    # "7 and up", "5 or less" — после сравнений: "above 6 and below 9" — это не "6 and below"
+    (re.compile(rf"{_B}\s*(?:\+|AND (?:UP|ABOVE|OVER|BIGGER|LARGER)|OR (?:MORE|BIGGER|LARGER))"), "lo"),
+    (re.compile(rf"{_B}\s*(?:AND (?:UNDER|BELOW|SMALLER)|OR (?:LESS|SMALLER))"), "hi"),
+)
+# "over size 9" -> "size over 9"
+_COMPARATOR_BEFORE_SIZE = re.compile(rf"(?<![A-Z])({_COMPARATOR})\s+(SIZES?)\b")
+
+
+def _size_ranges(size_part: str) -> tuple[list[tuple], str]:
+    """
+    Диапазоны US-размера в size_part и size_part без них.
+
+    Диапазон — (нижняя, включительно, верхняя, включительно); None — без
+    границы. "6 to 8", "between M and P" — отдельные диапазоны (UK-буквы —
+    по таблице в US); "above 6", "at most 9" и т.п. сводятся в один.
+    """
+    ranges = []
+    lower = upper = None
+    for rx, kind in _RANGES:
+        for m in rx.finditer(size_part):
+            if kind == "lo hi":
+                a, b = m.group(1), m.group(m.lastindex)
+                # 'M-6.5' — это UK-US пара, а не диапазон
+                if m.re.groups == 3 and m.group(2) == "-" and not (a[0].isdigit() and b[0].isdigit()):
+                    continue
+                lo, hi = us_size(a), us_size(b)
+                if lo is None or hi is None:
+                    continue
+                lo, hi = min(lo, hi), max(lo, hi)
+                ranges.append((lo, True, hi, True))
+            else:
+                v = us_size(m.group(1))
+                if v is None:
+                    continue
+                if kind in ("lo", "gt"):
+                    cand = (v, kind == "lo")
+                    if lower is None or cand[0] > lower[0] or (cand[0] == lower[0] and not cand[1]):
+                        lower = cand
+                else:
+                    cand = (v, kind == "hi")
+                    if upper is None or cand[0] < upper[0] or (cand[0] == upper[0] and not cand[1]):
+                        upper = cand
+            size_part = size_part[:m.start()] + " " * (m.end() - m.start()) + size_part[m.end():]
+    if lower is not None or upper is not None:
+        ranges.append((*(lower or (None, False)), *(upper or (None, False))))
+    return ranges, size_part
+
+
+def _range_sql(rng: tuple) -> str:
+    lo, lo_incl, hi, hi_incl = rng
+    # [size_us] — US-размер item_size (ring_sizes): колонка snapshot, в Access — выражение
+    parts = []
+    if lo is not None:
+        parts.append(f"{SIZE_COLUMN} {'>=' if lo_incl else '>'} {lo:g}")
+    if hi is not None:
+        parts.append(f"{SIZE_COLUMN} {'<=' if hi_incl else '<'} {hi:g}")
+    return " AND ".join(parts)
+
+
 def parse_item_size_filter(user_query: str, field: str = "[item_size]") -> str:
     """
     Фильтр по размеру кольца.
@@ -29,9 +106,14 @@ def parse_item_size_filter(user_query: str, field: str = "[item_size]") -> str:
             что это карат, и НЕ используем его как размер.
       - БУКВЫ:
           * начало строки ('L%', 'M%', 'N.5%' и т.п.)
+      - ДИАПАЗОНЫ ("size 6 to 8", "size between M and P", "size above 10",
+        "over size 9", "size 7 and up"):
+          * сравнение US-размера [size_us] (ring_sizes): на snapshot —
+            числовая колонка, в Access — то же правило выражением
     """
 
     U = _uc(user_query)
+    U = _COMPARATOR_BEFORE_SIZE.sub(r"\2 \1", U)
 
     # Если в запросе вообще нет слова SIZE — размер не фильтруем
     if "SIZE" not in U and "SIZES" not in U:
@@ -46,6 +128,9 @@ def parse_item_size_filter(user_query: str, field: str = "[item_size]") -> str:
         # fallback, если вдруг regex не сработал
         size_part = U
 
+    # диапазоны вырезаем до разбора токенов: их числа — не точные размеры
+    ranges, size_part = _size_ranges(size_part)
+
     # Ищем токены только в size_part
     tokens = re.findall(r"[A-Z0-9\.]+", size_part)
 
@@ -73,7 +158,7 @@ def parse_item_size_filter(user_query: str, field: str = "[item_size]") -> str:
             size_letters.append(t)
             continue
 
-    if not size_nums and not size_letters:
+    if not size_nums and not size_letters and not ranges:
         return ""
 
     f = _field_norm(field)
@@ -93,6 +178,10 @@ def parse_item_size_filter(user_query: str, field: str = "[item_size]") -> str:
         conds.append(f"{f} LIKE '{l}%'")
 
     conds = sorted(set(conds))
+    range_conds = [_range_sql(r) for r in ranges]
+    if not conds and len(range_conds) == 1:
+        return " AND (" + range_conds[0] + ")"
+    conds += ["(" + c + ")" for c in range_conds]
     if not conds:
         return ""
 
@@ -1,9 +1,10 @@
 from __future__ import annotations
-import re
 from typing import List
 
+from core import entities, fuzzy
 
-# Все допустимые типы изделий из базы
+
+# Все допустимые типы изделий из базы (seed: + item_type текущего snapshot)
 ITEM_TYPES = [
     "RING", "EARRING", "PENDANT", "NECKLACE", "BRACELET",
     "BANGLE", "CHAINS", "COLOR STONE", "DIAMONDS",
@@ -12,10 +13,17 @@ ITEM_TYPES = [
 ]
 
 
+fuzzy.register_words(ITEM_TYPES)
+
+
 def _uc(s: str) -> str:
     return s.strip().upper()
 
 
+def _sql(s: str) -> str:
+    return s.replace("'", "''")
+
+
 def parse_item_type_filter(user_query: str, field: str = "[item_type]") -> str:
     """
     Создаёт SQL-фильтр item_type:
@@ -25,25 +33,28 @@ def parse_item_type_filter(user_query: str, field: str = "[item_type]") -> str:
     """
 
     q = _uc(user_query)
+    types = entities.entity("item_type", ITEM_TYPES)
+    # типы, которые есть в тексте хотя бы подстрокой, — один проход trie
+    found = types.trie.occurring(q)
+    # порядок — как в ITEM_TYPES, новые типы snapshot — после них
+    ordered = ITEM_TYPES + [t for t in types.values if t not in ITEM_TYPES]
 
     # -------------------------------------------------------------
     # 1) Выявляем отрицания (NOT RING, NOT PENDANT, ...)
     # -------------------------------------------------------------
     negations = []
-    for itype in ITEM_TYPES:
-        if f"NOT {itype}" in q:
+    for itype in ordered:
+        if itype in found and f"NOT {itype}" in q:
             negations.append(itype)
 
     # -------------------------------------------------------------
-    # 2) Выявляем позитивные item_type, исключая NOT
+    # 2) Выявляем позитивные item_type (целым словом), исключая NOT
     # -------------------------------------------------------------
+    words = {itype for _, _, itype in types.find(q)}
     matches: List[str] = []
 
-    for itype in ITEM_TYPES:
-        # точное нахождение слова
-        pattern = r"\b" + re.escape(itype) + r"\b"
-
-        if re.search(pattern, q):
+    for itype in ordered:
+        if itype in words:
             # если есть НАЙДЕННЫЙ тип, но также есть "NOT TYPE", не добавляем
             if f"NOT {itype}" not in q:
                 matches.append(itype)
@@ -56,12 +67,12 @@ def parse_item_type_filter(user_query: str, field: str = "[item_type]") -> str:
 
     # Позитивные типы (например RING, PENDANT)
     if matches:
-        pos_clause = "(" + " OR ".join([f"{f} = '{t}'" for t in matches]) + ")"
+        pos_clause = "(" + " OR ".join([f"{f} = '{_sql(t)}'" for t in matches]) + ")"
         sql_parts.append(pos_clause)
 
     # Отрицания (например NOT (item_type = 'RING'))
     if negations:
-        neg_clause = " AND ".join([f"NOT ({f} = '{t}')" for t in negations])
+        neg_clause = " AND ".join([f"NOT ({f} = '{_sql(t)}')" for t in negations])
         sql_parts.append(neg_clause)
 
     if not sql_parts:
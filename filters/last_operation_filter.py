@@ -1,9 +1,12 @@
 import re
 from typing import Tuple, Set, Dict, List
 
+from core import entities, fuzzy
+
 NEGATION_WORDS = ("not", "no", "without", "except")
 
 # Полный список всех LastOperation из Department-operation.xlsx
+# (seed: операции snapshot, которых здесь нет, добавляются в _keywords())
 RAW_OPERATIONS: List[str] = [
     # Jewellers
     "Jeweller Center",
@@ -358,6 +361,27 @@ EXTRA_KEYWORDS: Dict[str, List[str]] = {
 for k, v in EXTRA_KEYWORDS.items():
     OP_KEYWORDS[k.lower()] = v
 
+fuzzy.register_words(OP_KEYWORDS)
+
+
+def _keywords():
+    """
+    OP_KEYWORDS + операции текущего snapshot, которых нет в списке
+    (один раз на snapshot): ключи, regex отрицаний, порядок проверки и trie.
+    """
+    def build(store):
+        keywords = dict(OP_KEYWORDS)
+        for op in entities.values("LastOperation", store):
+            keywords.setdefault(op.lower(), [op])
+        neg = {
+            kw: re.compile(rf"(?:{'|'.join(NEGATION_WORDS)})\s+{re.escape(kw)}")
+            for kw in keywords
+        }
+        order = {kw: i for i, kw in enumerate(sorted(keywords, key=len, reverse=True))}
+        return keywords, neg, order, entities.Trie(keywords)
+
+    return entities.compiled("last_operation", build)
+
 
 def _extract_op_sets(query: str) -> Tuple[Set[str], Set[str]]:
     """
@@ -365,32 +389,31 @@ def _extract_op_sets(query: str) -> Tuple[Set[str], Set[str]]:
       include_ops, exclude_ops
     элементы уже в UPPER и соответствуют точным значениям LastOperation.
     """
-    q = query.lower()
+    keywords, neg, order, trie = _keywords()
+    # опечатки: сначала во фразах операций ("seting in" -> "setting in": слово
+    # "seting" само по себе не опечатка — "Wax Seting In"), потом в словах ("laping" -> "lapping")
+    q = fuzzy.phrase_resolver("last_operation", lambda store: _keywords()[0]).correct(query.lower())
+    q = fuzzy.resolver("last_operation", lambda store: _keywords()[0]).correct(q)
     include_ops: Set[str] = set()
     exclude_ops: Set[str] = set()
 
-    # Сканируем ключи по убыванию длины:
-    # "rp final polish in 1" поймается раньше, чем "final polish in".
-    for kw in sorted(OP_KEYWORDS.keys(), key=len, reverse=True):
-        kw_lower = kw.lower()
-
-        # шаблон для отрицаний: not/no/without/except + фраза
-        neg_pattern = rf"(?:{'|'.join(NEGATION_WORDS)})\s+{re.escape(kw_lower)}"
-
-        # 1) Отрицание
-        if re.search(neg_pattern, q):
-            for op in OP_KEYWORDS[kw]:
+    # Проверяем только ключи, которые есть в тексте (один проход trie),
+    # по убыванию длины: "rp final polish in 1" поймается раньше, чем "final polish in".
+    for kw in sorted(trie.occurring(q), key=order.__getitem__):
+        # 1) Отрицание: not/no/without/except + фраза
+        if neg[kw].search(q):
+            for op in keywords[kw]:
                 exclude_ops.add(op.upper())
             # затираем фразу, чтобы не сработал более общий ключ
-            q = q.replace(kw_lower, " " * len(kw_lower))
+            q = q.replace(kw, " " * len(kw))
             continue
 
         # 2) Положительное упоминание
-        if kw_lower in q:
-            for op in OP_KEYWORDS[kw]:
+        if kw in q:
+            for op in keywords[kw]:
                 include_ops.add(op.upper())
             # тоже затираем, чтобы не зацепить более общий вариант
-            q = q.replace(kw_lower, " " * len(kw_lower))
+            q = q.replace(kw, " " * len(kw))
 
     return include_ops, exclude_ops
 
@@ -405,13 +428,13 @@ def parse_last_operation_filter(query: str) -> str:
     clauses = []
 
     if include_ops:
-        in_list = ", ".join(f"'{o}'" for o in sorted(include_ops))
+        in_list = ", ".join("'" + o.replace("'", "''") + "'" for o in sorted(include_ops))
         clauses.append(
             f"UCase(LTrim(RTrim([LastOperation]))) IN ({in_list})"
         )
 
     if exclude_ops:
-        not_in_list = ", ".join(f"'{o}'" for o in sorted(exclude_ops))
+        not_in_list = ", ".join("'" + o.replace("'", "''") + "'" for o in sorted(exclude_ops))
         clauses.append(
             f"UCase(LTrim(RTrim([LastOperation]))) NOT IN ({not_in_list})"
         )
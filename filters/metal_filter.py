@@ -1,6 +1,6 @@
 from __future__ import annotations
 import re
-from typing import List
+from typing import List, NamedTuple, Tuple
 
 COLOR_MAP = {
     "W": "W", "WHITE": "W", "WG": "W",
@@ -164,6 +164,63 @@ def _build_like_clause(field: str, codes: List[str]) -> str:
     return "(" + " OR ".join(f"{f} LIKE '{c}%'" for c in codes) + ")"
 
 
+# ---- нормализованный домен металла ----
+class MetalCode(NamedTuple):
+    """
+    Код металла (karat, color, base): 10Y -> ('10', 'Y', ''), 18WPL -> ('18', 'W', 'PL'),
+    SLV -> ('', '', 'SLV'), чистый "9 karat" -> ('9', '', '').
+    Покрывает значения metal, которые начинаются с prefix (10Y -> 10YG, 10YW).
+    """
+    karat: str
+    color: str
+    base: str
+
+    @property
+    def prefix(self) -> str:
+        return self.karat + self.color + self.base
+
+    @classmethod
+    def parse(cls, code: str) -> "MetalCode":
+        m = re.fullmatch(r"(9|10|14|18)?([WYR])?(.*)", code)
+        return cls(m.group(1) or "", m.group(2) or "", m.group(3))
+
+
+def _codes(codes) -> Tuple[MetalCode, ...]:
+    return tuple(sorted({MetalCode.parse(c) for c in codes}, key=lambda c: c.prefix))
+
+
+class MetalSet(NamedTuple):
+    """
+    Условие на metal как множество над MetalCode: значение подходит, если оно
+    покрыто хотя бы одним кодом include (include пуст — любое непустое) и ни
+    одним кодом exclude. Группы — только для вида SQL: (a OR b) OR (c),
+    NOT (gold-коды) одним отрицанием.
+    """
+    include: Tuple[Tuple[MetalCode, ...], ...] = ()
+    exclude: Tuple[Tuple[MetalCode, ...], ...] = ()
+
+    def __bool__(self) -> bool:
+        return bool(self.include or self.exclude)
+
+    def matches(self, value: str) -> bool:
+        v = _uc(value)
+        if self.include and not any(v.startswith(c.prefix) for g in self.include for c in g):
+            return False
+        return not any(v.startswith(c.prefix) for g in self.exclude for c in g)
+
+    def to_sql(self, field: str = "[metal]") -> str:
+        """Переносимый Access SQL (LIKE по префиксам); DuckDB-исполнитель сворачивает его в IN по кодам."""
+        if not self:
+            return ""
+        f = _field_norm(field)
+        parts: List[str] = []
+        if self.include:
+            parts.append("(" + " OR ".join(_build_like_clause(field, [c.prefix for c in g]) for g in self.include) + ")")
+        for g in self.exclude:
+            parts.append("NOT (" + " OR ".join(f"{f} LIKE '{c.prefix}%'" for c in g) + ")")
+        return " AND " + " AND ".join(parts)
+
+
 # ---- отрицания 9/10/14/18 + W/Y/R ----
 def _extract_negated_karat_color_codes(gU: List[str], full_upper: str) -> List[str]:
     """
@@ -261,13 +318,13 @@ def _extract_negated_karat_only(gU: List[str], full_upper: str) -> List[str]:
     return sorted(nums)
 
 
-def parse_metal_filter(user_query, field="[metal]") -> str:
+def metal_set(user_query) -> MetalSet:
     U = _uc(user_query)
     words = _tokenize(U)
     groups = _split_by_and(words)
 
-    positive_groups: List[str] = []
-    negative_groups: List[str] = []
+    include: List[Tuple[MetalCode, ...]] = []
+    exclude: List[Tuple[MetalCode, ...]] = []
 
     # NOT GOLD / NOT SILVER / ...
     negated: List[str] = []
@@ -342,54 +399,33 @@ def parse_metal_filter(user_query, field="[metal]") -> str:
             codes.extend(inherited_codes)
 
         if codes:
-            positive_groups.append(_build_like_clause(field, sorted(set(codes))))
-
-    # стандартные NOT GOLD / NOT SILVER / ...
-    def _not_clause(m: str) -> str:
-        f = _field_norm(field)
-        if m == "GOLD":
-            return "NOT (" + " OR ".join(
-                f"{f} LIKE '{k}%'" for k in _gold_codes()
-            ) + ")"
-        if m == "SILVER":
-            return f"NOT ({f} LIKE 'SLV%')"
-        if m == "PLATINUM":
-            return f"NOT ({f} LIKE 'PLAT%')"
-        if m == "BRASS":
-            return f"NOT ({f} LIKE 'BRASS%')"
-        if m == "PALLADIUM":
-            return "NOT (" + " OR ".join(
-                f"{f} LIKE '{k}%'" for k in PALLADIUM_CODES
-            ) + ")"
-        return ""
-
+            include.append(_codes(codes))
+
+    # стандартные NOT GOLD / NOT SILVER / ... (в порядке gold-коды, как в _gold_codes)
+    NEGATED_CODES = {
+        "GOLD": _gold_codes(),
+        "SILVER": ["SLV"],
+        "PLATINUM": ["PLAT"],
+        "BRASS": ["BRASS"],
+        "PALLADIUM": PALLADIUM_CODES,
+    }
     for m in negated:
-        negative_groups.append(_not_clause(m))
+        exclude.append(tuple(MetalCode.parse(c) for c in NEGATED_CODES[m]))
 
     # конкретные NOT 10YG / NOT 9WG / NOT 9 karat
     all_neg_specific = sorted({code for codes in neg_specific_per_group for code in codes})
     all_neg_karat_only = sorted({num for nums in neg_karat_only_per_group for num in nums})
 
-    if all_neg_specific or all_neg_karat_only:
-        f = _field_norm(field)
-
-        for code in all_neg_specific:
-            negative_groups.append(f"NOT ({f} LIKE '{code}%')")
-
-        # NOT 9 karat → NOT 9W%, NOT 9Y%, NOT 9R%
-        for num in all_neg_karat_only:
-            for col in ["W", "Y", "R"]:
-                negative_groups.append(f"NOT ({f} LIKE '{num}{col}%')")
+    for code in all_neg_specific:
+        exclude.append((MetalCode.parse(code),))
 
-    sql_parts: List[str] = []
+    # NOT 9 karat → NOT 9W%, NOT 9Y%, NOT 9R%
+    for num in all_neg_karat_only:
+        for col in ["W", "Y", "R"]:
+            exclude.append((MetalCode(num, col, ""),))
 
-    if positive_groups:
-        sql_parts.append("(" + " OR ".join(positive_groups) + ")")
+    return MetalSet(tuple(include), tuple(exclude))
 
-    if negative_groups:
-        sql_parts.extend(negative_groups)
 
-    if not sql_parts:
-        return ""
-
-    return " AND " + " AND ".join(sql_parts)
+def parse_metal_filter(user_query, field="[metal]") -> str:
+    return metal_set(user_query).to_sql(field)
@@ -68,14 +68,15 @@ def parse_order_type_filter(user_query: str, field: str = "[order_type]"):
     # ---------- POSITIVE CLAUSE ----------
     if positives:
         pos_sql = []
-        for p in positives:
+        # в порядке ORDER_TYPES, а не set: тот же запрос — тот же SQL в любом процессе
+        for p in (t for t in ORDER_TYPES if t in positives):
             pos_sql.append(
                 f"UCase(LTrim(RTrim({field}))) = '{p}'"
             )
         sql_parts.append("(" + " OR ".join(pos_sql) + ")")
 
     # ---------- NEGATIVE CLAUSE ----------
-    for n in negatives:
+    for n in (t for t in ORDER_TYPES if t in negatives):
         sql_parts.append(
             f"NOT (UCase(LTrim(RTrim({field}))) = '{n}')"
         )
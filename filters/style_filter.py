@@ -1,6 +1,10 @@
 import re
 
+from core import entities, fuzzy, snapshot_store
+from core.id_index import value_index
+
 # Явные customer-имена / коды, которые НЕЛЬЗЯ считать стилем
+# (плюс все customer текущего snapshot — см. core/entities.py)
 EXCLUDED_STYLE_TOKENS = {
     "AUSRTALIA",  # так, как у тебя в базе
     "AZURE",
@@ -22,6 +26,37 @@ EXCLUDED_STYLE_TOKENS = {
 }
 
 
+def _style_codes(store) -> set[str]:
+    """Значения style snapshot и их части из букв и цифр (BLB9868 из BLB9868-18YG)."""
+    keys = value_index(store, "style").keys
+    codes = set(keys)
+    for key in keys:
+        codes.update(t for t in re.split(r"[-. /]", key) if len(t) >= 4 and _is_code(t))
+    return codes
+
+
+def _is_code(code: str) -> bool:
+    return any(ch.isdigit() for ch in code) and any(ch.isalpha() for ch in code)
+
+
+def _resolve_style(code: str) -> str:
+    """
+    Код style без единого совпадения в snapshot -> ближайший код style
+    (одна правка: BLB9686 -> BLB9868), если он единственный; иначе code как есть.
+    Голые числа не трогаем: это чаще номер job/PO/bag, а не опечатка в style.
+    """
+    if not _is_code(code):
+        return code
+    store = snapshot_store.current_store()
+    index = store.extras.get("ngram_index", {}).get("style") if store is not None else None
+    if index is None:
+        return code
+    hits = index.like(f"%{code}%")
+    if hits is None or len(hits):
+        return code
+    return fuzzy.code_resolver("style", _style_codes).best(code) or code
+
+
 def parse_style_filter(text: str) -> str:
     """
     Фильтр по полю [style].
@@ -31,7 +66,7 @@ def parse_style_filter(text: str) -> str:
       - игнорируем очевидные не-style токены:
           * любые коды, начинающиеся с SO/PO/FG
           * NS-/DD-/SV-/DJ- префиксы
-          * customer-имена из EXCLUDED_STYLE_TOKENS
+          * customer-имена из EXCLUDED_STYLE_TOKENS и snapshot
       - по каждому найденному стилю строим:
           UCase(LTrim(RTrim([style]))) LIKE '%.%'
 
@@ -110,6 +145,13 @@ def parse_style_filter(text: str) -> str:
         if code:
             so_tokens.add(code.upper())
 
+    # коды после "size ..." (6-8, M-6.5, Q.5-8.5) — размер кольца, НЕ style
+    size_tokens: set[str] = set()
+    for m in re.finditer(r"\bsizes?\s+([A-Za-z0-9\.\-]+)", text, flags=re.IGNORECASE):
+        code = m.group(1).strip()
+        if code:
+            size_tokens.add(code.upper())
+
 
     # --- НОВОЕ: отрицания по style ---
     # Поддержка:
@@ -179,6 +221,9 @@ def parse_style_filter(text: str) -> str:
         if upper in so_tokens:
             continue
 
+        if upper in size_tokens:
+            continue
+
 
         # --- Короткие коды с одной цифрой (типа D4D, A3B, X1Z) считаем НЕ style ---
         # len <= 4 и ровно 1 цифра → вероятнее customer / внутренний код, чем style
@@ -190,7 +235,7 @@ def parse_style_filter(text: str) -> str:
         if re.match(r"^FG[0-9]{4,}[A-Z0-9]*$", upper):
             continue
 
-        if upper in EXCLUDED_STYLE_TOKENS:
+        if upper in entities.entity("customer", EXCLUDED_STYLE_TOKENS):
             continue
 
         # Коды вида AZ-110901 — это PO / заказ, не style
@@ -247,7 +292,7 @@ def parse_style_filter(text: str) -> str:
         out: list[str] = []
         seen: set[str] = set()
         for c in codes:
-            u = c.upper().replace("'", "''")  # экранируем '
+            u = _resolve_style(c.upper()).replace("'", "''")  # экранируем '
             if u not in seen:
                 seen.add(u)
                 out.append(u)
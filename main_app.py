@@ -1,24 +1,20 @@
-﻿import sys, os
-import re
+﻿import re
+import time
+import uuid
+from dataclasses import dataclass, field
 import streamlit as st
 import pandas as pd
-from datetime import datetime
-
-# Make sure core/filters are in the path
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-sys.path.append(BASE_DIR)
-sys.path.append(os.path.join(BASE_DIR, "core"))
-sys.path.append(os.path.join(BASE_DIR, "filters"))
 
 from core.ai_filter_router import ai_parse_query
-from core.db_utils import execute_access_query
+from core.db_utils import execute_access_query, snapshot_info
+from core import memory, metrics, profiler, query_jobs, usage_log, warmup
 
-from ui.tables.casting import render_casting_layout
+from ui.admin import is_admin, memory_tracing_enabled, profiling_enabled, render_admin_sidebar, render_profile
+from ui import layout_engine
+from ui.query_context import build_query_context
 
 # ----- Logging setup -----
-LOG_DIR = os.path.join(BASE_DIR, "logs")
-os.makedirs(LOG_DIR, exist_ok=True)
-LOG_FILE = os.path.join(LOG_DIR, "ai_usage_log.txt")
+# Structured JSONL log (logs/ai_usage_log.jsonl), written by a background thread.
 
 
 def log_event(
@@ -28,25 +24,22 @@ def log_event(
     layout: str = "",
     rows: int | None = None,
     error: str = "",
+    **fields,
 ):
-    """Write simple log line into logs/ai_usage_log.txt."""
-    try:
-        ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        sql_short = sql.replace("\n", " ")[:500]
-        err_short = error.replace("\n", " ")[:300]
-
-        line = (
-            f"{ts}\t{event_type}\t"
-            f"query={query!r}\t"
-            f"rows={rows}\t"
-            f"layout={layout}\t"
-            f"sql={sql_short!r}\t"
-            f"error={err_short!r}\n"
-        )
-        with open(LOG_FILE, "a", encoding="utf-8") as f:
-            f.write(line)
-    except Exception:
-        pass
+    """Queue one structured log record; never blocks on disk I/O."""
+    profile = profiler.current_profile()
+    if profile:
+        fields["profile"] = profile
+    usage_log.log_event(
+        event_type,
+        query=query,
+        sql=sql,
+        layout=layout,
+        rows=rows,
+        error=error,
+        session_id=st.session_state.get("session_id", ""),
+        **fields,
+    )
 
 
 # ----- Presets & date formatting -----
@@ -68,307 +61,267 @@ PRESET_QUERIES = {
     "shipping_last_month": "shipping orders last month",
 }
 
-DATE_COLS = ["pdate", "request_date", "Casting_Date", "ship_date"]
-
-
-def format_dates(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.copy()
-    for col in DATE_COLS:
-        if col in df.columns:
-            df[col] = pd.to_datetime(df[col], errors="coerce").dt.strftime("%m/%d/%Y")
-    return df
-
+# ---------- LAYOUTS ----------
+# Таблицы layout'ов — TableSpec'и в ui/tables/*; выбор layout'а, агрегаты
+# одним запросом и ленивая отрисовка — ui/layout_engine.py.
 
-def render_total_box(df: pd.DataFrame):
-    total_qty = None
-    total_orders = None
-
-    if "quan" in df.columns:
-        df_qty = pd.to_numeric(df["quan"], errors="coerce")
-        total_qty = df_qty.sum(skipna=True)
-
-    if "SalesOrder" in df.columns:
-        total_orders = df["SalesOrder"].nunique(dropna=True)
-
-    if total_qty is None and total_orders is None:
-        return
-
-    if total_orders is not None and total_qty is not None:
-        html = f"""
-        <div class="total-qty-box">
-          <div class="total-line">
-            <span class="total-label">Orders (SO):</span>
-            <span class="total-number">{total_orders:,}</span>
-          </div>
-          <div class="total-line">
-            <span class="total-label">Total Qty:</span>
-            <span class="total-number">{total_qty:,.0f}</span>
-          </div>
-        </div>
-        """
-    elif total_qty is not None:
-        html = f"""
-        <div class="total-qty-box">
-          <div class="total-line">
-            <span class="total-label">Total Qty:</span>
-            <span class="total-number">{total_qty:,.0f}</span>
-          </div>
-        </div>
-        """
-    else:
-        html = ""
+def select_layout(query: str) -> str:
+    return build_query_context(query).layout
 
-    if html:
-        st.markdown(html, unsafe_allow_html=True)
 
-
-# ---------- RECEIVED LAYOUT ----------
-
-def show_received_layout(df: pd.DataFrame):
-    if df is None or df.empty:
+def render_layout(layout_name: str, df: pd.DataFrame, query: str):
+    if layout_name != "default" and (df is None or df.empty):
         st.warning("⚠️ No records found for this filter.")
         return
-
-    period_text = None
-    if "pdate" in df.columns:
-        pdates = pd.to_datetime(df["pdate"], errors="coerce")
-        if not pdates.isna().all():
-            start = pdates.min()
-            end = pdates.max()
-            if pd.notna(start) and pd.notna(end):
-                if start.date() == end.date():
-                    period_text = start.strftime("%m/%d/%Y")
-                else:
-                    period_text = f"{start.strftime('%m/%d/%Y')} – {end.strftime('%m/%d/%Y')}"
-
-    df = format_dates(df)
-
-    base_required = {"order_type", "metal", "quan"}
-    if not base_required.issubset(set(df.columns)):
-        st.dataframe(df)
-        render_total_box(df)
-        return
-
-    family_mask = df["order_type"].astype(str).str.upper().str.contains("FAMILY", na=False)
-    df_family = df[family_mask].copy()
-
-    st.subheader("1️⃣ Family orders — quantity by metal")
-    if period_text:
-        st.markdown(f"**Period (pdate):** {period_text}")
-
-    if not df_family.empty:
-        fam_series = (
-            df_family.groupby("metal")["quan"]
-            .sum()
-            .sort_index()
-        )
-        total_all = fam_series.sum()
-        fam_table = fam_series.to_frame().T
-        fam_table.index = ["Qty"]
-        fam_table["Total"] = total_all
-        st.dataframe(fam_table)
-    else:
-        st.info("No family orders in this period.")
-
-    st.subheader("2️⃣ Orders summary by order type (SO count & total qty)")
-    summary_required = {"order_type", "SalesOrder", "quan"}
-    if summary_required.issubset(set(df.columns)):
-        type_summary = (
-            df.groupby("order_type", as_index=False)
-            .agg(
-                SO_Count=("SalesOrder", "nunique"),
-                Total_Qty=("quan", "sum"),
-            )
-            .rename(columns={"order_type": "Order Type"})
-        )
-        type_summary.insert(0, "No.", range(1, len(type_summary) + 1))
-        st.dataframe(type_summary.set_index("No."))
-    else:
-        st.info("Summary by order type is not available (missing SalesOrder or quan columns).")
-
-    st.subheader("3️⃣ Detailed received orders")
-    st.dataframe(df)
-    render_total_box(df)
+    layout_engine.render(layout_engine.prepare(query, df, layout_name))
 
 
-# ---------- CASTING / SHIPPING COMMON HELPERS ----------
+# ---------- SESSION RESULTS ----------
 
-KARAT_PURITY = {
-    "9": 0.375,
-    "10": 0.4167,
-    "14": 0.585,
-    "18": 0.750,
-}
-
-
-def purity_factor(metal_code: str) -> float | None:
-    code = str(metal_code).strip().upper()
-    if code.startswith("SLV"):
-        return 1.0
-    if code.startswith("BRASS"):
-        return 1.0
-    if code.startswith("PLAT"):
-        return 1.0
-
-    digits = ""
-    for ch in code:
-        if ch.isdigit():
-            digits += ch
-        else:
-            break
+@dataclass
+class SessionResult:
+    """Результат запроса в кэше сессии: DataFrame и подготовленный layout (агрегаты, таблицы)."""
 
-    if digits in KARAT_PURITY:
-        return KARAT_PURITY[digits]
-    return None
+    sql: str
+    sha: str | None
+    layout: str
+    df: pd.DataFrame | None
+    prepared: layout_engine.PreparedLayout | None
+    rows: int
+    created: float = field(default_factory=time.time)
 
+    def nbytes(self) -> int:
+        return memory.nbytes(self.df) + (self.prepared.nbytes() if self.prepared else 0)
 
-def sort_metal_for_casting(code: str):
-    c = str(code).strip().upper()
-    if c.startswith("SLV"):
-        return (0, c)
-    if c.startswith("BRASS"):
-        return (1, c)
-    if c.startswith("PLAT"):
-        return (2, c)
-    return (3, c)
 
+def session_results() -> memory.BoundedCache:
+    """
+    Кэш результатов текущей сессии: (query, sql, sha snapshot) -> SessionResult.
 
-def _metal_group_masks(grouped: pd.DataFrame):
-    def mask_silver(m): return str(m).strip().upper().startswith("SLV")
-    def mask_brass(m): return str(m).strip().upper().startswith("BRASS")
-    def mask_platinum(m): return str(m).strip().upper().startswith("PLAT")
+    Живёт в session_state, поэтому закончилась сессия — освободился и кэш
+    (memory.session_results видит его через слабую ссылку).
+    """
+    cache = st.session_state.get("results")
+    if cache is None:
+        cache = memory.session_results.new(st.session_state["session_id"])
+        st.session_state["results"] = cache
+    return cache
 
-    def mask_gold(m):
-        c = str(m).strip().upper()
-        return not (mask_silver(c) or mask_brass(c) or mask_platinum(c))
 
-    silver_mask = grouped["metal"].apply(mask_silver)
-    brass_mask = grouped["metal"].apply(mask_brass)
-    plat_mask = grouped["metal"].apply(mask_platinum)
-    gold_mask = grouped["metal"].apply(mask_gold)
-    return silver_mask, brass_mask, plat_mask, gold_mask
+def show_result(result: SessionResult):
+    if result.rows:
+        layout_engine.render(result.prepared)
+    else:
+        st.warning("⚠️ No records found for this filter.")
 
 
-# ---------- CASTING LAYOUT ----------
+# ---------- QUERY EXECUTION ----------
 
-def show_casting_layout(df: pd.DataFrame, query: str):
-    # UI rendering delegated to ui/tables/casting.py (refactor only)
-    return render_casting_layout(df, query, format_dates=format_dates, render_total_box=render_total_box)
+def query_slot() -> query_jobs.JobSlot:
+    """Запрос сессии в пуле query_jobs: новый запрос сессии или её конец отменяют предыдущий."""
+    slot = st.session_state.get("query_slot")
+    if slot is None:
+        slot = st.session_state["query_slot"] = query_jobs.JobSlot()
+    return slot
 
-# ---------- SHIPPING LAYOUT ----------
 
-def show_shipping_layout(df: pd.DataFrame):
-    if df is None or df.empty:
-        st.warning("⚠️ No records found for this filter.")
-        return
+def wait_for(job: query_jobs.QueryJob) -> pd.DataFrame:
+    """
+    Результат запроса из пула. Ждём короткими интервалами и обновляем прогресс:
+    на каждом обновлении Streamlit может остановить скрипт (новый запрос,
+    Cancel), а запрос при этом продолжит работать до отмены.
+    """
+    try:
+        return job.result(timeout=0.3)  # быстрые запросы — без прогресса
+    except TimeoutError:
+        pass
 
-    df_local = df.copy()
-
-    period_text = None
-    if "ship_date" in df_local.columns:
-        sdates = pd.to_datetime(df_local["ship_date"], errors="coerce")
-        if not sdates.isna().all():
-            start = sdates.min()
-            end = sdates.max()
-            if pd.notna(start) and pd.notna(end):
-                if start.date() == end.date():
-                    period_text = start.strftime("%m/%d/%Y")
+    holder = st.empty()
+    with holder.container():
+        bar = st.progress(0, text="⏳ Running query…")
+        st.button("✖ Cancel query", key="cancel_query")
+    try:
+        while True:
+            try:
+                return job.result(timeout=0.3)
+            except TimeoutError:
+                pass
+            pct = job.progress()
+            text = f"⏳ Running query… {job.elapsed():.0f} s"
+            if pct is not None:
+                text += f" ({pct:.0f}%)"
+            bar.progress(min(int(pct or 0), 100), text=text)
+    finally:
+        holder.empty()
+
+
+# ---------- QUERY PIPELINE ----------
+
+def run_query(query: str, run_now: bool, request_id: str, mem: memory.RequestMemory | None = None):
+    """
+    ai_parse_query -> execute -> layout для одного запроса + usage-лог.
+
+    Запрос выполняется в пуле query_jobs (прогресс, Cancel, QUERY_TIMEOUT_S);
+    результат и таблицы layout'а кладутся в кэш сессии. Rerun без Run (клик
+    по виджету, сортировка таблицы) и повторный Run того же запроса на том же
+    snapshot в пределах SESSION_RESULT_TTL_S рисуются из кэша — без запроса
+    и без groupby.
+    """
+    mem = mem or memory.RequestMemory(tracing=False)
+    timings: dict[str, float] = {}
+    stage = "parse"
+    try:
+        t0 = time.perf_counter()
+        sql = ai_parse_query(query)
+        timings["parse"] = (time.perf_counter() - t0) * 1000
+        log_event("PARSE_OK", query=query, sql=sql, request_id=request_id, timings_ms=timings)
+
+        st.subheader("📘 Generated SQL")
+        st.code(sql, language="sql")
+
+        slot = query_slot()
+        job = slot.pending(sql)
+        if run_now and job is None:
+            slot.cancel()  # новый запрос сессии: предыдущий, если ещё работает, прерываем
+        if job is not None and st.session_state.get("cancel_query"):
+            slot.cancel()
+            st.info("Query cancelled.")
+            log_event("RUN_CANCELLED", query=query, sql=sql, request_id=request_id, timings_ms=timings)
+            return
+
+        results = session_results()
+        hit = results.get((query, sql, snapshot_info()["sha"]))
+        if hit is not None and (not run_now or time.time() - hit.created < memory.SESSION_RESULT_TTL_S):
+            stage = "render"
+            t0 = time.perf_counter()
+            show_result(hit)
+            timings["render"] = (time.perf_counter() - t0) * 1000
+            if run_now:
+                metrics.QUERIES.inc(layout=hit.layout if hit.rows else "no_rows")
+                metrics.RESULT_ROWS.observe(hit.rows)
+                log_event(
+                    "RUN_OK" if hit.rows else "NO_ROWS",
+                    query=query,
+                    sql=sql,
+                    layout=hit.layout,
+                    rows=hit.rows,
+                    request_id=request_id,
+                    snapshot_sha=hit.sha,
+                    timings_ms=timings,
+                    cache={"session": True},
+                    memory=mem.as_dict(),
+                )
+            return
+
+        if run_now or job is not None:
+            stage = "execute"
+            t0 = time.perf_counter()
+            try:
+                if profiler.current_profile():
+                    # под профайлером — в этом потоке, иначе cProfile не увидит execute
+                    df = execute_access_query(sql)
                 else:
-                    period_text = f"{start.strftime('%m/%d/%Y')} – {end.strftime('%m/%d/%Y')}"
-
-    required = {"metal", "quan", "LastWeight"}
-    if not required.issubset(set(df_local.columns)):
-        st.warning("⚠️ Shipping layout: missing required columns (need metal, quan, LastWeight).")
-        df_fmt = format_dates(df_local)
-        st.dataframe(df_fmt)
-        render_total_box(df_fmt)
-        return
-
-    grouped = (
-        df_local.groupby("metal", as_index=False)
-        .agg(
-            Qty=("quan", "sum"),
-            Weight=("LastWeight", "sum"),
+                    # rerun прервал ожидание — ждём тот же запрос, а не запускаем заново
+                    job = job or slot.submit(sql, execute_access_query, sql)
+                    df = wait_for(job)
+                    slot.release(job)
+            except Exception as run_err:
+                slot.release(job)
+                timings["execute"] = (time.perf_counter() - t0) * 1000
+                snap = snapshot_info()
+                log_event(
+                    "RUN_ERROR",
+                    query=query,
+                    sql=sql,
+                    error=str(run_err),
+                    error_class=type(run_err).__name__,
+                    request_id=request_id,
+                    snapshot_sha=snap["sha"],
+                    timings_ms=timings,
+                )
+                raise
+            timings["execute"] = (time.perf_counter() - t0) * 1000
+            snap = snapshot_info()
+            cache = {"snapshot": snap["cache_hit"], "session": False}
+            if df is not None:
+                mem.add_result(df)
+
+            layout_name = select_layout(query)
+            if df is not None and not df.empty:
+                rows_count = len(df)
+
+                stage = "render"
+                t0 = time.perf_counter()
+                prepared = layout_engine.prepare(query, df)
+                result = SessionResult(sql, snap["sha"], layout_name, df, prepared, rows_count)
+                results.put((query, sql, snap["sha"]), result)
+                show_result(result)
+                timings["render"] = (time.perf_counter() - t0) * 1000
+                metrics.QUERIES.inc(layout=layout_name)
+                metrics.RESULT_ROWS.observe(rows_count)
+
+                log_event(
+                    "RUN_OK",
+                    query=query,
+                    sql=sql,
+                    layout=layout_name,
+                    rows=rows_count,
+                    request_id=request_id,
+                    snapshot_sha=snap["sha"],
+                    timings_ms=timings,
+                    cache=cache,
+                    memory=mem.as_dict(),
+                )
+            else:
+                # пустой результат тоже кэшируем: rerun снова покажет предупреждение
+                results.put((query, sql, snap["sha"]), SessionResult(sql, snap["sha"], layout_name, None, None, 0))
+                st.warning("⚠️ No records found for this filter.")
+                metrics.QUERIES.inc(layout="no_rows")
+                metrics.RESULT_ROWS.observe(0)
+                log_event(
+                    "NO_ROWS",
+                    query=query,
+                    sql=sql,
+                    rows=0,
+                    request_id=request_id,
+                    snapshot_sha=snap["sha"],
+                    timings_ms=timings,
+                    cache=cache,
+                    memory=mem.as_dict(),
+                )
+
+    except Exception as e:
+        if isinstance(e, query_jobs.QueryCancelled):
+            st.error(f"❌ {e}. Try a narrower filter.")
+        else:
+            st.error(f"❌ Error while building SQL: {e}")
+        metrics.ERRORS.inc(stage=stage, error_class=type(e).__name__)
+        log_event(
+            "PARSE_ERROR",
+            query=query,
+            error=str(e),
+            error_class=type(e).__name__,
+            request_id=request_id,
+            timings_ms=timings,
         )
+    finally:
+        for stage, ms in timings.items():
+            metrics.STAGE_SECONDS.observe(ms / 1000, stage=stage)
+
+
+# ---------- WARM-UP ----------
+
+@st.fragment(run_every=1.0)
+def warmup_banner():
+    """Пока идёт warm-up процесса — баннер с текущим шагом; закончился — rerun уже без баннера."""
+    if warmup.ready():
+        st.rerun()
+    state = warmup.status()
+    elapsed = time.time() - (state["started"] or time.time())
+    st.info(
+        f"⏳ Warming up ({state['step'] or 'starting'}, {elapsed:.0f} s) — "
+        "the first queries may be slower until it finishes."
     )
-    grouped["PurityFactor"] = grouped["metal"].apply(purity_factor)
-    grouped["PureMetal"] = grouped["Weight"] * grouped["PurityFactor"]
-    grouped["__order"] = grouped["metal"].apply(sort_metal_for_casting)
-    grouped = grouped.sort_values("__order").drop(columns="__order")
-
-    grouped["Weight"] = grouped["Weight"].round(3)
-    grouped["PureMetal"] = grouped["PureMetal"].round(3)
-
-    st.subheader("1️⃣ Shipping by metal")
-    if period_text:
-        st.markdown(f"**Period (ship_date):** {period_text}")
-
-    table = grouped[["metal", "Qty", "Weight", "PureMetal"]].copy()
-    table.insert(0, "No.", range(1, len(table) + 1))
-    st.dataframe(table.set_index("No."))
-
-    silver_mask, brass_mask, plat_mask, gold_mask = _metal_group_masks(grouped)
-
-    gold_qty = grouped.loc[gold_mask, "Qty"].sum()
-    gold_weight = grouped.loc[gold_mask, "Weight"].sum()
-    gold_pure = grouped.loc[gold_mask, "PureMetal"].sum()
-
-    silver_qty = grouped.loc[silver_mask, "Qty"].sum()
-    silver_weight = grouped.loc[silver_mask, "Weight"].sum()
-    silver_pure = grouped.loc[silver_mask, "PureMetal"].sum()
-
-    brass_qty = grouped.loc[brass_mask, "Qty"].sum()
-    brass_weight = grouped.loc[brass_mask, "Weight"].sum()
-    brass_pure = grouped.loc[brass_mask, "PureMetal"].sum()
-
-    plat_qty = grouped.loc[plat_mask, "Qty"].sum()
-    plat_weight = grouped.loc[plat_mask, "Weight"].sum()
-    plat_pure = grouped.loc[plat_mask, "PureMetal"].sum()
-
-    total_qty = grouped["Qty"].sum()
-    total_weight = grouped["Weight"].sum()
-    total_pure = grouped["PureMetal"].sum()
-
-    summary = pd.DataFrame(
-        {
-            "Metal group": [
-                "Gold",
-                "Silver",
-                "Brass",
-                "Platinum",
-                "TOTAL (all metals)",
-            ],
-            "Total qty": [
-                gold_qty,
-                silver_qty,
-                brass_qty,
-                plat_qty,
-                total_qty,
-            ],
-            "Total weight": [
-                round(gold_weight, 3),
-                round(silver_weight, 3),
-                round(brass_weight, 3),
-                round(plat_weight, 3),
-                round(total_weight, 3),
-            ],
-            "Total pure metal": [
-                round(gold_pure, 3),
-                round(silver_pure, 3),
-                round(brass_pure, 3),
-                round(plat_pure, 3),
-                round(total_pure, 3),
-            ],
-        }
-    )
-
-    st.subheader("2️⃣ Shipping summary by metal group")
-    st.dataframe(summary.set_index("Metal group"))
-
-    st.subheader("3️⃣ Detailed shipping records")
-    df_fmt = format_dates(df_local)
-    st.dataframe(df_fmt)
-    render_total_box(df_fmt)
 
 
 # ---------- MAIN APP ----------
@@ -429,6 +382,13 @@ def main():
         unsafe_allow_html=True,
     )
 
+    metrics.start_http_server()
+    # один раз на процесс: snapshot, фильтры и кнопки быстрых запросов — до первого клика
+    warmup.start(PRESET_QUERIES.values(), layout_engine.prepare)
+    if not warmup.ready():
+        warmup_banner()
+    render_admin_sidebar()
+
     st.subheader("Quick queries / คำถามด่วน")
 
     # session state: query (last executed) and query_input (current text in box)
@@ -436,6 +396,8 @@ def main():
         st.session_state["query"] = ""
     if "query_input" not in st.session_state:
         st.session_state["query_input"] = ""
+    if "session_id" not in st.session_state:
+        st.session_state["session_id"] = uuid.uuid4().hex[:12]
 
     preset_query = None
     run_now = False
@@ -530,47 +492,20 @@ def main():
     query = st.session_state["query"]
 
     if query:
-        try:
-            sql = ai_parse_query(query)
-            log_event("PARSE_OK", query=query, sql=sql)
-
-            st.subheader("📘 Generated SQL")
-            st.code(sql, language="sql")
-
-            if run_now:
-                try:
-                    df = execute_access_query(sql)
-                except Exception as run_err:
-                    log_event("RUN_ERROR", query=query, sql=sql, error=str(run_err))
-                    raise
-
-                if df is not None and not df.empty:
-                    q_lower = query.lower()
-                    rows_count = len(df)
-
-                    if "received order" in q_lower or "received orders" in q_lower:
-                        layout_name = "received"
-                        show_received_layout(df)
-                    elif "casting" in q_lower:
-                        layout_name = "casting"
-                        show_casting_layout(df, query)
-                    elif "shipping" in q_lower or "shipped" in q_lower or "ship " in q_lower:
-                        layout_name = "shipping"
-                        show_shipping_layout(df)
-                    else:
-                        layout_name = "default"
-                        df_fmt = format_dates(df)
-                        st.dataframe(df_fmt)
-                        render_total_box(df_fmt)
-
-                    log_event("RUN_OK", query=query, sql=sql, layout=layout_name, rows=rows_count)
-                else:
-                    st.warning("⚠️ No records found for this filter.")
-                    log_event("NO_ROWS", query=query, sql=sql, rows=0)
-
-        except Exception as e:
-            st.error(f"❌ Error while building SQL: {e}")
-            log_event("PARSE_ERROR", query=query, error=str(e))
+        request_id = usage_log.new_request_id()
+        with memory.trace_request(run_now and memory_tracing_enabled()) as mem:
+            # профилируем только реальный запуск; без профайлера — никаких обёрток
+            if run_now and profiling_enabled():
+                with profiler.profile_request(request_id) as profile_name:
+                    run_query(query, run_now, request_id, mem)
+                if profile_name:
+                    st.session_state["last_profile"] = profile_name
+            else:
+                run_query(query, run_now, request_id, mem)
+
+    if st.session_state.get("last_profile") and is_admin():
+        with st.expander(f"⏱ Profile of the last run ({st.session_state['last_profile']})"):
+            render_profile(st.session_state["last_profile"], key="last")
 
 
 if __name__ == "__main__":
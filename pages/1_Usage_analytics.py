@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+from datetime import date, timedelta
+
+import streamlit as st
+
+from core import log_ingest
+
+
+@st.cache_resource
+def _usage_db():
+    # одно соединение на процесс: DuckDB-файл не любит несколько писателей
+    return log_ingest.connect()
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _refresh() -> int:
+    return log_ingest.ingest(_usage_db())
+
+
+def _q(sql: str, params: list):
+    # в pandas попадают только агрегаты, не сырые строки лога
+    return _usage_db().cursor().execute(sql, params).df()
+
+
+RUN_EVENTS = "('RUN_OK', 'NO_ROWS', 'RUN_ERROR')"
+
+
+def main():
+    st.set_page_config(page_title="Usage analytics", layout="wide")
+    st.title("📊 Usage analytics")
+
+    with st.sidebar:
+        if st.button("Reload logs"):
+            _refresh.clear()
+        period = st.selectbox("Period", ["Last 7 days", "Last 30 days", "Last 90 days", "All time", "Custom"])
+        today = date.today()
+        if period == "Custom":
+            rng = st.date_input("Range", value=(today - timedelta(days=7), today))
+            # пока выбрана только первая дата, Streamlit отдаёт 1-tuple
+            start = rng[0] if rng else today
+            end = rng[1] if len(rng) == 2 else start
+        elif period == "All time":
+            start, end = date(2000, 1, 1), today
+        else:
+            days = int(period.split()[1])
+            start, end = today - timedelta(days=days - 1), today
+
+    with st.spinner("Ingesting logs..."):
+        added = _refresh()
+    if added:
+        st.caption(f"Ingested {added:,} new log records.")
+
+    # [start, end + 1 day)
+    params = [start, end + timedelta(days=1)]
+    where = "ts >= CAST(? AS DATE) AND ts < CAST(? AS DATE)"
+
+    totals = _q(
+        f"""
+        SELECT
+            count(*) FILTER (WHERE event IN {RUN_EVENTS}) AS runs,
+            count(*) FILTER (WHERE event = 'PARSE_ERROR') AS parse_errors,
+            count(*) FILTER (WHERE event = 'RUN_ERROR') AS run_errors,
+            count(*) FILTER (WHERE event = 'NO_ROWS') AS no_rows,
+            count(DISTINCT lower(trim(query))) AS distinct_queries
+        FROM usage_events WHERE {where}
+        """,
+        params,
+    ).iloc[0]
+
+    c1, c2, c3, c4, c5 = st.columns(5)
+    c1.metric("Runs", f"{int(totals['runs']):,}")
+    c2.metric("Distinct queries", f"{int(totals['distinct_queries']):,}")
+    c3.metric("PARSE_ERROR", f"{int(totals['parse_errors']):,}")
+    c4.metric("RUN_ERROR", f"{int(totals['run_errors']):,}")
+    c5.metric("NO_ROWS", f"{int(totals['no_rows']):,}")
+
+    st.subheader("Most frequent queries")
+    st.dataframe(
+        _q(
+            f"""
+            SELECT lower(trim(query)) AS query,
+                   count(*) AS runs,
+                   count(*) FILTER (WHERE event = 'NO_ROWS') AS no_rows,
+                   round(median(rows)) AS median_rows,
+                   round(quantile_cont(execute_ms, 0.95), 1) AS p95_execute_ms
+            FROM usage_events
+            WHERE {where} AND event IN {RUN_EVENTS}
+            GROUP BY 1 ORDER BY runs DESC LIMIT 50
+            """,
+            params,
+        ),
+        width="stretch",
+        hide_index=True,
+    )
+
+    st.subheader("Slowest queries (p95 parse + execute + render)")
+    st.dataframe(
+        _q(
+            f"""
+            SELECT lower(trim(query)) AS query,
+                   count(*) AS runs,
+                   round(quantile_cont(coalesce(parse_ms, 0) + execute_ms + coalesce(render_ms, 0), 0.95), 1) AS p95_total_ms,
+                   round(max(execute_ms), 1) AS max_execute_ms
+            FROM usage_events
+            WHERE {where} AND event IN {RUN_EVENTS} AND execute_ms IS NOT NULL
+            GROUP BY 1 ORDER BY p95_total_ms DESC LIMIT 50
+            """,
+            params,
+        ),
+        width="stretch",
+        hide_index=True,
+    )
+
+    col_err, col_rows = st.columns(2)
+
+    with col_err:
+        st.subheader("Error rate by day")
+        err = _q(
+            f"""
+            SELECT CAST(ts AS DATE) AS day,
+                   count(*) FILTER (WHERE event = 'PARSE_ERROR') / count(*) AS parse_error_rate,
+                   count(*) FILTER (WHERE event = 'RUN_ERROR')
+                       / greatest(count(*) FILTER (WHERE event IN {RUN_EVENTS}), 1) AS run_error_rate
+            FROM usage_events WHERE {where}
+            GROUP BY 1 ORDER BY 1
+            """,
+            params,
+        )
+        st.line_chart(err.set_index("day"))
+
+    with col_rows:
+        st.subheader("Row-count distribution")
+        dist = _q(
+            f"""
+            SELECT CASE
+                       WHEN rows = 0 THEN '0'
+                       WHEN rows <= 10 THEN '1–10'
+                       WHEN rows <= 100 THEN '11–100'
+                       WHEN rows <= 1000 THEN '101–1,000'
+                       WHEN rows <= 10000 THEN '1,001–10,000'
+                       ELSE '> 10,000'
+                   END AS bucket,
+                   min(rows) AS _order,
+                   count(*) AS runs
+            FROM usage_events
+            WHERE {where} AND event IN ('RUN_OK', 'NO_ROWS') AND rows IS NOT NULL
+            GROUP BY 1 ORDER BY _order
+            """,
+            params,
+        )
+        st.bar_chart(dist.drop(columns="_order").set_index("bucket"))
+
+    st.subheader("Latency percentiles by layout (ms)")
+    lat = _q(
+        f"""
+        SELECT coalesce(nullif(layout, ''), '—') AS layout,
+               count(*) AS runs,
+               round(quantile_cont(parse_ms, 0.5), 2) AS parse_p50,
+               round(quantile_cont(parse_ms, 0.95), 2) AS parse_p95,
+               round(quantile_cont(execute_ms, 0.5), 1) AS execute_p50,
+               round(quantile_cont(execute_ms, 0.95), 1) AS execute_p95,
+               round(quantile_cont(execute_ms, 0.99), 1) AS execute_p99,
+               round(quantile_cont(render_ms, 0.5), 1) AS render_p50,
+               round(quantile_cont(render_ms, 0.95), 1) AS render_p95
+        FROM usage_events
+        WHERE {where} AND event IN {RUN_EVENTS} AND execute_ms IS NOT NULL
+        GROUP BY 1 ORDER BY runs DESC
+        """,
+        params,
+    )
+    if lat.empty:
+        st.info("No timing data in this period (the legacy text log has no latencies).")
+    else:
+        st.dataframe(lat, width="stretch", hide_index=True)
+
+
+main()
@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+import pandas as pd
+import streamlit as st
+
+from core import db_utils, log_ingest, memory, profiler, warmup
+from ui.admin import is_admin, render_profile
+
+
+@st.cache_resource
+def _usage_db():
+    return log_ingest.connect()
+
+
+def _request_info(request_ids: list[str]) -> pd.DataFrame:
+    if not request_ids:
+        return pd.DataFrame()
+    try:
+        con = _usage_db().cursor()
+        log_ingest.ingest(con)
+        return con.execute(
+            """
+            SELECT request_id, arg_max(query, ts) AS query, arg_max(layout, ts) AS layout,
+                   max(parse_ms) AS parse_ms, max(execute_ms) AS execute_ms, max(render_ms) AS render_ms
+            FROM usage_events WHERE request_id IN (SELECT unnest(?))
+            GROUP BY 1
+            """,
+            [request_ids],
+        ).df()
+    except Exception:
+        return pd.DataFrame()
+
+
+def profiles_tab():
+    files = profiler.list_profiles()
+    if not files:
+        st.info("No profiles yet. Turn on “Profile requests” in the sidebar of the main page "
+                "(or set PROFILE_REQUESTS=1) and run a query.")
+        return
+
+    listing = pd.DataFrame({
+        "profile": [p.name for p in files],
+        "request_id": [p.stem for p in files],
+        "created": [pd.Timestamp.fromtimestamp(p.stat().st_mtime).floor("s") for p in files],
+        "kb": [round(p.stat().st_size / 1024, 1) for p in files],
+    })
+    info = _request_info(listing["request_id"].tolist())
+    if not info.empty:
+        listing = listing.merge(info, on="request_id", how="left")
+    st.dataframe(listing, width="stretch", hide_index=True)
+
+    name = st.selectbox("Profile", listing["profile"].tolist())
+    if name:
+        render_profile(name, key="admin")
+
+
+def slow_queries_tab():
+    st.caption(
+        f"Queries slower than {db_utils.SLOW_QUERY_MS:,.0f} ms (SLOW_QUERY_MS) are re-run once in the "
+        "background under EXPLAIN ANALYZE the way they ran: the folded SQL for a scan, the filter over "
+        "candidate rows when an index answered. One plan per (SQL, snapshot), last 1,024 kept in memory."
+    )
+    records = db_utils.read_slow_queries()
+    if not records:
+        st.info("No slow queries recorded.")
+        return
+
+    listing = pd.DataFrame([
+        {
+            "ts": r.get("ts"),
+            "elapsed_ms": r.get("elapsed_ms"),
+            "explain_ms": r.get("explain_ms"),
+            "rows": r.get("rows"),
+            "snapshot_sha": (r.get("snapshot_sha") or "")[:12],
+            "path": r.get("path"),
+            "candidates": r.get("candidates"),
+            "duckdb_sql": r.get("duckdb_sql"),
+        }
+        for r in records
+    ])
+    st.dataframe(listing, width="stretch", hide_index=True)
+
+    i = st.selectbox(
+        "Plan", range(len(records)),
+        format_func=lambda k: f"{records[k].get('ts')} — {records[k].get('elapsed_ms', 0):,.0f} ms",
+    )
+    rec = records[i]
+    if rec.get("indexes"):
+        st.caption(f"Index path: {', '.join(rec['indexes'])} → {rec.get('candidates', 0):,} candidate rows")
+    # старые записи — без executed_sql
+    st.code(rec.get("executed_sql") or rec.get("duckdb_sql", ""), language="sql")
+    if rec.get("error"):
+        st.error(rec["error"])
+    if rec.get("plan"):
+        st.code(rec["plan"], language=None)
+    with st.expander("Access / DuckDB SQL"):
+        st.code(rec.get("access_sql", ""), language="sql")
+        st.code(rec.get("duckdb_sql", ""), language="sql")
+
+
+def _mb(n) -> str:
+    return "—" if n is None else f"{n / 1024 / 1024:,.1f} MB"
+
+
+def memory_tab():
+    rss = memory.process_rss_bytes()
+    budget = memory.MEMORY_BUDGET_BYTES
+    caches = memory.cache_stats()
+    session_bytes = sum(memory.nbytes(v) for v in st.session_state.to_dict().values())
+
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Process RSS", _mb(rss))
+    c2.metric("Caches total", _mb(sum(r["bytes"] for r in caches)))
+    c3.metric("Budget (MEMORY_BUDGET_MB)", _mb(budget) if budget else "unlimited")
+    c4.metric("This session state", _mb(session_bytes))
+
+    st.subheader("Caches")
+    df = pd.DataFrame(caches)
+    if not df.empty:
+        df["MB"] = (df["bytes"] / 1024 / 1024).round(2)
+    st.dataframe(df, width="stretch", hide_index=True)
+    st.caption(f"Budget evictions since start: {memory.evictions}")
+
+    b1, b2 = st.columns(2)
+    if b1.button("Enforce budget now", disabled=not budget):
+        st.toast(f"Freed {_mb(memory.enforce_budget())}")
+    if b2.button("Clear results (incl. sessions) and parse caches"):
+        freed = memory.clear_caches(["session_results", "results", "parse"])
+        st.toast(f"Freed {_mb(freed)}")
+
+    st.subheader("Warm-up")
+    state = warmup.status()
+    if state["status"] == "ready" and state["seconds"] is not None:
+        st.caption(f"Finished in {state['seconds']:.1f} s.")
+    elif state["status"] == "running":
+        st.caption(f"Running: {state['step'] or 'starting'}")
+    else:
+        st.caption("Not run in this process (WARMUP=0 or the main page has not been opened yet).")
+    if state["steps_ms"]:
+        steps = pd.DataFrame({"step": list(state["steps_ms"]), "ms": list(state["steps_ms"].values())})
+        steps["error"] = steps["step"].map(state["errors"]).fillna("")
+        st.dataframe(steps, width="stretch", hide_index=True)
+
+    st.subheader("Heaviest requests (last 7 days)")
+    try:
+        con = _usage_db().cursor()
+        log_ingest.ingest(con)
+        heavy = con.execute(
+            """
+            SELECT ts, request_id, query, layout, rows,
+                   round(result_bytes / 1048576.0, 2) AS result_mb,
+                   round(peak_traced_bytes / 1048576.0, 2) AS peak_traced_mb
+            FROM usage_events
+            WHERE ts >= now() - INTERVAL 7 DAY AND (result_bytes IS NOT NULL OR peak_traced_bytes IS NOT NULL)
+            ORDER BY greatest(coalesce(result_bytes, 0), coalesce(peak_traced_bytes, 0)) DESC
+            LIMIT 50
+            """
+        ).df()
+    except Exception as e:
+        st.error(f"{type(e).__name__}: {e}")
+        return
+    if heavy.empty:
+        st.info("No per-request memory data yet.")
+    else:
+        st.dataframe(heavy, width="stretch", hide_index=True)
+
+
+def main():
+    st.set_page_config(page_title="Admin", layout="wide")
+    st.title("🛠 Admin")
+
+    if not is_admin():
+        st.warning("Admin access required.")
+        st.stop()
+
+    tab_memory, tab_slow, tab_profiles = st.tabs(["Memory", "Slow queries", "Profiles"])
+    with tab_memory:
+        memory_tab()
+    with tab_slow:
+        slow_queries_tab()
+    with tab_profiles:
+        profiles_tab()
+
+
+main()
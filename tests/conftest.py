@@ -0,0 +1,22 @@
+from __future__ import annotations
+
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+# тесты идут на локальном snapshot из репозитория (без Google Drive)
+os.environ.setdefault("SNAPSHOT_PATH", str(BASE_DIR / "offline_data" / "T_Local_Snapshot.csv"))
+
+
+@pytest.fixture(scope="session")
+def store():
+    """Локальный snapshot, загруженный со всеми ingest-шагами."""
+    from core import db_utils
+
+    return db_utils.load_snapshot()
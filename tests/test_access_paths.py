@@ -0,0 +1,99 @@
+"""
+Пути выполнения snapshot-запроса дают те же строки, что и сам DuckDB SQL:
+свёртка словарных колонок (dict_codes.fold), выборка по индексам
+(sql_rewrite.plan + store.fetch) — на всём корпусе запросов из logs/.
+"""
+from pathlib import Path
+
+import pyarrow as pa
+import pytest
+
+from core import db_utils, dict_codes, sql_rewrite
+from core.snapshot_store import TABLE
+from filters import date_filter
+
+LOG_DIR = Path(__file__).resolve().parent.parent / "logs"
+
+# полнотекстовых запросов в логе пока нет
+EXTRA_QUERIES = (
+    "description contains heart",
+    "description contains lab grown",
+    "description contains \"1.00RBC\" or cross",
+    "description contains stud earrings, closed",
+    "description contains (stud or hoop) and not lab",
+)
+
+
+@pytest.fixture(scope="module")
+def corpus(store):
+    """DuckDB SQL всех различных запросов лога (день — как в логе) и EXTRA_QUERIES."""
+    from bench.replay import _freeze_today, load_cases
+    from core.ai_filter_router import ai_parse_query
+
+    today = date_filter._today
+    sqls = set()
+    try:
+        for case in load_cases(LOG_DIR):
+            _freeze_today(case["today"])
+            sql = ai_parse_query(case["query"])
+            if sql.startswith("SELECT"):
+                sqls.add(db_utils._access_sql_to_duckdb(sql))
+    finally:
+        date_filter._today = today
+    sqls.update(db_utils._access_sql_to_duckdb(ai_parse_query(q)) for q in EXTRA_QUERIES)
+    assert len(sqls) > 100
+    return sorted(sqls)
+
+
+def _row_ids(store, sql: str):
+    """Строки таблицы, которые выбирает sql (по rowid)."""
+    cur = store.cursor()
+    try:
+        where = sql_rewrite.where_clause(sql)
+        return cur.execute(f"SELECT count(*), sum(hash(rowid))::HUGEINT FROM {TABLE} WHERE {where}").fetchone()
+    finally:
+        cur.close()
+
+
+def _digest(store, rel) -> tuple:
+    """(число строк, сумма хэшей строк): мультимножество строк без порядка и типов колонок."""
+    row = ", ".join(f'CAST("{c}" AS VARCHAR)' for c in store.columns)
+    return rel.aggregate(f"count(*), sum(hash(row({row})))::HUGEINT").fetchone()
+
+
+def _same_rows(store, df, sql: str) -> bool:
+    cur = store.cursor()
+    try:
+        got = _digest(store, cur.from_arrow(pa.Table.from_pandas(df, preserve_index=False)))
+        return got == _digest(store, cur.sql(store.visible_sql(sql)))
+    finally:
+        cur.close()
+
+
+def test_dict_fold_same_rows(store, corpus):
+    folded = 0
+    for sql in corpus:
+        got = dict_codes.fold(sql, store)
+        if got != sql:
+            folded += 1
+            assert _row_ids(store, got) == _row_ids(store, sql), sql
+    assert folded
+
+
+def test_index_plan_same_rows(store, corpus):
+    planned = 0
+    for sql in corpus:
+        plan = sql_rewrite.plan(sql, store)
+        if plan is None:
+            continue
+        planned += 1
+        df = store.fetch(plan.row_ids, dict_codes.fold_where(plan.where, store))
+        assert _same_rows(store, df, sql), sql
+    assert planned
+
+
+def test_run_on_snapshot_same_rows(store, corpus):
+    """Весь путь db_utils (план, свёртка, кэш результатов) — на части корпуса."""
+    for sql in corpus[::10]:
+        df = db_utils._run_on_snapshot(sql, sql, store.path, store.sha)
+        assert _same_rows(store, df, sql), sql
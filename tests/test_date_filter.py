@@ -0,0 +1,69 @@
+from datetime import date
+
+import pytest
+
+from filters import date_filter
+from filters.date_filter import parse_date_range
+
+TODAY = date(2026, 10, 19)  # понедельник
+
+
+@pytest.fixture(autouse=True)
+def _pin_today(monkeypatch):
+    monkeypatch.setattr(date_filter, "_today", lambda: TODAY)
+
+
+def _d(s: str) -> date:
+    return date.fromisoformat(s)
+
+
+@pytest.mark.parametrize(
+    "query, start, end, rest",
+    [
+        # прежние формы
+        ("shipped last 7 days", "2026-10-13", "2026-10-19", "shipped"),
+        ("last 3 months", "2026-07-01", "2026-09-30", ""),
+        ("from 01/05/2026 to 02/10/2026", "2026-01-05", "2026-02-10", ""),
+        ("from march to may", "2026-03-01", "2026-05-31", ""),
+        ("from 09/01/2026 to date", "2026-09-01", "2026-10-19", ""),
+        ("from june to date", "2026-06-01", "2026-10-19", ""),
+        ("sep and oct casting", "2026-09-01", "2026-10-31", "casting"),
+        ("until 03/15/2026", None, "2026-03-15", ""),
+        ("till 03/15/26", None, "2026-03-15", ""),
+        ("may", "2026-05-01", "2026-05-31", ""),
+        ("orders 2025", "2025-01-01", "2025-12-31", "orders"),
+        ("12/03/2025", "2025-12-03", "2025-12-03", ""),
+        ("last week", "2026-10-12", "2026-10-18", ""),
+        ("this week", "2026-10-19", "2026-10-25", ""),
+        ("yesterday", "2026-10-18", "2026-10-18", ""),
+        ("this month", "2026-10-01", "2026-10-31", ""),
+        ("last month", "2026-09-01", "2026-09-30", ""),
+        # месяц с годом
+        ("may 2024", "2024-05-01", "2024-05-31", ""),
+        ("shipped dec of 2025 rings", "2025-12-01", "2025-12-31", "shipped  rings"),
+        # кварталы и ISO-недели
+        ("q2 2025", "2025-04-01", "2025-06-30", ""),
+        ("first quarter", "2026-01-01", "2026-03-31", ""),
+        ("2nd quarter of 2025", "2025-04-01", "2025-06-30", ""),
+        ("quarter 3 2024", "2024-07-01", "2024-09-30", ""),
+        ("this quarter", "2026-10-01", "2026-12-31", ""),
+        ("last quarter", "2026-07-01", "2026-09-30", ""),
+        ("week 12", "2026-03-16", "2026-03-22", ""),
+        ("wk 53 2026", "2026-12-28", "2027-01-03", ""),
+        # не даты: karat, номер style, число после "last week"
+        ("10k gold week 14", "2026-03-30", "2026-04-05", "10k gold"),
+        ("style 4710 q3", "2026-07-01", "2026-09-30", "style 4710"),
+        ("last week 5", "2026-10-12", "2026-10-18", "5"),
+    ],
+)
+def test_forms(query, start, end, rest):
+    got = parse_date_range(query)
+    assert got == (start and _d(start), end and _d(end), rest)
+
+
+@pytest.mark.parametrize(
+    "query",
+    ["rings size 7 week 14kt", "week 60", "last 0 days", "style 4710", "gold rings"],
+)
+def test_not_a_date(query):
+    assert parse_date_range(query) == (None, None, query)
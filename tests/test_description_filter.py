@@ -0,0 +1,78 @@
+import re
+from datetime import date
+
+import pytest
+
+from filters import date_filter
+from filters.description_filter import parse_description_filter
+
+
+def _terms(sql: str) -> list[str]:
+    return re.findall(r"LIKE '%(.*?)%'", sql)
+
+
+@pytest.mark.parametrize(
+    "query, terms, rest",
+    [
+        ("description contains rbc casting today", ["RBC"], "casting today"),
+        ("description contains heart, shipped last week", ["HEART"], "shipped last week"),
+        ("closed this month description contains stud earrings", ["STUD", "EARRINGS"], "closed this month"),
+        ("description contains lab grown size 7", ["LAB", "GROWN"], "size 7"),
+        ('description contains "casting grain" today', ["CASTING GRAIN"], "today"),
+        ("description contains sodium", ["SODIUM"], ""),
+    ],
+)
+def test_expression_stops_at_other_filters(query, terms, rest):
+    sql, left = parse_description_filter(query)
+    assert _terms(sql) == terms
+    assert left == rest
+
+
+def test_boolean_expression():
+    sql, _ = parse_description_filter("description contains (stud or hoop) and not lab due this week")
+    assert sql == (
+        " AND ((UCase(LTrim(RTrim([description]))) LIKE '%STUD%') OR (UCase(LTrim(RTrim([description]))) LIKE '%HOOP%'))"
+        " AND NOT (UCase(LTrim(RTrim([description]))) LIKE '%LAB%')"
+    )
+
+
+def test_no_keyword():
+    assert parse_description_filter("casting today") == ("", "casting today")
+
+
+def test_other_filters_apply(store, monkeypatch):
+    from core.ai_filter_router import ai_parse_query
+    from core.db_utils import execute_access_query
+
+    monkeypatch.setattr(date_filter, "_today", lambda: date(2025, 11, 6))
+    casting = execute_access_query(ai_parse_query("casting today"))
+    got = execute_access_query(ai_parse_query("description contains rbc casting today"))
+    want = casting[casting["description"].astype(str).str.strip().str.upper().str.contains("RBC", regex=False)]
+    assert len(got) > 0
+    assert sorted(got["JobNumber"].astype(str)) == sorted(want["JobNumber"].astype(str))
+
+
+def test_wildcards_are_literal():
+    sql, _ = parse_description_filter("description contains 10% a_b [x]")
+    assert _terms(sql) == ["10[%]", "A[_]B", "[[]X]"]
+
+
+@pytest.mark.parametrize(
+    "term, like",
+    [
+        ("marcus_sadie", "MARCUS_SADIE"),   # _ — сам символ
+        ("s_die", None),                    # подстановкой совпало бы с SADIE
+        ("10%", None),                      # % — не "10 и что угодно"
+    ],
+)
+def test_wildcards_on_snapshot(store, term, like):
+    from core.db_utils import execute_access_query
+
+    got = execute_access_query(
+        "SELECT * FROM [T_Local_Snapshot] WHERE 1=1" + parse_description_filter(f"description contains {term}")[0]
+    )
+    desc = store.query("SELECT * FROM T_Local_Snapshot")["description"].astype(str).str.strip().str.upper()
+    want = desc.str.contains(term.upper(), regex=False).sum()
+    assert len(got) == want
+    if like:
+        assert len(got) > 0 and got["description"].astype(str).str.upper().str.contains(like, regex=False).all()
@@ -0,0 +1,51 @@
+import pandas as pd
+
+from core import dict_codes
+from core.dict_codes import _Fold, _columns, _in_list
+
+
+def test_columns_ignore_literals():
+    assert _columns("upper(trim(\"metal\")) LIKE '\"pstatus\"%'") == {"metal"}
+    assert _columns('"metal" = "pstatus"') == {"metal", "pstatus"}
+
+
+def test_in_list():
+    got = _Fold([1, 3], ["10WG", "O'X"], null=False)
+    assert _in_list("metal", got, by_code=True) == 'enum_code("metal") IN (1, 3)'
+    assert _in_list("metal", got, by_code=False) == "\"metal\" IN ('10WG', 'O''X')"
+    assert _in_list("metal", _Fold([], [], null=True), by_code=True) == '"metal" IS NULL'
+    assert _in_list("metal", _Fold([], [], null=False), by_code=True) == "false"
+    assert _in_list("metal", _Fold([2], ["SLV"], null=True), by_code=False) == "(\"metal\" IS NULL OR \"metal\" IN ('SLV'))"
+
+
+def test_fold_metal_predicates(store):
+    like = " OR ".join(f"upper(trim(\"metal\")) LIKE '{k}%'" for k in ("10Y", "14Y", "18Y"))
+    sql = f"SELECT * FROM T_Local_Snapshot WHERE 1=1 AND ({like}) AND \"pdate\" IS NOT NULL"
+    folded = dict_codes.fold(sql, store)
+    assert "LIKE" not in folded
+    assert 'enum_code("metal") IN (' in folded and '"pdate" IS NOT NULL' in folded
+    where = dict_codes.fold_where(f"1=1 AND ({like})", store)
+    assert where.startswith('("metal" IN (') and "'14YG'" in where
+
+
+def test_fold_leaves_other_sql(store):
+    sql = "SELECT count(*) FROM T_Local_Snapshot WHERE \"metal\" = 'SLV'"
+    assert dict_codes.fold(sql, store) == sql
+    where = "upper(trim(\"metal\")) = 'SLV' OR \"pdate\" IS NULL"
+    assert dict_codes.fold_where(where, store) == where
+
+
+def test_snapshot_columns_are_enums(store):
+    types = dict(store.cursor().execute("SELECT column_name, column_type FROM (DESCRIBE T_Local_Snapshot)").fetchall())
+    for column in dict_codes.CODED_COLUMNS:
+        assert types[column].startswith("ENUM("), column
+    df = store.query("SELECT * FROM T_Local_Snapshot LIMIT 5")
+    assert all(isinstance(df[c].dtype, pd.CategoricalDtype) for c in dict_codes.CODED_COLUMNS)
+
+
+def test_categorize():
+    df = pd.DataFrame({"metal": ["SLV", "10YG"], "rows": [1, 2]})
+    got = dict_codes.categorize(df)
+    assert isinstance(got["metal"].dtype, pd.CategoricalDtype)
+    assert got["rows"].dtype == df["rows"].dtype
+    assert dict_codes.categorize(got) is got
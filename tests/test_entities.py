@@ -0,0 +1,54 @@
+"""
+Словари сущностей: trie находит значения в тексте запроса целыми словами,
+EntityDict — значения snapshot плюс seed.
+"""
+import pytest
+
+from core import entities
+
+KEYS = ("RING", "RINGS", "STONE REJECT", "STONE", "GOLD CONTROL")
+
+
+@pytest.fixture(scope="module")
+def trie():
+    return entities.Trie(KEYS)
+
+
+def test_exact_match(trie):
+    assert trie.scan("RING") == [(0, 4, "RING")]
+    assert trie.scan("GOLD RINGS") == [(5, 10, "RINGS")]
+
+
+def test_multi_word_match(trie):
+    text = "JOBS AT STONE REJECT TODAY"
+    # длинное значение и его префикс-слово — оба, по start и длине
+    assert trie.scan(text) == [(8, 13, "STONE"), (8, 20, "STONE REJECT")]
+    assert trie.scan("SENT TO GOLD CONTROL") == [(8, 20, "GOLD CONTROL")]
+
+
+@pytest.mark.parametrize("text", ["EARRINGS", "RINGSIDE", "STONES REJECTED", "GOLD CONTROLS", "CASTING", ""])
+def test_no_match_inside_words(trie, text):
+    assert trie.scan(text) == []
+
+
+def test_occurring_ignores_word_bounds(trie):
+    assert trie.occurring("EARRINGS") == {"RING", "RINGS"}
+    assert trie.occurring("GOLD CONTROLS") == {"GOLD CONTROL"}
+    assert trie.occurring("PLATINUM") == set()
+
+
+def test_entity_dict():
+    d = entities.EntityDict([" stone reject ", "Wain", "", None, "WAIN"])
+    assert d.values == ("STONE REJECT", "WAIN")
+    assert "wain " in d and "Stone Reject" in d
+    assert "STONE" not in d and "WAINS" not in d
+    assert d.find("AT WAIN AND STONE REJECT") == [(3, 7, "WAIN"), (12, 24, "STONE REJECT")]
+
+
+def test_snapshot_values_and_seed(store):
+    assert "ASSEMBLY IN" in entities.values("LastOperation", store)
+    assert "CANADA" in entities.values("order_grp", store)
+    d = entities.entity("item_type", ("NOT IN SNAPSHOT",))
+    assert "EARRING" in d and "NOT IN SNAPSHOT" in d
+    # одна структура на snapshot
+    assert entities.entity("item_type", ("NOT IN SNAPSHOT",)) is d
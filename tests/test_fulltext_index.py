@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from core import sql_rewrite
+from core.fulltext_index import FullTextIndex, compress, decompress
+
+
+def _scan(index: FullTextIndex, text: str) -> np.ndarray:
+    return np.asarray([d for d, key in enumerate(index.values.keys) if text in key], dtype=np.int64)
+
+
+def test_compress_roundtrip():
+    slots = np.asarray([0, 3, 300, 70000], dtype=np.int64)
+    packed = compress(slots)
+    assert packed.dtype == np.uint32
+    assert decompress(packed).tolist() == slots.tolist()
+
+
+@pytest.mark.parametrize("text", ["RBC", "RING", "EARRINGS", "LAB", "2=1", "1.50RBC", ".", "ZZZ", "LAB GROWN", "STUD EARRING"])
+def test_docs_match_substring_scan(store, text):
+    index = store.extras["fulltext_index"]
+    assert index.docs(text).tolist() == _scan(index, text).tolist()
+
+
+def test_every_token_and_its_parts(store):
+    index = store.extras["fulltext_index"]
+    for token in index.tokens[::7]:
+        for term in {token, token[:3], token[1:4], token[-2:]}:
+            if term:
+                assert index.term_docs(term).tolist() == _scan(index, term).tolist(), term
+
+
+def test_lookup_leaves_wildcards_to_like(store):
+    index = store.extras["fulltext_index"]
+    assert index.lookup(sql_rewrite.Atom("description", "LIKE", ("%RB_C%",))) is None
+    assert index.lookup(sql_rewrite.Atom("description", "LIKE", ("RBC%",))) is None
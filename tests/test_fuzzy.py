@@ -0,0 +1,47 @@
+import pytest
+
+from core import fuzzy
+from filters.last_operation_filter import parse_last_operation_filter
+
+
+@pytest.mark.parametrize(
+    "query, op",
+    [
+        ("seting in", "SETTING IN"),
+        ("seting out", "SETTING OUT"),
+        ("setng in", "SETTING IN"),
+        ("casting seting in today", "SETTING IN"),
+        ("wax seting in", "WAX SETING IN"),
+    ],
+)
+def test_operation_phrase_typos(query, op):
+    assert parse_last_operation_filter(query) == f" AND UCase(LTrim(RTrim([LastOperation]))) IN ('{op}')"
+
+
+def test_negated_phrase_typo():
+    assert "NOT IN ('SETTING OUT')" in parse_last_operation_filter("not seting out")
+
+
+def test_short_words_are_not_phrase_typos():
+    assert parse_last_operation_filter("wax on") == ""
+
+
+def test_phrase_resolver_needs_unique_key():
+    r = fuzzy.PhraseResolver(["setting in", "setting on", "sorting in"])
+    assert r.resolve("seting in") == "setting in"
+    assert r.resolve("setting in") is None  # уже ключ
+    assert r.resolve("setting an") is None  # отличается короткое слово
+
+
+def test_osa_distance():
+    assert fuzzy.osa_distance("seting", "setting", 2) == 1
+    assert fuzzy.osa_distance("laping", "lapping", 2) == 1
+    assert fuzzy.osa_distance("abcd", "badc", 2) == 2
+    assert fuzzy.osa_distance("abc", "xyzabc", 2) == 3
+
+
+def test_resolver_keeps_protected_and_plural_words():
+    r = fuzzy.Resolver(["plating", "samples"], protected=frozenset({"platinum"}))
+    assert r.resolve("platinum") is None
+    assert r.resolve("sample") is None
+    assert r.resolve("platng") == "plating"
@@ -0,0 +1,73 @@
+import gzip
+import json
+import os
+from datetime import datetime
+
+from core import log_ingest
+
+LEGACY = (
+    "2025-12-01 16:03:39\tRUN_OK\tquery='gold rings'\trows=109\tlayout=received\t"
+    "sql='SELECT * FROM [T_Local_Snapshot] WHERE 1=1'\terror=''\n"
+)
+
+
+def _json_line(event: str, rows: int) -> str:
+    rec = {"ts": "2025-12-02T10:00:00.000", "event": event, "query": "q", "rows": rows,
+           "timings_ms": {"parse": 1.5, "execute": 20.0}, "memory": {"result_bytes": 100}}
+    return json.dumps(rec) + "\n"
+
+
+def test_parse_legacy_line():
+    rec = log_ingest.parse_legacy_line(LEGACY, "ai_usage_log.txt")
+    assert rec["ts"] == datetime(2025, 12, 1, 16, 3, 39)
+    assert (rec["event"], rec["query"], rec["rows"], rec["layout"]) == ("RUN_OK", "gold rings", 109, "received")
+    assert rec["sql"].startswith("SELECT")
+    assert log_ingest.parse_legacy_line("garbage\n", "x") is None
+
+
+def test_parse_json_line():
+    rec = log_ingest.parse_json_line(_json_line("RUN_OK", 7), "ai_usage_log.jsonl")
+    assert (rec["event"], rec["rows"], rec["parse_ms"], rec["execute_ms"], rec["result_bytes"]) == ("RUN_OK", 7, 1.5, 20.0, 100)
+    assert rec["render_ms"] is None
+    assert log_ingest.parse_json_line("{not json", "x") is None
+    assert log_ingest.parse_json_line('{"event": "X"}', "x") is None
+
+
+def _count(con) -> int:
+    return con.execute("SELECT count(*) FROM usage_events").fetchone()[0]
+
+
+def test_ingest_is_incremental(tmp_path):
+    (tmp_path / "ai_usage_log.txt").write_text(LEGACY, encoding="utf-8")
+    live = tmp_path / "ai_usage_log.jsonl"
+    live.write_text(_json_line("PARSE_OK", 0) + _json_line("RUN_OK", 1), encoding="utf-8")
+    con = log_ingest.connect(tmp_path / "usage.duckdb")
+    try:
+        assert log_ingest.ingest(con, tmp_path) == 3
+        assert log_ingest.ingest(con, tmp_path) == 0
+
+        # недописанная строка ждёт следующего запуска
+        with open(live, "a", encoding="utf-8") as fh:
+            fh.write(_json_line("RUN_OK", 2).rstrip("\n"))
+        assert log_ingest.ingest(con, tmp_path) == 0
+        with open(live, "a", encoding="utf-8") as fh:
+            fh.write("\n")
+        assert log_ingest.ingest(con, tmp_path) == 1
+
+        # ротация текущего файла в .gz не даёт дублей
+        data = live.read_bytes()
+        with gzip.open(tmp_path / "ai_usage_log.20251202-100000.jsonl.gz", "wb") as fh:
+            fh.write(data)
+        os.remove(live)
+        live.write_text(_json_line("RUN_OK", 3), encoding="utf-8")
+        assert log_ingest.ingest(con, tmp_path) == 1
+        assert _count(con) == 5
+        assert con.execute("SELECT sum(rows) FROM usage_events WHERE event = 'RUN_OK'").fetchone()[0] == 1 + 2 + 3 + 109
+    finally:
+        con.close()
+
+
+def test_iter_log_records(tmp_path):
+    (tmp_path / "ai_usage_log.txt").write_text(LEGACY, encoding="utf-8")
+    (tmp_path / "ai_usage_log.jsonl").write_text(_json_line("RUN_OK", 1), encoding="utf-8")
+    assert [r["source"] for r in log_ingest.iter_log_records(tmp_path)] == ["ai_usage_log.txt", "ai_usage_log.jsonl"]
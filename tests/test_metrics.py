@@ -0,0 +1,54 @@
+import pytest
+
+from core.metrics import Counter, Gauge, Histogram, Registry, _Metric
+
+
+def test_metric_is_abstract():
+    with pytest.raises(TypeError):
+        _Metric("x", "help")
+
+
+def test_counter_render():
+    c = Counter("app_queries_total", "Queries", ("layout",))
+    c.inc(layout="casting")
+    c.inc(2, layout="casting")
+    c.inc(layout='a"b')
+    assert c.render() == [
+        "# HELP app_queries_total Queries",
+        "# TYPE app_queries_total counter",
+        'app_queries_total{layout="a\\"b"} 1',
+        'app_queries_total{layout="casting"} 3',
+    ]
+    with pytest.raises(ValueError):
+        c.inc(stage="x")
+
+
+def test_gauge_render():
+    g = Gauge("app_ready", "Ready")
+    g.set(0.5)
+    assert g.render()[1:] == ["# TYPE app_ready gauge", "app_ready 0.5"]
+    g.set_function(lambda: 1.0)
+    assert g.render()[-1] == "app_ready 1"
+
+
+def test_histogram_render():
+    h = Histogram("app_stage_seconds", "Stage time", ("stage",), buckets=(0.1, 1.0))
+    for v in (0.05, 0.5, 0.7, 3.0):
+        h.observe(v, stage="execute")
+    assert h.render() == [
+        "# HELP app_stage_seconds Stage time",
+        "# TYPE app_stage_seconds histogram",
+        'app_stage_seconds_bucket{stage="execute",le="0.1"} 1',
+        'app_stage_seconds_bucket{stage="execute",le="1"} 3',
+        'app_stage_seconds_bucket{stage="execute",le="+Inf"} 4',
+        'app_stage_seconds_sum{stage="execute"} 4.25',
+        'app_stage_seconds_count{stage="execute"} 4',
+    ]
+
+
+def test_registry_keeps_first_metric():
+    reg = Registry()
+    first = reg.counter("app_x_total", "X")
+    assert reg.counter("app_x_total", "X") is first
+    first.inc()
+    assert reg.render() == "# HELP app_x_total X\n# TYPE app_x_total counter\napp_x_total 1\n"
@@ -0,0 +1,98 @@
+import threading
+import time
+
+import duckdb
+import pytest
+
+from core import query_jobs
+from core.query_jobs import JobSlot, QueryCancelled, QueryJob, QueryTimeout
+
+# запрос DuckDB на доли секунды; _slow_query повторяет его до отмены
+STEP_SQL = "SELECT count(*) FROM range(30000000) t(i) WHERE i % 7 = 3"
+
+
+def _slow_query(started: threading.Event | None = None):
+    """Долгий запрос: cancel() прерывает текущий шаг или его ловит check_cancelled."""
+    con = duckdb.connect()
+    cur = con.cursor()
+    with query_jobs.track(cur):
+        if started is not None:
+            started.set()
+        for _ in range(200):
+            cur.execute(STEP_SQL).fetchall()
+            query_jobs.check_cancelled()
+    return "finished"
+
+
+def _wait(job: QueryJob, seconds: float = 10):
+    deadline = time.time() + seconds
+    while not job.done() and time.time() < deadline:
+        time.sleep(0.01)
+    assert job.done()
+
+
+def test_result():
+    job = query_jobs.submit(QueryJob("k", lambda a, b: a + b, 2, 3))
+    assert job.result(5) == 5
+
+
+def test_error_passes_through():
+    def boom():
+        raise ValueError("x")
+
+    job = query_jobs.submit(QueryJob("k", boom))
+    with pytest.raises(ValueError):
+        job.result(5)
+
+
+def test_cancel():
+    started = threading.Event()
+    job = query_jobs.submit(QueryJob("k", _slow_query, started, timeout=0))
+    assert started.wait(5)
+    assert job.cancel()
+    _wait(job)
+    with pytest.raises(QueryCancelled) as e:
+        job.result(0)
+    assert not isinstance(e.value, QueryTimeout)
+    assert not job.cancel()
+
+
+def test_timeout():
+    job = query_jobs.submit(QueryJob("k", _slow_query, timeout=0.2))
+    _wait(job)
+    with pytest.raises(QueryTimeout):
+        job.result(0)
+
+
+def test_check_cancelled():
+    query_jobs.check_cancelled()  # вне задачи — ничего
+    assert not query_jobs.cancelled()
+    seen = threading.Event()
+
+    def loop():
+        while True:
+            seen.set()
+            query_jobs.check_cancelled()
+            time.sleep(0.01)
+
+    job = query_jobs.submit(QueryJob("k", loop, timeout=0))
+    assert seen.wait(5)
+    job.cancel()
+    _wait(job)
+    with pytest.raises(QueryCancelled):
+        job.result(0)
+
+
+def test_slot_replaces_previous_job():
+    slot = JobSlot()
+    started = threading.Event()
+    first = slot.submit("a", _slow_query, started, timeout=0)
+    assert started.wait(5)
+    second = slot.submit("b", lambda: "done")
+    assert second.result(5) == "done"
+    _wait(first)
+    with pytest.raises(QueryCancelled):
+        first.result(0)
+    assert slot.pending("b") is second and slot.pending("a") is None
+    slot.release(second)
+    assert slot.job is None
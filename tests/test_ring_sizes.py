@@ -0,0 +1,64 @@
+import duckdb
+import pytest
+
+from core import ring_sizes
+from filters.item_size_filter import parse_item_size_filter
+
+
+@pytest.mark.parametrize(
+    "value, us",
+    [
+        ("6.5", 6.5),
+        ("M-6.5", 6.5),
+        ("G.5 - 3.75", 3.75),
+        ("Q.5-8.5", 8.5),
+        ("M", 6.5),
+        ("G.5", 3.75),
+        ("P", 7.75),
+        ("0", None),
+        ("", None),
+        (None, None),
+    ],
+)
+def test_parse(value, us):
+    assert ring_sizes.parse(value) == us
+
+
+def test_range_filter_is_backend_neutral():
+    assert parse_item_size_filter("rings size 6 to 8") == " AND ([size_us] >= 6 AND [size_us] <= 8)"
+    assert parse_item_size_filter("size under M") == " AND ([size_us] < 6.5)"
+    assert "[size_us]" not in ring_sizes.to_access(parse_item_size_filter("size above 10"))
+
+
+# Access-функции выражения US_SIZE_ACCESS -> функции DuckDB: проверяем, что
+# Access считает размер по тому же правилу, что и ingest (parse)
+_ACCESS_FUNCS = {"IIf(": "if(", "InStr(": "instr(", "Mid(": "substr(", "Asc(": "ascii(", "UCase(": "upper(", "Trim(": "trim("}
+_VAL_MACRO = (
+    "CREATE MACRO Val(s) AS coalesce(TRY_CAST(nullif(trim(regexp_extract("
+    "regexp_replace(s, '\\s+', '', 'g'), '^[0-9]*\\.?[0-9]*'), '.'), '') AS DOUBLE), 0)"
+)
+
+
+def _access_in_duckdb(expr: str) -> str:
+    for access, duck in _ACCESS_FUNCS.items():
+        expr = expr.replace(access, duck)
+    expr = expr.replace(" & ", " || ")
+    expr = expr.replace("Like '[A-Z]'", "SIMILAR TO '[A-Za-z]'").replace("Like '[A-Z].5'", "SIMILAR TO '[A-Za-z]\\.5'")
+    return expr.replace("Like '*.5'", "LIKE '%.5'")
+
+
+def test_access_expression_matches_parse(store):
+    con = duckdb.connect()
+    con.execute(_VAL_MACRO)
+    values = [v for (v,) in store.cursor().execute('SELECT DISTINCT "item_size" FROM T_Local_Snapshot').fetchall()]
+    values += ["M", "G.5", "X.5", "0", "7A", "M-", " 6.5 "]
+    expr = _access_in_duckdb(ring_sizes.US_SIZE_ACCESS.format(f="v"))
+    got = dict(con.execute(f"SELECT v, {expr} FROM (SELECT unnest(?::VARCHAR[]) AS v)", [values]).fetchall())
+    for v in values:
+        assert got[v] == ring_sizes.parse(v), v
+
+
+def test_size_column_matches_parse(store):
+    rows = store.cursor().execute('SELECT DISTINCT CAST("item_size" AS VARCHAR), "size_us" FROM T_Local_Snapshot').fetchall()
+    for value, us in rows:
+        assert us == ring_sizes.parse(value), value
@@ -0,0 +1,85 @@
+import threading
+import time
+
+import pytest
+
+from core import query_jobs
+from core.query_jobs import QueryCancelled, QueryJob
+from core.single_flight import SingleFlight
+
+
+def _run_together(n: int, target) -> list:
+    out: list = [None] * n
+
+    def run(i):
+        try:
+            out[i] = target()
+        except Exception as e:
+            out[i] = e
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(10)
+    return out
+
+
+def test_followers_share_leader_result():
+    flight = SingleFlight("test")
+    calls = []
+    gate = threading.Event()
+
+    def work():
+        calls.append(1)
+        gate.wait(5)
+        return object()
+
+    def call():
+        return flight.do("k", work)
+
+    threading.Timer(0.3, gate.set).start()
+    got = _run_together(5, call)
+    assert len(calls) == 1
+    values = {id(v) for v, _ in got}
+    assert len(values) == 1
+    assert sorted(shared for _, shared in got) == [False, True, True, True, True]
+    assert flight.inflight() == 0
+
+
+def test_leader_error_reaches_followers():
+    flight = SingleFlight("test")
+    gate = threading.Event()
+
+    def boom():
+        gate.wait(5)
+        raise ValueError("x")
+
+    threading.Timer(0.3, gate.set).start()
+    got = _run_together(3, lambda: flight.do("k", boom))
+    assert all(isinstance(e, ValueError) for e in got)
+
+
+def test_cancelled_leader_hands_over():
+    flight = SingleFlight("test")
+    running = threading.Event()
+    calls = []
+
+    def work():
+        calls.append(1)
+        if len(calls) == 1:
+            running.set()
+            while True:  # лидер: ждёт, пока его отменят
+                query_jobs.check_cancelled()
+                time.sleep(0.01)
+        return "follower"
+
+    leader = query_jobs.submit(QueryJob("a", flight.do, "k", work, timeout=0))
+    assert running.wait(5)
+    follower = query_jobs.submit(QueryJob("b", flight.do, "k", work, timeout=0))
+    time.sleep(0.2)
+    leader.cancel()
+    with pytest.raises(QueryCancelled):
+        leader.result(5)
+    assert follower.result(5) == ("follower", False)
+    assert len(calls) == 2
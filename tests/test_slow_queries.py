@@ -0,0 +1,70 @@
+"""
+Slow-query log: EXPLAIN ANALYZE снимается с того, что реально выполнялось —
+свёрнутого SQL (скан) или фильтра по строкам-кандидатам (индекс).
+"""
+from collections import OrderedDict
+
+import pytest
+
+from core import db_utils, dict_codes, memory, sql_rewrite
+
+SCAN_SQL = "SELECT * FROM T_Local_Snapshot WHERE 1=1 AND (upper(trim(\"metal\")) = '14KT' OR upper(trim(\"metal\")) = '10KT')"
+INDEX_SQL = "SELECT * FROM T_Local_Snapshot WHERE 1=1 AND (upper(trim(\"description\")) LIKE '%HEART%')"
+
+
+@pytest.fixture
+def slow_log(store, tmp_path, monkeypatch):
+    """Каждый запрос — медленный, лог во временном файле; возвращает функцию записи."""
+    monkeypatch.setattr(db_utils, "SLOW_QUERY_MS", 0.0)
+    monkeypatch.setattr(db_utils, "SLOW_QUERY_LOG", tmp_path / "slow_queries.jsonl")
+    monkeypatch.setattr(db_utils, "_slow_seen", OrderedDict())
+    monkeypatch.setattr(db_utils, "_slow_pool", None)
+
+    def run(duck_sql: str) -> dict:
+        memory.clear_caches(("results",))
+        db_utils._run_on_snapshot("", duck_sql, store.path, store.sha)
+        db_utils._slow_pool.shutdown(wait=True)
+        db_utils._slow_pool = None
+        records = db_utils.read_slow_queries()
+        assert len(records) == 1
+        return records[0]
+
+    return run
+
+
+def test_scan_path_explains_folded_sql(store, slow_log):
+    assert sql_rewrite.plan(SCAN_SQL, store) is None
+    rec = slow_log(SCAN_SQL)
+    assert rec["path"] == "scan"
+    assert rec["executed_sql"] == dict_codes.fold(SCAN_SQL, store)
+    assert rec["executed_sql"] != SCAN_SQL
+    assert "error" not in rec
+    assert "ARROW_SCAN" not in rec["plan"]
+
+
+def test_index_path_explains_candidate_filter(store, slow_log):
+    plan = sql_rewrite.plan(INDEX_SQL, store)
+    assert plan is not None
+    rec = slow_log(INDEX_SQL)
+    assert rec["path"] == "index"
+    assert rec["indexes"] == list(plan.indexes)
+    assert rec["candidates"] == len(plan.row_ids)
+    assert "candidate_rows" in rec["executed_sql"]
+    # фильтр шёл по Arrow-копии строк-кандидатов, а не сканом таблицы
+    assert "ARROW_SCAN" in rec["plan"]
+    assert "error" not in rec
+
+
+def test_seen_is_bounded(store, monkeypatch):
+    monkeypatch.setattr(db_utils, "_slow_seen", OrderedDict())
+    monkeypatch.setattr(db_utils, "_SLOW_SEEN_MAX", 3)
+    monkeypatch.setattr(db_utils, "_SLOW_MAX_PENDING", 100)
+    monkeypatch.setattr(db_utils, "_slow_pending", 0)
+    monkeypatch.setattr(db_utils, "_slow_pool", None)
+    monkeypatch.setattr(db_utils, "_explain_and_store", lambda *a, **k: None)
+    for i in (0, 1, 2, 0, 3, 4):
+        db_utils._capture_slow_query("", f"SELECT {i}", f"SELECT {i}", None, store.path, store.sha, 1.0, 0)
+    db_utils._slow_pool.shutdown(wait=True)
+    monkeypatch.setattr(db_utils, "_slow_pool", None)
+    # повторный SELECT 0 освежил ключ — вытеснены SELECT 1 и SELECT 2
+    assert list(db_utils._slow_seen) == [(f"SELECT {i}", store.sha) for i in (0, 3, 4)]
@@ -0,0 +1,46 @@
+import numpy as np
+
+from core import sql_rewrite
+from core.sql_rewrite import Atom, like_prefix, parse_atom, split_top, strip_parens
+
+
+def test_split_top_skips_literals_and_parens():
+    expr = "a = 'x AND y' AND (b OR c) AND d"
+    assert split_top(expr, "AND") == ["a = 'x AND y'", "(b OR c)", "d"]
+    assert split_top("(b OR c)", "OR") == ["(b OR c)"]
+
+
+def test_strip_parens():
+    assert strip_parens("((a OR b))") == "a OR b"
+    assert strip_parens("(a) AND (b)") == "(a) AND (b)"
+    assert strip_parens("(a = ')')") == "a = ')'"
+
+
+def test_parse_atom():
+    assert parse_atom("upper(trim(\"style\")) = 'R''1'") == Atom("style", "=", ("R'1",))
+    assert parse_atom("(upper(trim(\"style\")) LIKE '%ABC%')") == Atom("style", "LIKE", ("%ABC%",))
+    assert parse_atom("upper(trim(\"JobNumber\")) IN ('1', '2')") == Atom("JobNumber", "=", ("1", "2"))
+    assert parse_atom("upper(trim(\"JobNumber\")) IN ('1', \"x\")") is None
+    assert parse_atom("\"rows\" > 3") is None
+
+
+def test_like_prefix():
+    assert like_prefix("ABC%") == "ABC"
+    assert like_prefix("AB_C%") == "AB"
+    assert like_prefix("%ABC") == ""
+
+
+def test_where_clause():
+    assert sql_rewrite.where_clause("SELECT * FROM T_Local_Snapshot WHERE 1=1 AND x;") == "1=1 AND x"
+    assert sql_rewrite.where_clause("SELECT count(*) FROM T_Local_Snapshot WHERE 1=1") is None
+
+
+def test_plan_combines_candidates(store):
+    job = store.cursor().execute('SELECT upper(trim("JobNumber")) FROM T_Local_Snapshot LIMIT 1').fetchone()[0]
+    eq = f"upper(trim(\"JobNumber\")) = '{job}'"
+    plan = sql_rewrite.plan(f"SELECT * FROM T_Local_Snapshot WHERE 1=1 AND ({eq})", store)
+    assert plan is not None and "id_index" in plan.indexes
+    assert len(plan.row_ids) >= 1 and np.all(np.diff(plan.row_ids) > 0)
+    # NOT и OR с непокрытой веткой индекс не сужает
+    assert sql_rewrite.plan(f"SELECT * FROM T_Local_Snapshot WHERE NOT ({eq})", store) is None
+    assert sql_rewrite.plan(f"SELECT * FROM T_Local_Snapshot WHERE ({eq}) OR \"pdate\" IS NULL", store) is None
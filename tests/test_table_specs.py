@@ -0,0 +1,47 @@
+"""
+Каждый зарегистрированный TableSpec находит свои колонки в схеме snapshot:
+requires и колонки агрегатов есть в результате запроса, агрегаты считаются,
+таблица строится.
+"""
+import pytest
+
+from ui import layout_engine
+from ui.table_registry import _specs
+
+SPEC_IDS = sorted(_specs)
+LAYOUTS = sorted({s.layout for s in _specs.values()})
+
+
+@pytest.fixture(scope="module")
+def result(store):
+    """Результат запроса по snapshot — те же колонки, что видит layout."""
+    return store.query("SELECT * FROM T_Local_Snapshot")
+
+
+def test_registry_not_empty():
+    assert "default" in LAYOUTS and len(SPEC_IDS) >= len(LAYOUTS)
+
+
+@pytest.mark.parametrize("spec_id", SPEC_IDS)
+def test_columns_in_schema(store, result, spec_id):
+    spec = _specs[spec_id]
+    assert set(result.columns) == set(store.columns)
+    assert spec.requires <= set(store.columns), spec.requires - set(store.columns)
+    for agg in spec.aggregates:
+        assert agg.columns <= set(store.columns), agg.columns - set(store.columns)
+
+
+@pytest.mark.parametrize("spec_id", SPEC_IDS)
+def test_aggregates_run(result, spec_id):
+    spec = _specs[spec_id]
+    frames = layout_engine.run_batch(result, list(spec.aggregates))
+    for agg in spec.aggregates:
+        assert list(frames[agg].columns) == list(agg.keys) + [name for name, _ in agg.measures]
+
+
+@pytest.mark.parametrize("layout", LAYOUTS)
+def test_layout_builds(result, layout):
+    prepared = layout_engine.prepare("", result, layout)
+    assert prepared.specs and prepared.missing == set()
+    for spec in prepared.specs:
+        prepared.table(spec)
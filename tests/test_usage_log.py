@@ -0,0 +1,42 @@
+import gzip
+import json
+
+from core.usage_log import UsageLogWriter
+
+
+def _records(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+def test_writer_appends_jsonl(tmp_path):
+    path = tmp_path / "ai_usage_log.jsonl"
+    writer = UsageLogWriter(path, flush_interval=0.05)
+    for i in range(3):
+        assert writer.submit({"event": "RUN_OK", "rows": i, "query": "кольца"})
+    writer.close()
+    assert [r["rows"] for r in _records(path)] == [0, 1, 2]
+    assert _records(path)[0]["query"] == "кольца"
+
+
+def test_rotation_by_size(tmp_path):
+    path = tmp_path / "ai_usage_log.jsonl"
+    writer = UsageLogWriter(path, max_bytes=200, flush_interval=0.05)
+    for i in range(20):
+        writer.submit({"event": "RUN_OK", "rows": i, "sql": "x" * 50})
+    writer.close()
+    segments = sorted(tmp_path.glob("ai_usage_log.*.jsonl.gz"))
+    assert segments
+    rows = []
+    for seg in segments:
+        with gzip.open(seg, "rt", encoding="utf-8") as fh:
+            rows += [json.loads(line)["rows"] for line in fh]
+    rows += [r["rows"] for r in _records(path)]
+    assert sorted(rows) == list(range(20))
+
+
+def test_full_queue_drops(tmp_path):
+    writer = UsageLogWriter(tmp_path / "ai_usage_log.jsonl", maxsize=1, flush_interval=0.05)
+    sent = sum(writer.submit({"event": "X", "n": i}) for i in range(1000))
+    writer.close()
+    assert writer.dropped == 1000 - sent
+    assert len(_records(tmp_path / "ai_usage_log.jsonl")) == sent
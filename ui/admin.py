@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import os
+
+import streamlit as st
+
+
+def _get_secret(name: str, default: str = "") -> str:
+    try:
+        if name in st.secrets:
+            return str(st.secrets[name]).strip()
+    except Exception:
+        pass
+    return os.getenv(name, default).strip()
+
+
+def is_admin() -> bool:
+    """
+    Админ-режим:
+      - ADMIN_TOKEN задан (secrets/env) -> открыть приложение с ?admin=<token>
+        (запоминается в сессии, работает и на других страницах);
+      - ADMIN_TOKEN не задан -> только локально, через APP_ADMIN=1.
+    """
+    if st.session_state.get("_is_admin"):
+        return True
+
+    token = _get_secret("ADMIN_TOKEN")
+    if token:
+        ok = st.query_params.get("admin") == token
+    else:
+        ok = os.getenv("APP_ADMIN", "").strip().lower() in ("1", "true", "yes", "on")
+
+    if ok:
+        st.session_state["_is_admin"] = True
+    return ok
+
+
+def profiling_enabled() -> bool:
+    """Профилировать запросы этой сессии: PROFILE_REQUESTS=1 или переключатель админа."""
+    from core.profiler import env_enabled
+
+    return env_enabled() or bool(st.session_state.get("admin_profile_requests"))
+
+
+def memory_tracing_enabled() -> bool:
+    """tracemalloc на время запроса: MEMORY_TRACE=1 или переключатель админа."""
+    from core.memory import tracing_env_enabled
+
+    return tracing_env_enabled() or bool(st.session_state.get("admin_trace_memory"))
+
+
+def render_admin_sidebar() -> None:
+    if not is_admin():
+        return
+    with st.sidebar:
+        st.markdown("### 🛠 Admin")
+        st.toggle("Profile requests", key="admin_profile_requests",
+                  help="cProfile every query of this session (parse → execute → render)")
+        st.toggle("Trace memory", key="admin_trace_memory",
+                  help="tracemalloc peak per query of this session (slows queries down)")
+
+
+def render_profile(name: str, limit: int = 30, key: str = "") -> None:
+    """Топ функций одного профиля + скачивание .prof."""
+    import pandas as pd
+    from core import profiler
+
+    path = profiler.profile_path(name)
+    if path is None:
+        st.info(f"Profile {name} not found.")
+        return
+
+    sort = st.radio(
+        "Sort by", ["cumulative", "tottime", "ncalls"], horizontal=True, key=f"profile_sort_{key or name}"
+    )
+    st.caption(f"{name}: total {profiler.total_time_ms(path):,.1f} ms")
+    st.dataframe(
+        pd.DataFrame(profiler.top_functions(path, limit=limit, sort=sort)),
+        width="stretch",
+        hide_index=True,
+    )
+    st.download_button(
+        "Download .prof",
+        data=path.read_bytes(),
+        file_name=name,
+        mime="application/octet-stream",
+        key=f"profile_dl_{key or name}",
+    )
@@ -0,0 +1,197 @@
+"""
+Layout engine: таблицы layout'а из TableSpec'ов (ui/table_registry.py).
+
+prepare(query, df) — один раз на результат запроса (main_app кладёт его в
+кэш сессии):
+
+  - QueryContext запроса (build_query_context) — один раз, по нему же
+    выбирается layout;
+  - таблицы layout'а, которые показывает этот запрос (when) и для которых
+    в результате есть колонки (requires);
+  - SQL-агрегаты всех этих таблиц — одним запросом DuckDB по результату:
+    GROUP BY GROUPING SETS, по набору ключей на агрегат, GROUPING_ID
+    разводит строки по агрегатам. Одинаковые агрегаты разных таблиц
+    (casting summary и by metal) считаются один раз;
+  - build развёрнутых таблиц (из агрегатов — маленькие).
+
+render(prepared) — каждая таблица в своём expander внутри st.fragment.
+Свернутая таблица (expanded=False, например detail на сотни тысяч строк)
+не строится и не уходит в браузер, пока её не раскроют; раскрытие
+перезапускает только её fragment.
+"""
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass, field, replace
+from typing import Any
+
+import pandas as pd
+import streamlit as st
+
+from core import memory
+from ui import tables as _tables  # noqa: F401  (регистрирует TableSpec'и layout'ов)
+from ui.query_context import QueryContext, build_query_context
+from ui.table_registry import Aggregate, TableInput, TableSpec, specs_for
+
+# соединение DuckDB для агрегатов — при первом результате, не при импорте
+_con = None
+_con_lock = threading.Lock()
+
+
+def _cursor():
+    global _con
+    with _con_lock:
+        if _con is None:
+            import duckdb
+
+            _con = duckdb.connect(database=":memory:")
+        return _con.cursor()
+
+
+def _q(column: str) -> str:
+    return '"' + column.replace('"', '""') + '"'
+
+
+def _set_id(keys: tuple[str, ...], all_keys: list[str]) -> int:
+    # GROUPING_ID: бит на ключ (первый — старший), 1 — ключ не в наборе
+    return sum(1 << (len(all_keys) - 1 - i) for i, k in enumerate(all_keys) if k not in keys)
+
+
+def batch_sql(aggregates: list[Aggregate]) -> str:
+    """Один SELECT ... GROUP BY GROUPING SETS по таблице result для всех агрегатов."""
+    keys = list(dict.fromkeys(k for a in aggregates for k in a.keys))
+    sets = list(dict.fromkeys(a.keys for a in aggregates))
+    select = [f"GROUPING_ID({', '.join(map(_q, keys))}) AS __set" if keys else "0 AS __set"]
+    select += [_q(k) for k in keys]
+    for i, a in enumerate(aggregates):
+        # measure — один вызов агрегата: к нему добавляется FILTER
+        flt = f" FILTER (WHERE {a.filter})" if a.filter else ""
+        select += [f"{expr}{flt} AS a{i}_{j}" for j, (_, expr) in enumerate(a.measures)]
+        if a.filter:
+            select.append(f"count(*){flt} AS a{i}_n")
+    groups = ", ".join("(" + ", ".join(map(_q, s)) + ")" for s in sets)
+    return f"SELECT {', '.join(select)} FROM result GROUP BY GROUPING SETS ({groups})"
+
+
+def run_batch(df: pd.DataFrame, aggregates: list[Aggregate]) -> dict[Aggregate, pd.DataFrame]:
+    """Агрегаты по df одним запросом -> таблица на каждый (как groupby(keys, dropna=True), по ключам)."""
+    if not aggregates:
+        return {}
+    sql = batch_sql(aggregates)
+    # только нужные колонки: регистрация всего результата (строки detail) дороже самого запроса
+    columns = [c for c in df.columns if any(c in a.columns for a in aggregates)]
+    cur = _cursor()
+    try:
+        cur.register("result", df[columns])
+        res = cur.execute(sql).df()
+    finally:
+        cur.close()
+
+    keys = list(dict.fromkeys(k for a in aggregates for k in a.keys))
+    out = {}
+    for i, a in enumerate(aggregates):
+        part = res[res["__set"] == _set_id(a.keys, keys)]
+        if a.keys:
+            part = part.dropna(subset=list(a.keys))
+        if a.filter:
+            part = part[part[f"a{i}_n"] > 0]
+        names = {f"a{i}_{j}": name for j, (name, _) in enumerate(a.measures)}
+        part = part[list(a.keys) + list(names)].rename(columns=names)
+        if a.keys:
+            part = part.sort_values(list(a.keys))
+        out[a] = part.reset_index(drop=True)
+    return out
+
+
+@dataclass
+class PreparedLayout:
+    """Всё, что нужно для отрисовки результата: specs, их входы и построенные таблицы."""
+
+    ctx: QueryContext
+    specs: list[TableSpec]
+    inputs: dict[str, TableInput]
+    missing: set[str] = field(default_factory=set)
+    tables: dict[str, Any] = field(default_factory=dict)
+
+    def table(self, spec: TableSpec) -> Any:
+        if spec.id not in self.tables:
+            self.tables[spec.id] = spec.build(self.inputs[spec.id])
+        return self.tables[spec.id]
+
+    def nbytes(self) -> int:
+        # строки результата (df) считает SessionResult, здесь — агрегаты и таблицы
+        frames = [f for inp in self.inputs.values() for f in inp.frames if f is not None]
+        return memory.nbytes(frames) + memory.nbytes(self.tables)
+
+
+def prepare(query: str, df: pd.DataFrame, layout: str | None = None) -> PreparedLayout:
+    """layout — принудительно (иначе выбирается по запросу)."""
+    ctx = build_query_context(query)
+    if layout and layout != ctx.layout:
+        ctx = replace(ctx, layout=layout)
+    columns = set(df.columns)
+    specs, missing = [], set()
+    for spec in specs_for(ctx):
+        lack = spec.requires - columns
+        if lack:
+            missing |= lack
+        else:
+            specs.append(spec)
+
+    aggregates = list(dict.fromkeys(a for s in specs for a in s.aggregates if a.columns <= columns))
+    frames = run_batch(df, aggregates)
+    prepared = PreparedLayout(
+        ctx,
+        specs,
+        {s.id: TableInput(ctx, df, tuple(frames.get(a) for a in s.aggregates)) for s in specs},
+        missing,
+    )
+    for spec in specs:
+        if spec.expanded is not False:
+            prepared.table(spec)
+    return prepared
+
+
+def render(layout: PreparedLayout) -> None:
+    if layout.missing:
+        st.warning(
+            f"⚠️ {layout.ctx.layout.capitalize()} layout: missing required columns "
+            f"({', '.join(sorted(layout.missing))})."
+        )
+    number = 0
+    for spec in layout.specs:
+        # build вернул None и показывать нечего — таблицы нет, номер не занимает
+        if spec.id in layout.tables and layout.tables[spec.id] is None and spec.empty is None:
+            continue
+        title = spec.title_for(layout.ctx)
+        if title:
+            number += 1
+            title = f"{number}️⃣ {title}"
+        _section(layout, spec.id, title)
+
+
+@st.fragment
+def _section(layout: PreparedLayout, spec_id: str, title: str) -> None:
+    spec = next(s for s in layout.specs if s.id == spec_id)
+    if not title or spec.expanded is None:
+        if title:
+            st.subheader(title)
+        _body(layout, spec)
+        return
+    box = st.expander(title, expanded=spec.expanded, key=f"table_{spec.id}", on_change="rerun")
+    if box.open:
+        with box:
+            _body(layout, spec)
+
+
+def _body(layout: PreparedLayout, spec: TableSpec) -> None:
+    if spec.note:
+        note = spec.note(layout.inputs[spec.id])
+        if note:
+            st.markdown(note)
+    table = layout.table(spec)
+    if table is None:
+        if spec.empty:
+            st.info(spec.empty)
+        return
+    spec.render(table, layout.ctx)
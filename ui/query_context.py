@@ -10,6 +10,16 @@ class QueryContext:
     neg_casting: bool
     has_in_process: bool
     combined_mode: bool
+    layout: str
+
+def select_layout(q_lower: str) -> str:
+    if "received order" in q_lower or "received orders" in q_lower:
+        return "received"
+    if "casting" in q_lower:
+        return "casting"
+    if "shipping" in q_lower or "shipped" in q_lower or "ship " in q_lower:
+        return "shipping"
+    return "default"
 
 def build_query_context(query: str) -> QueryContext:
     q_lower = (query or "").lower()
@@ -22,4 +32,5 @@ def build_query_context(query: str) -> QueryContext:
         neg_casting=neg_casting,
         has_in_process=has_in_process,
         combined_mode=combined_mode,
+        layout=select_layout(q_lower),
     )
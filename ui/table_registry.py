@@ -1,14 +1,83 @@
 from __future__ import annotations
 
+import re
 from dataclasses import dataclass
-from typing import Callable, Protocol, Any
+from typing import Any, Callable, Protocol
+
+from ui.query_context import QueryContext
+
+# Таблицы layout'ов — декларации TableSpec: к какому layout'у относится, при
+# каком запросе показывается (when), какие колонки результата нужны
+# (requires) и какие SQL-агрегаты по результату ей нужны (aggregates).
+# ui/layout_engine.py считает агрегаты всех подходящих таблиц одним запросом
+# к DuckDB и рисует таблицы; таблица, которую запрос не показывает, ничего
+# не стоит — её агрегаты в запрос не попадают.
+
+_IDENT_RE = re.compile(r'"([^"]+)"')
+
+
+@dataclass(frozen=True)
+class Aggregate:
+    """
+    SELECT keys, measures FROM result [WHERE filter] GROUP BY keys.
+
+    measures — пары (имя, SQL-агрегат), колонки в SQL — в двойных кавычках
+    ("quan"): по ним engine узнаёт, есть ли нужные колонки в результате.
+    keys=() — одна строка итогов по всему результату.
+    """
+
+    keys: tuple[str, ...]
+    measures: tuple[tuple[str, str], ...]
+    filter: str | None = None
+
+    @property
+    def columns(self) -> frozenset[str]:
+        sql = " ".join(e for _, e in self.measures) + " " + (self.filter or "")
+        return frozenset(self.keys) | frozenset(_IDENT_RE.findall(sql))
+
+
+@dataclass(frozen=True)
+class TableInput:
+    """Что получает build таблицы: контекст запроса, строки результата и её агрегаты."""
+
+    ctx: QueryContext
+    df: Any
+    frames: tuple[Any, ...]  # по одному на spec.aggregates; None — нет колонок
+
 
 class TableRenderer(Protocol):
-    def __call__(self, df: Any, query: str, **kwargs: Any) -> None: ...
+    def __call__(self, table: Any, ctx: QueryContext, **kwargs: Any) -> None: ...
+
 
 @dataclass(frozen=True)
 class TableSpec:
     id: str
-    title: str
+    title: str | Callable[[QueryContext], str]  # markdown; "" — без заголовка и номера
     render: TableRenderer
-    when: Callable[[str], bool] = lambda _q: True  # default: always show
+    when: Callable[[QueryContext], bool] = lambda _ctx: True  # default: always show
+    layout: str = "default"
+    order: int = 0
+    requires: frozenset[str] = frozenset()
+    aggregates: tuple[Aggregate, ...] = ()
+    # TableInput -> то, что рисует render; None — таблицы нет (или empty)
+    build: Callable[[TableInput], Any] = lambda data: data.df
+    note: Callable[[TableInput], str | None] | None = None
+    empty: str | None = None  # build вернул None: показать это как st.info (None — скрыть таблицу)
+    expanded: bool | None = True  # False — свернута, считается при раскрытии; None — без expander
+
+    def title_for(self, ctx: QueryContext) -> str:
+        return self.title(ctx) if callable(self.title) else self.title
+
+
+_specs: dict[str, TableSpec] = {}
+
+
+def register(spec: TableSpec) -> TableSpec:
+    _specs[spec.id] = spec
+    return spec
+
+
+def specs_for(ctx: QueryContext) -> list[TableSpec]:
+    """Таблицы layout'а ctx.layout, которые показывает этот запрос, по порядку."""
+    specs = [s for s in _specs.values() if s.layout == ctx.layout and s.when(ctx)]
+    return sorted(specs, key=lambda s: s.order)
@@ -0,0 +1,2 @@
+# модули таблиц регистрируют свои TableSpec'и (ui/table_registry.py) при импорте
+from ui.tables import casting, common, received, shipping  # noqa: F401
@@ -1,14 +1,13 @@
 from __future__ import annotations
 
-import re
-from datetime import datetime
-from typing import Callable
-
 import pandas as pd
-import streamlit as st
+
+from ui.query_context import QueryContext
+from ui.table_registry import Aggregate, TableInput, TableSpec, register
+from ui.tables.common import period_aggregate, period_note, register_detail, show_frame
 
 
-# ---------- CASTING / SHIPPING COMMON HELPERS (copied from main_app.py) ----------
+# ---------- CASTING / SHIPPING COMMON HELPERS ----------
 
 KARAT_PURITY = {
     "9": 0.375,
@@ -71,63 +70,10 @@ def _metal_group_masks(grouped: pd.DataFrame):
     return silver_mask, brass_mask, plat_mask, gold_mask
 
 
-# ---------- CASTING LAYOUT (module) ----------
-
-def render_casting_layout(
-    df: pd.DataFrame,
-    query: str,
-    *,
-    format_dates: Callable[[pd.DataFrame], pd.DataFrame],
-    render_total_box: Callable[[pd.DataFrame], None],
-) -> None:
-    if df is None or df.empty:
-        st.warning("⚠️ No records found for this filter.")
-        return
-
-    df_local = df.copy()
-
-    q_lower = query.lower()
-    neg_casting = bool(
-        re.search(
-            r"(not\s+casting|no\s+casting|not\s+ready\s+casting|casting\s+not\s+ready)",
-            q_lower,
-        )
-    )
-    if neg_casting:
-        title_prefix = "Not casting"
-        title_class = "casting-title-not"
-    else:
-        title_prefix = "Casting"
-        title_class = "casting-title"
-
-    period_text = None
-    if "Casting_Date" in df_local.columns:
-        cdates = pd.to_datetime(df_local["Casting_Date"], errors="coerce")
-        if not cdates.isna().all():
-            start = cdates.min()
-            end = cdates.max()
-            if pd.notna(start) and pd.notna(end):
-                if start.date() == end.date():
-                    period_text = start.strftime("%m/%d/%Y")
-                else:
-                    period_text = f"{start.strftime('%m/%d/%Y')} – {end.strftime('%m/%d/%Y')}"
-
-    required = {"metal", "quan", "CastWt"}
-    if not required.issubset(set(df_local.columns)):
-        st.warning("⚠️ Casting layout: missing required columns (need metal, quan, CastWt).")
-        df_fmt = format_dates(df_local)
-        st.dataframe(df_fmt)
-        render_total_box(df_fmt)
-        return
-
-    # --- by metal ---
-    grouped = (
-        df_local.groupby("metal", as_index=False)
-        .agg(
-            Qty=("quan", "sum"),
-            Weight=("CastWt", "sum"),
-        )
-    )
+def metal_table(frame: pd.DataFrame) -> pd.DataFrame:
+    """Агрегат по metal (Qty, Weight) -> + PurityFactor, PureMetal; порядок SLV, BRASS, PLAT, золото."""
+    # metal — Categorical (ENUM в DuckDB): дальше работаем со строками, их десятки
+    grouped = frame.astype({"metal": str}).fillna({"Qty": 0, "Weight": 0})
     grouped["PurityFactor"] = grouped["metal"].apply(purity_factor)
     grouped["PureMetal"] = grouped["Weight"] * grouped["PurityFactor"]
     grouped["__order"] = grouped["metal"].apply(sort_metal_for_casting)
@@ -135,10 +81,19 @@ def render_casting_layout(
 
     grouped["Weight"] = grouped["Weight"].round(3)
     grouped["PureMetal"] = grouped["PureMetal"].round(3)
+    return grouped.reset_index(drop=True)
+
+
+def by_metal_table(grouped: pd.DataFrame) -> pd.DataFrame:
+    table = grouped[["metal", "Qty", "Weight", "PureMetal"]].copy()
+    table.insert(0, "No.", range(1, len(table) + 1))
+    return table.set_index("No.")
+
 
+def group_sums(grouped: pd.DataFrame) -> dict[str, tuple[float, float, float]]:
+    """Metal group -> (qty, weight, pure metal), включая TOTAL (all metals)."""
     silver_mask, brass_mask, plat_mask, gold_mask = _metal_group_masks(grouped)
 
-    # sums
     def _sum(mask):
         return (
             float(grouped.loc[mask, "Qty"].sum()),
@@ -146,86 +101,102 @@ def render_casting_layout(
             float(grouped.loc[mask, "PureMetal"].sum()),
         )
 
-    gold_qty, gold_weight, gold_pure = _sum(gold_mask)
-    silver_qty, silver_weight, silver_pure = _sum(silver_mask)
-    brass_qty, brass_weight, brass_pure = _sum(brass_mask)
-    plat_qty, plat_weight, plat_pure = _sum(plat_mask)
-
-    total_qty = float(grouped["Qty"].sum())
-    total_weight = float(grouped["Weight"].sum())
-    total_pure = float(grouped["PureMetal"].sum())
-
-    # --- summary rows: only non-zero groups; TOTAL only if it adds info ---
-    rows = []
-    def _add_row(name: str, qty: float, weight: float, pure: float):
-        if qty != 0 or weight != 0 or pure != 0:
-            rows.append(
-                {
-                    "Metal group": name,
-                    "Total qty": qty,
-                    "Total weight": round(weight, 3),
-                    "Total pure metal": round(pure, 3),
-                }
-            )
-
-    _add_row("Gold", gold_qty, gold_weight, gold_pure)
-    _add_row("Silver", silver_qty, silver_weight, silver_pure)
-    _add_row("Brass", brass_qty, brass_weight, brass_pure)
-    _add_row("Platinum", plat_qty, plat_weight, plat_pure)
-
-    group_count = len(rows)
-    gold_present = bool(gold_mask.any())
-
-    # show summary only for: gold (even if only gold) OR mixed groups
-    show_summary = gold_present or (group_count > 1)
-
-    # add TOTAL only if it is not redundant
-    if group_count > 1:
-        rows.append(
-            {
-                "Metal group": "TOTAL (all metals)",
-                "Total qty": total_qty,
-                "Total weight": round(total_weight, 3),
-                "Total pure metal": round(total_pure, 3),
-            }
-        )
-
-    summary = pd.DataFrame(rows) if rows else pd.DataFrame(
+    return {
+        "Gold": _sum(gold_mask),
+        "Silver": _sum(silver_mask),
+        "Brass": _sum(brass_mask),
+        "Platinum": _sum(plat_mask),
+        "TOTAL (all metals)": (
+            float(grouped["Qty"].sum()),
+            float(grouped["Weight"].sum()),
+            float(grouped["PureMetal"].sum()),
+        ),
+    }
+
+
+def summary_frame(rows: list[tuple[str, tuple[float, float, float]]]) -> pd.DataFrame:
+    return pd.DataFrame(
         {
-            "Metal group": ["TOTAL (all metals)"],
-            "Total qty": [total_qty],
-            "Total weight": [round(total_weight, 3)],
-            "Total pure metal": [round(total_pure, 3)],
+            "Metal group": [name for name, _ in rows],
+            "Total qty": [qty for _, (qty, _, _) in rows],
+            "Total weight": [round(weight, 3) for _, (_, weight, _) in rows],
+            "Total pure metal": [round(pure, 3) for _, (_, _, pure) in rows],
         }
-    )
+    ).set_index("Metal group")
 
-    # By metal table: always show when summary is hidden; otherwise show if it adds detail.
-    show_by_metal = (not show_summary) or gold_present or (grouped["metal"].nunique() > 1)
 
-    # ------------------ RENDER ------------------
+# ---------- CASTING LAYOUT (TableSpec'и) ----------
+# Агрегат по metal общий у summary и by metal: layout_engine считает его один
+# раз, в том же запросе, что и период и итоги.
 
-    if show_summary:
-        st.markdown(
-            f'<h3 class="{title_class}">1️⃣ {title_prefix} summary by metal group</h3>',
-            unsafe_allow_html=True,
-        )
-        st.dataframe(summary.set_index("Metal group"), use_container_width=True)
+CASTING_BY_METAL = Aggregate(("metal",), (("Qty", 'sum("quan")'), ("Weight", 'sum("CastWt")')))
+CASTING_REQUIRED = frozenset({"metal", "quan", "CastWt"})
 
-    if show_by_metal:
-        num = "2" if show_summary else "1"
-        st.markdown(
-            f'<h3 class="{title_class}">{num}️⃣ {title_prefix} by metal</h3>',
-            unsafe_allow_html=True,
-        )
-        if period_text:
-            st.markdown(f"**Period (Casting_Date):** {period_text}")
-
-        table = grouped[["metal", "Qty", "Weight", "PureMetal"]].copy()
-        table.insert(0, "No.", range(1, len(table) + 1))
-        st.dataframe(table.set_index("No."), use_container_width=True)
-
-    detail_no = "3" if show_summary else "2"
-    st.subheader(f"{detail_no}️⃣ Detailed casting records")
-    df_fmt = format_dates(df_local)
-    st.dataframe(df_fmt, use_container_width=True)
-    render_total_box(df_fmt)
+
+def _casting_title(text: str):
+    def title(ctx: QueryContext) -> str:
+        # цвета .casting-title / .casting-title-not
+        if ctx.neg_casting:
+            return f":blue[Not casting {text}]"
+        return f":green[Casting {text}]"
+
+    return title
+
+
+def _show_summary(grouped: pd.DataFrame) -> tuple[bool, bool]:
+    """(summary есть, gold есть): summary — для золота (даже одного) или нескольких групп."""
+    sums = group_sums(grouped)
+    groups = [g for g in ("Gold", "Silver", "Brass", "Platinum") if any(sums[g])]
+    gold_present = bool(_metal_group_masks(grouped)[3].any())
+    return gold_present or len(groups) > 1, gold_present
+
+
+def _casting_summary(data: TableInput) -> pd.DataFrame | None:
+    grouped = metal_table(data.frames[0])
+    show_summary, _ = _show_summary(grouped)
+    if not show_summary:
+        return None
+
+    sums = group_sums(grouped)
+    # only non-zero groups; TOTAL only if it adds info
+    rows = [(g, sums[g]) for g in ("Gold", "Silver", "Brass", "Platinum") if any(sums[g])]
+    if len(rows) > 1:
+        rows.append(("TOTAL (all metals)", sums["TOTAL (all metals)"]))
+    return summary_frame(rows or [("TOTAL (all metals)", sums["TOTAL (all metals)"])])
+
+
+def _casting_by_metal(data: TableInput) -> pd.DataFrame | None:
+    grouped = metal_table(data.frames[0])
+    show_summary, gold_present = _show_summary(grouped)
+    # always show when summary is hidden; otherwise show if it adds detail
+    if show_summary and not gold_present and grouped["metal"].nunique() <= 1:
+        return None
+    return by_metal_table(grouped)
+
+
+register(
+    TableSpec(
+        id="casting.summary",
+        title=_casting_title("summary by metal group"),
+        render=show_frame,
+        layout="casting",
+        order=10,
+        requires=CASTING_REQUIRED,
+        aggregates=(CASTING_BY_METAL,),
+        build=_casting_summary,
+    )
+)
+register(
+    TableSpec(
+        id="casting.by_metal",
+        title=_casting_title("by metal"),
+        render=show_frame,
+        layout="casting",
+        order=20,
+        requires=CASTING_REQUIRED,
+        aggregates=(CASTING_BY_METAL, period_aggregate("Casting_Date")),
+        build=_casting_by_metal,
+        note=period_note("Casting_Date", 1),
+    )
+)
+register_detail("casting", "Detailed casting records")
@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+from typing import Any
+
+import pandas as pd
+import streamlit as st
+
+from ui.query_context import QueryContext
+from ui.table_registry import Aggregate, TableInput, TableSpec, register
+
+
+# ---------- DATES ----------
+
+DATE_COLS = ["pdate", "request_date", "Casting_Date", "ship_date"]
+
+
+def format_dates(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.copy()
+    for col in DATE_COLS:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], errors="coerce").dt.strftime("%m/%d/%Y")
+    return df
+
+
+def period_aggregate(col: str) -> Aggregate:
+    """min/max колонки дат по результату (в Access-результате даты могут быть строками)."""
+    return Aggregate(
+        (),
+        (
+            ("start", f'min(TRY_CAST("{col}" AS TIMESTAMP))'),
+            ("end", f'max(TRY_CAST("{col}" AS TIMESTAMP))'),
+        ),
+    )
+
+
+def period_note(col: str, index: int):
+    """note для TableSpec: '**Period (col):** ...' по агрегату period_aggregate(col) из frames[index]."""
+
+    def note(data: TableInput) -> str | None:
+        frame = data.frames[index]
+        if frame is None or frame.empty:
+            return None
+        start, end = frame["start"].iloc[0], frame["end"].iloc[0]
+        if pd.isna(start) or pd.isna(end):
+            return None
+        if start.date() == end.date():
+            text = start.strftime("%m/%d/%Y")
+        else:
+            text = f"{start.strftime('%m/%d/%Y')} – {end.strftime('%m/%d/%Y')}"
+        return f"**Period ({col}):** {text}"
+
+    return note
+
+
+# ---------- RENDERERS ----------
+
+def show_frame(table: pd.DataFrame, ctx: QueryContext, **kwargs: Any) -> None:
+    st.dataframe(table)
+
+
+def show_totals(totals: tuple, ctx: QueryContext, **kwargs: Any) -> None:
+    total_orders, total_qty = totals
+    if total_qty is None and total_orders is None:
+        return
+
+    if total_orders is not None and total_qty is not None:
+        html = f"""
+        <div class="total-qty-box">
+          <div class="total-line">
+            <span class="total-label">Orders (SO):</span>
+            <span class="total-number">{total_orders:,}</span>
+          </div>
+          <div class="total-line">
+            <span class="total-label">Total Qty:</span>
+            <span class="total-number">{total_qty:,.0f}</span>
+          </div>
+        </div>
+        """
+    elif total_qty is not None:
+        html = f"""
+        <div class="total-qty-box">
+          <div class="total-line">
+            <span class="total-label">Total Qty:</span>
+            <span class="total-number">{total_qty:,.0f}</span>
+          </div>
+        </div>
+        """
+    else:
+        html = ""
+
+    if html:
+        st.markdown(html, unsafe_allow_html=True)
+
+
+# ---------- DETAIL + TOTALS ----------
+
+TOTAL_ORDERS = Aggregate((), (("orders", 'count(DISTINCT "SalesOrder")'),))
+TOTAL_QTY = Aggregate((), (("qty", 'sum(TRY_CAST("quan" AS DOUBLE))'),))
+
+
+def _totals(data: TableInput) -> tuple:
+    """(Orders (SO), Total Qty); None — колонки нет."""
+    orders, qty = data.frames
+    total_orders = int(orders["orders"].iloc[0]) if orders is not None else None
+    total_qty = float(qty["qty"].fillna(0).iloc[0]) if qty is not None else None
+    return total_orders, total_qty
+
+
+def register_detail(layout: str, title: str, *, order: int = 90, expanded: bool = False) -> None:
+    """Детальные строки результата и итоговый блок под ними — для layout'а."""
+    register(
+        TableSpec(
+            id=f"{layout}.detail",
+            title=title,
+            render=show_frame,
+            layout=layout,
+            order=order,
+            build=lambda data: format_dates(data.df),
+            expanded=expanded,
+        )
+    )
+    register(
+        TableSpec(
+            id=f"{layout}.totals",
+            title="",
+            render=show_totals,
+            layout=layout,
+            order=order + 1,
+            aggregates=(TOTAL_ORDERS, TOTAL_QTY),
+            build=_totals,
+            expanded=None,
+        )
+    )
+
+
+# layout без своих таблиц — только строки (развёрнуты) и итог
+register_detail("default", "", expanded=True)
@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import pandas as pd
+
+from ui.table_registry import Aggregate, TableInput, TableSpec, register
+from ui.tables.common import period_aggregate, period_note, register_detail, show_frame
+
+
+# ---------- RECEIVED LAYOUT (TableSpec'и) ----------
+
+FAMILY_BY_METAL = Aggregate(
+    ("metal",),
+    (("Qty", 'sum("quan")'),),
+    filter="""upper(CAST("order_type" AS VARCHAR)) LIKE '%FAMILY%'""",
+)
+BY_ORDER_TYPE = Aggregate(
+    ("order_type",),
+    (("SO_Count", 'count(DISTINCT "SalesOrder")'), ("Total_Qty", 'sum("quan")')),
+)
+
+
+def _family(data: TableInput) -> pd.DataFrame | None:
+    fam = data.frames[0]
+    if fam.empty:
+        return None
+    fam = fam.astype({"metal": str}).fillna({"Qty": 0}).set_index("metal")
+    fam_table = fam[["Qty"]].T
+    fam_table["Total"] = fam["Qty"].sum()
+    return fam_table
+
+
+def _by_order_type(data: TableInput) -> pd.DataFrame:
+    type_summary = data.frames[0].fillna({"Total_Qty": 0}).rename(columns={"order_type": "Order Type"})
+    type_summary.insert(0, "No.", range(1, len(type_summary) + 1))
+    return type_summary.set_index("No.")
+
+
+register(
+    TableSpec(
+        id="received.family",
+        title="Family orders — quantity by metal",
+        render=show_frame,
+        layout="received",
+        order=10,
+        requires=frozenset({"order_type", "metal", "quan"}),
+        aggregates=(FAMILY_BY_METAL, period_aggregate("pdate")),
+        build=_family,
+        note=period_note("pdate", 1),
+        empty="No family orders in this period.",
+    )
+)
+register(
+    TableSpec(
+        id="received.by_order_type",
+        title="Orders summary by order type (SO count & total qty)",
+        render=show_frame,
+        layout="received",
+        order=20,
+        requires=frozenset({"order_type", "SalesOrder", "quan"}),
+        aggregates=(BY_ORDER_TYPE,),
+        build=_by_order_type,
+    )
+)
+register_detail("received", "Detailed received orders")
@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import pandas as pd
+
+from ui.table_registry import Aggregate, TableInput, TableSpec, register
+from ui.tables.casting import by_metal_table, group_sums, metal_table, summary_frame
+from ui.tables.common import period_aggregate, period_note, register_detail, show_frame
+
+
+# ---------- SHIPPING LAYOUT (TableSpec'и) ----------
+
+SHIPPING_BY_METAL = Aggregate(("metal",), (("Qty", 'sum("quan")'), ("Weight", 'sum("LastWeight")')))
+SHIPPING_REQUIRED = frozenset({"metal", "quan", "LastWeight"})
+
+
+def _shipping_by_metal(data: TableInput) -> pd.DataFrame:
+    return by_metal_table(metal_table(data.frames[0]))
+
+
+def _shipping_summary(data: TableInput) -> pd.DataFrame:
+    # все группы, включая нулевые, и TOTAL
+    return summary_frame(list(group_sums(metal_table(data.frames[0])).items()))
+
+
+register(
+    TableSpec(
+        id="shipping.by_metal",
+        title="Shipping by metal",
+        render=show_frame,
+        layout="shipping",
+        order=10,
+        requires=SHIPPING_REQUIRED,
+        aggregates=(SHIPPING_BY_METAL, period_aggregate("ship_date")),
+        build=_shipping_by_metal,
+        note=period_note("ship_date", 1),
+    )
+)
+register(
+    TableSpec(
+        id="shipping.summary",
+        title="Shipping summary by metal group",
+        render=show_frame,
+        layout="shipping",
+        order=20,
+        requires=SHIPPING_REQUIRED,
+        aggregates=(SHIPPING_BY_METAL,),
+        build=_shipping_summary,
+    )
+)
+register_detail("shipping", "Detailed shipping records")